@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm, AuthenticationForm
 from django.forms import inlineformset_factory, BaseInlineFormSet
+from fonar import extractos
 from fonar.models import Pago, PagoAplicacion, CuotaPrestamo as Cuota, Aporte, Prestamo, CuotaPrestamo, TasaInteres 
 
 
@@ -20,14 +21,27 @@ class UsuarioForm(forms.ModelForm):
 class UsuarioCreateForm(UserCreationForm):
     class Meta:
         model = Usuario
-        fields = ["username", "email", "first_name", "last_name","tipo_usuario", "is_active", "is_staff"]
+        fields = ["username", "email", "first_name", "last_name", "telefono", "documento", "tipo_usuario", "is_active", "is_staff"]
 
 
 class UsuarioUpdateForm(UserChangeForm):
     password = None  # Ocultamos campo de password
     class Meta:
         model = Usuario
-        fields = ["username", "email", "is_active", "first_name", "last_name","tipo_usuario", "is_staff"]
+        fields = ["username", "email", "is_active", "first_name", "last_name", "telefono", "documento", "tipo_usuario", "is_staff"]
+
+
+class ImportarSociosForm(forms.Form):
+    archivo = forms.FileField(
+        label="Archivo de socios (.csv o .xlsx)",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xlsx"}),
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data["archivo"]
+        if not archivo.name.lower().endswith((".csv", ".xlsx", ".xlsm")):
+            raise forms.ValidationError("El archivo debe ser .csv o .xlsx")
+        return archivo
 
 
 class AdminLoginForm(AuthenticationForm):
@@ -53,7 +67,8 @@ class AdminLoginForm(AuthenticationForm):
 class PagoForm(forms.ModelForm):
     class Meta:
         model = Pago
-        fields = ["usuario", "monto_reportado", "soporte", "fecha", "validado", "comentarios"]
+        # validado no se edita: lo derivan las señales del total aplicado
+        fields = ["usuario", "monto_reportado", "soporte", "fecha", "comentarios"]
         widgets = {
             "usuario": forms.Select(attrs={"class": "form-select"}),
             "monto_reportado": forms.NumberInput(attrs={"class": "form-control text-end", "step": "0.01"}),
@@ -62,7 +77,6 @@ class PagoForm(forms.ModelForm):
                 format="%Y-%m-%d",
                 attrs={"type": "date", "class": "form-control"}
             ),
-            "validado": forms.CheckboxInput(attrs={"class": "form-check-input"}),
             "comentarios": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
         }
 
@@ -71,6 +85,23 @@ class PagoForm(forms.ModelForm):
         self.fields["fecha"].input_formats = ["%Y-%m-%d"]
 
 
+class ImportarExtractoForm(forms.Form):
+    archivo = forms.FileField(
+        label="Extracto (.csv o .xlsx)",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xlsx"}),
+    )
+    medio = forms.ChoiceField(
+        choices=[(m, m.capitalize()) for m in extractos.MEDIOS],
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data["archivo"]
+        if not archivo.name.lower().endswith((".csv", ".xlsx", ".xlsm")):
+            raise forms.ValidationError("El extracto debe ser .csv o .xlsx")
+        return archivo
+
+
 class PagoAplicacionForm(forms.ModelForm):
     class Meta:
         model = PagoAplicacion
@@ -1,6 +1,7 @@
 from django.urls import path
 from dashboard.views.usuario_views import (
     UsuarioListView, UsuarioCreateView, UsuarioUpdateView, UsuarioDeleteView, UsuarioPasswordChangeView,
+    UsuarioAutocompletarView, UsuarioImportarView,
 )
 from dashboard.views.auth_views import AdminLoginView, AdminLogoutView
 from dashboard.views.home_views import DashboardHomeView   # 👈 vista principal
@@ -11,6 +12,7 @@ from dashboard.views import tasa_views
 from dashboard.views import solicitud_views
 from dashboard.views.home_views import entregar_fondo_pdf
 from dashboard.views.otros_aportes_views import OtrosAportesListView
+from dashboard.views.perfilado_views import PerfiladoSQLView
 
 app_name = "dashboard"
 
@@ -25,13 +27,16 @@ urlpatterns = [
     # Rutas de usuarios
     path("usuarios/", UsuarioListView.as_view(), name="usuarios-list"),
     path("usuarios/create/", UsuarioCreateView.as_view(), name="usuarios-create"),
+    path("usuarios/importar/", UsuarioImportarView.as_view(), name="usuarios-importar"),
     path("usuarios/<int:pk>/update/", UsuarioUpdateView.as_view(), name="usuarios-update"),
     path("usuarios/<int:pk>/delete/", UsuarioDeleteView.as_view(), name="usuarios-delete"),
     path("usuarios/<int:pk>/password/", UsuarioPasswordChangeView.as_view(), name="usuarios-password"),
+    path("usuarios/autocompletar/", UsuarioAutocompletarView.as_view(), name="usuarios-autocompletar"),
 
     # Rutas de pagos
     path("pagos/", pago_views.PagoListView.as_view(), name="pagos-list"),
     path("pagos/create/", pago_views.PagoCreateView.as_view(), name="pagos-create"),
+    path("pagos/importar/", pago_views.PagoImportarView.as_view(), name="pagos-importar"),
     path("pagos/<int:pk>/update/", pago_views.PagoUpdateView.as_view(), name="pagos-update"),
     path("pagos/<int:pk>/delete/", pago_views.PagoDeleteView.as_view(), name="pagos-delete"),
     path("pagos/<int:pk>/", pago_views.PagoDetailView.as_view(), name="pagos-detail"),
@@ -65,5 +70,8 @@ urlpatterns = [
     # Rutas de Entrega Fondo
     path("entregar-fondo/", entregar_fondo_pdf, name="entregar_fondo"),
 
+    # Perfilado SQL (staff)
+    path("perfilado/", PerfiladoSQLView.as_view(), name="perfilado"),
+
 
 ]
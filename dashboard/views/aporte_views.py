@@ -1,29 +1,66 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from fonar.models import Aporte, Usuario
+from django.db.models import Count, Sum
+from decimal import Decimal
+from fonar.busqueda import filtro_usuario
+from fonar.models import Aporte, ResumenAnualSocio
 from dashboard.forms import AporteForm
+from dashboard.views.paginacion import paginar_por_cursor
+
+APORTES_POR_PAGINA = 50
+
 
 @login_required
 def aporte_list(request):
-    aportes = Aporte.objects.all().order_by('-fecha_aporte')
-    usuarios = Usuario.objects.all()
+    aportes = Aporte.objects.all()
 
     # 🔹 Filtros
-    usuario_id = request.GET.get('usuario')
+    usuario = request.GET.get('usuario', '').strip()
     fecha_inicio = request.GET.get('fecha_inicio')
     fecha_fin = request.GET.get('fecha_fin')
 
-    if usuario_id and usuario_id.isdigit():
-        aportes = aportes.filter(usuario_id=usuario_id)
+    if usuario:
+        aportes = aportes.filter(filtro_usuario(usuario))
     if fecha_inicio:
         aportes = aportes.filter(fecha_aporte__gte=fecha_inicio)
     if fecha_fin:
         aportes = aportes.filter(fecha_aporte__lte=fecha_fin)
 
+    # 🔹 Página por cursor sobre (fecha_aporte, id): no depende de la historia
+    pagina = paginar_por_cursor(
+        aportes.select_related('usuario'),
+        ('-fecha_aporte', '-id'),
+        request.GET.get('cursor'),
+        APORTES_POR_PAGINA,
+    )
+
+    # 🔹 Subtotales por usuario: con filtros, agrupados sobre lo filtrado;
+    # sin filtros, de los resúmenes anuales (montos y cantidades) en vez de
+    # agrupar o contar toda la historia
+    columnas = ('usuario_id', 'usuario__username', 'usuario__first_name', 'usuario__last_name')
+    if usuario or fecha_inicio or fecha_fin:
+        subtotales = list(
+            aportes.values(*columnas)
+            .annotate(total=Sum('monto'), cantidad=Count('id'))
+            .order_by('usuario__username')
+        )
+    else:
+        subtotales = list(
+            ResumenAnualSocio.objects.values(*columnas)
+            .annotate(total=Sum('aportes'), cantidad=Sum('aportes_movimientos'))
+            .filter(cantidad__gt=0)
+            .order_by('usuario__username')
+        )
+    cantidad = sum(s['cantidad'] for s in subtotales)
+    total = sum((s['total'] for s in subtotales), Decimal('0'))
+
     context = {
-        'aportes': aportes,
-        'usuarios': usuarios,
-        'usuario_id': usuario_id,
+        'aportes': pagina.object_list,
+        'pagina': pagina,
+        'subtotales': subtotales,
+        'total': total,
+        'cantidad': cantidad,
+        'usuario': usuario,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
     }
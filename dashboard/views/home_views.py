@@ -3,14 +3,15 @@
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from dashboard.views.mixins import StaffRequiredMixin
-from django.db.models import Sum, Min, Max, Count
+from django.db.models import Sum, Min, Q, F
 from django.utils import timezone
 from django.utils.timezone import now
 from django.shortcuts import redirect
 from django.http import HttpResponse
 from decimal import Decimal
 
-from fonar.models import Usuario, Aporte, Prestamo, PagoAplicacion, FondoBalance
+from fonar.models import Usuario, FondoBalance, ResumenAnualSocio
+from fonar.cache_versionada import en_cache
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -48,65 +49,57 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
 
         hoy = timezone.now().date()
 
-        total_aportes_general = (
-            Aporte.objects.filter(fecha_aporte__year=año_actual)
-            .aggregate(total=Sum("monto"))["total"] or Decimal("0")
+        # Cacheado por año y día (días de vinculación y años disponibles
+        # dependen de hoy); cualquier cambio en los datos lo invalida
+        context.update(en_cache(
+            "dashboard_home", lambda: self.calcular_contexto(año_actual, hoy), año_actual, hoy
+        ))
+        # Fuera de la caché: se edita en esta misma página. Un GET no crea la
+        # fila (crearla cambiaría la versión y tiraría lo recién cacheado)
+        context["balance"] = (
+            FondoBalance.objects.filter(año=año_actual).first() or FondoBalance(año=año_actual)
         )
+        return context
 
-        fecha_inicio_fondo = (
-            Aporte.objects.filter(fecha_aporte__year=año_actual)
-            .aggregate(fecha=Min("fecha_aporte"))["fecha"] or hoy
+    def calcular_contexto(self, año_actual, hoy):
+        # ============================================================
+        # Resumen anual por socio: una fila por usuario con aportes, otros
+        # aportes, intereses pagados y capital pendiente del año
+        # ============================================================
+        resumenes = list(
+            ResumenAnualSocio.objects.filter(año=año_actual)
+            .annotate(tipo_usuario=F("usuario__tipo_usuario"))
         )
+        resumen_por_usuario = {r.usuario_id: r for r in resumenes}
+        resumenes_asociados = [r for r in resumenes if r.tipo_usuario == "asociado"]
+        resumenes_terceros = [r for r in resumenes if r.tipo_usuario == "tercero"]
+
+        total_aportes_general = sum((r.aportes for r in resumenes), Decimal("0"))
+
+        fecha_inicio_fondo = min(
+            (r.primer_aporte for r in resumenes if r.primer_aporte), default=None
+        ) or hoy
         dias_fondo = max((hoy - fecha_inicio_fondo).days, 1)
 
-        fecha_ultimo_aporte_general = (
-            Aporte.objects.filter(fecha_aporte__year=año_actual)
-            .aggregate(fecha=Max("fecha_aporte"))["fecha"]
+        fecha_ultimo_aporte_general = max(
+            (r.ultimo_aporte for r in resumenes if r.ultimo_aporte), default=None
         )
 
-        total_intereses_general = (
-            PagoAplicacion.objects.filter(
-                tipo="prestamo",
-                cuota__fecha_vencimiento__year=año_actual,
-                pago__validado=True,
-            ).aggregate(total=Sum("interes"))["total"] or Decimal("0")
-        )
+        total_intereses_general = sum((r.intereses_pagados for r in resumenes), Decimal("0"))
 
         # ============================================================
         # ✅ NUEVO: Pre-cálculos para Otros Aportes (Viaje/Actividad/Admin APP)
         # ============================================================
 
         # 1) Aportes Viaje (sumatoria por usuario)
-        aportes_viaje_qs = (
-            PagoAplicacion.objects.filter(
-                tipo="aporte_viaje",
-                pago__validado=True,
-                pago__fecha__year=año_actual,
-                pago__usuario__tipo_usuario="asociado",
-            )
-            .values("pago__usuario")
-            .annotate(total=Sum("monto_aplicado"))
-        )
-        aportes_viaje_map = {
-            row["pago__usuario"]: (row["total"] or Decimal("0"))
-            for row in aportes_viaje_qs
-        }
+        aportes_viaje_map = {r.usuario_id: r.aportes_viaje for r in resumenes_asociados}
 
         # 2) Recaudo Actividad (total y participantes para repartir en partes iguales)
-        actividad_qs = PagoAplicacion.objects.filter(
-            tipo="actividad_recaudo",
-            pago__validado=True,
-            pago__fecha__year=año_actual,
-            pago__usuario__tipo_usuario="asociado",
-        )
+        actividad_rows = [r for r in resumenes_asociados if r.actividad_movimientos]
 
-        total_recaudo_actividad = (
-            actividad_qs.aggregate(total=Sum("monto_aplicado"))["total"] or Decimal("0")
-        )
+        total_recaudo_actividad = sum((r.recaudo_actividad for r in actividad_rows), Decimal("0"))
 
-        participantes_actividad_ids = list(
-            actividad_qs.values_list("pago__usuario", flat=True).distinct()
-        )
+        participantes_actividad_ids = {r.usuario_id for r in actividad_rows}
         cantidad_participantes_actividad = len(participantes_actividad_ids)
 
         reparto_actividad_por_persona = (
@@ -116,95 +109,53 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
         )
 
         # 3) Administración APP (sumatoria por usuario para columna + total general)
-        admin_app_qs = PagoAplicacion.objects.filter(
-            tipo="admin_app",
-            pago__validado=True,
-            pago__fecha__year=año_actual,
-            pago__usuario__tipo_usuario="asociado",
-        ).select_related("pago", "pago__usuario")
-
-        admin_app_total = (
-            admin_app_qs.aggregate(total=Sum("monto_aplicado"))["total"] or Decimal("0")
-        )
+        admin_app_rows = [r for r in resumenes_asociados if r.admin_app_movimientos]
 
-        admin_app_map_qs = (
-            PagoAplicacion.objects.filter(
-                tipo="admin_app",
-                pago__validado=True,
-                pago__fecha__year=año_actual,
-                pago__usuario__tipo_usuario="asociado",
-            )
-            .values("pago__usuario")
-            .annotate(total=Sum("monto_aplicado"))
-        )
-        admin_app_map = {
-            row["pago__usuario"]: (row["total"] or Decimal("0"))
-            for row in admin_app_map_qs
-        }
+        admin_app_total = sum((r.admin_app for r in admin_app_rows), Decimal("0"))
 
-        # (Dejo este resumen por si lo usas después, aunque ya no irá en el template)
-        admin_app_resumen = admin_app_qs.values("pago__usuario").annotate(
-            total=Sum("monto_aplicado"),
-            movimientos=Count("id"),
-            ultima_fecha=Max("pago__fecha"),
-        )
+        admin_app_map = {r.usuario_id: r.admin_app for r in admin_app_rows}
 
-        admin_app_participantes = admin_app_resumen.count()
+        admin_app_participantes = len(admin_app_rows)
         admin_app_promedio = (
             (admin_app_total / Decimal(admin_app_participantes))
             if admin_app_participantes > 0
             else Decimal("0")
         )
 
-        usuarios_lookup = {
-            u.id: u for u in Usuario.objects.filter(tipo_usuario="asociado")
-        }
+        asociados = list(Usuario.objects.filter(tipo_usuario="asociado"))
+        usuarios_lookup = {u.id: u for u in asociados}
 
+        # (Dejo este resumen por si lo usas después, aunque ya no irá en el template)
         admin_app_data = []
-        for row in admin_app_resumen:
-            uid = row["pago__usuario"]
-            uobj = usuarios_lookup.get(uid)
-            nombre = (f"{uobj.first_name} {uobj.last_name}".strip() if uobj else str(uid))
+        for r in admin_app_rows:
+            uobj = usuarios_lookup.get(r.usuario_id)
+            nombre = (f"{uobj.first_name} {uobj.last_name}".strip() if uobj else str(r.usuario_id))
             admin_app_data.append({
                 "usuario": nombre,
-                "usuario_id": uid,
-                "total": row["total"] or Decimal("0"),
-                "movimientos": row["movimientos"] or 0,
-                "ultima_fecha": row["ultima_fecha"],
+                "usuario_id": r.usuario_id,
+                "total": r.admin_app,
+                "movimientos": r.admin_app_movimientos,
+                "ultima_fecha": r.admin_app_ultima_fecha,
             })
 
+        # Intereses pagados y capital pendiente de los terceros (una sola fila en la tabla)
+        total_intereses_pagados_terceros = sum((r.intereses_pagados for r in resumenes_terceros), Decimal("0"))
+        capital_pendiente_terceros = sum((r.capital_pendiente for r in resumenes_terceros), Decimal("0"))
+
         # ============================================================
         # Construcción de tabla principal
         # ============================================================
         usuarios_data = []
 
-        for usuario in Usuario.objects.filter(tipo_usuario="asociado"):
-            primer_aporte = Aporte.objects.filter(
-                usuario=usuario, fecha_aporte__year=año_actual
-            ).aggregate(fecha=Min("fecha_aporte"))["fecha"]
-
-            total_aportes = Aporte.objects.filter(
-                usuario=usuario, fecha_aporte__year=año_actual
-            ).aggregate(total=Sum("monto"))["total"] or Decimal("0")
-
-            ultimo_aporte = Aporte.objects.filter(
-                usuario=usuario, fecha_aporte__year=año_actual
-            ).aggregate(fecha=Max("fecha_aporte"))["fecha"]
-
-            intereses_pagados = (
-                PagoAplicacion.objects.filter(
-                    prestamo__usuario=usuario,
-                    pago__validado=True,
-                    cuota__fecha_vencimiento__year=año_actual,
-                ).aggregate(total=Sum("interes"))["total"] or Decimal("0")
-            )
+        for usuario in asociados:
+            resumen = resumen_por_usuario.get(usuario.id)
+            primer_aporte = resumen.primer_aporte if resumen else None
+            total_aportes = resumen.aportes if resumen else Decimal("0")
+            ultimo_aporte = resumen.ultimo_aporte if resumen else None
 
-            capital_pendiente = sum(
-                p.capital_pendiente
-                for p in Prestamo.objects.filter(
-                    usuario=usuario, fecha_desembolso__year=año_actual
-                )
-            )
+            intereses_pagados = resumen.intereses_pagados if resumen else Decimal("0")
+
+            capital_pendiente = resumen.capital_pendiente if resumen else 0
 
             participacion = (total_aportes / total_aportes_general * 100) if total_aportes_general > 0 else 0
             dias_vinculacion = (hoy - primer_aporte).days if primer_aporte else 0
@@ -279,19 +230,6 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
                 "admin_app_pagado": admin_app_pagado,
             })
 
-        total_intereses_pagados_terceros = PagoAplicacion.objects.filter(
-            prestamo__usuario__tipo_usuario="tercero",
-            pago__validado=True,
-            cuota__fecha_vencimiento__year=año_actual,
-        ).aggregate(total=Sum("interes"))["total"] or Decimal("0")
-
-        capital_pendiente_terceros = sum(
-            p.capital_pendiente
-            for p in Prestamo.objects.filter(
-                usuario__tipo_usuario="tercero", fecha_desembolso__year=año_actual
-            )
-        )
-
         if total_intereses_pagados_terceros > 0 or capital_pendiente_terceros > 0:
             usuarios_data.append({
                 "nombre": "Terceros",
@@ -357,25 +295,20 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
             - totales["capital_pendiente"]
         )
 
-        balance, _ = FondoBalance.objects.get_or_create(año=año_actual)
-
-        primer_aporte_global = Aporte.objects.aggregate(fecha=Min("fecha_aporte"))["fecha"]
-        primer_prestamo = Prestamo.objects.aggregate(fecha=Min("fecha_desembolso"))["fecha"]
-
-        año_min = min(
-            año_actual,
-            primer_aporte_global.year if primer_aporte_global else año_actual,
-            primer_prestamo.year if primer_prestamo else año_actual,
+        # primer año con aportes o desembolsos
+        primer_año = (
+            ResumenAnualSocio.objects.filter(Q(primer_aporte__isnull=False) | Q(prestamos__gt=0))
+            .aggregate(año=Min("año"))["año"]
         )
+        año_min = min(año_actual, primer_año or año_actual)
         años_disponibles = list(range(año_min, timezone.now().year + 1))
 
-        context.update({
+        return {
             "usuarios_data": usuarios_data,
             "año_actual": año_actual,
             "totales": totales,
             "años_disponibles": años_disponibles,
             "total_en_fondo": total_en_fondo,
-            "balance": balance,
 
             "total_recaudo_actividad": total_recaudo_actividad,
             "cantidad_participantes_actividad": cantidad_participantes_actividad,
@@ -385,8 +318,7 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
             "admin_app_total": admin_app_total,
             "admin_app_participantes": admin_app_participantes,
             "admin_app_promedio": admin_app_promedio,
-        })
-        return context
+        }
 
     def post(self, request, *args, **kwargs):
         año_actual = request.GET.get("year")
@@ -411,6 +343,54 @@ class DashboardHomeView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
 # ================================================================
 # 📄 Función para generar PDF de entrega de fondo
 # ================================================================
+def calcular_entrega_fondo(año_actual, hoy):
+    """Cifras de la hoja de cada asociado con aportes en el año"""
+    # Totales del año (todos los usuarios) desde el resumen anual
+    totales_año = ResumenAnualSocio.objects.filter(año=año_actual).aggregate(
+        aportes=Sum("aportes"),
+        intereses=Sum("intereses_pagados"),
+        inicio=Min("primer_aporte"),
+    )
+    total_aportes_general = totales_año["aportes"] or Decimal("0")
+    total_intereses_general = totales_año["intereses"] or Decimal("0")
+    fecha_inicio_fondo = totales_año["inicio"] or hoy
+    dias_fondo = max((hoy - fecha_inicio_fondo).days, 1)
+
+    # Solo los asociados con aportes en el año reciben hoja
+    resumenes = (
+        ResumenAnualSocio.objects.filter(año=año_actual, usuario__tipo_usuario="asociado", aportes__gt=0)
+        .select_related("usuario")
+        .order_by("usuario_id")
+    )
+
+    socios = []
+    for resumen in resumenes:
+        usuario = resumen.usuario
+        total_aportes = resumen.aportes
+        primer_aporte = resumen.primer_aporte
+        dias_vinculacion = (hoy - primer_aporte).days if primer_aporte else 0
+
+        intereses_ganados = Decimal("0")
+        if total_aportes > 0 and total_intereses_general > 0 and primer_aporte:
+            intereses_ganados = (
+                total_intereses_general
+                * (total_aportes / total_aportes_general)
+                * (Decimal(dias_vinculacion) / Decimal(dias_fondo))
+            )
+
+        pago_admin = intereses_ganados * Decimal("0.10")
+        intereses_neto = intereses_ganados - pago_admin
+
+        socios.append({
+            "nombre": f"{usuario.first_name} {usuario.last_name}",
+            "email": usuario.email,
+            "total_aportes": total_aportes,
+            "intereses_neto": intereses_neto,
+            "total_pagar": total_aportes + intereses_neto,
+        })
+    return socios
+
+
 def entregar_fondo_pdf(request):
     año_actual = request.GET.get("year")
     try:
@@ -429,49 +409,12 @@ def entregar_fondo_pdf(request):
 
     logo_path = os.path.join(settings.BASE_DIR, "static/images/logo.png")
 
-    total_aportes_general = (
-        Aporte.objects.filter(fecha_aporte__year=año_actual)
-        .aggregate(total=Sum("monto"))["total"] or Decimal("0")
-    )
+    socios = en_cache("entrega_fondo", lambda: calcular_entrega_fondo(año_actual, hoy), año_actual, hoy)
 
-    total_intereses_general = (
-        PagoAplicacion.objects.filter(
-            tipo="prestamo",
-            cuota__fecha_vencimiento__year=año_actual,
-            pago__validado=True,
-        ).aggregate(total=Sum("interes"))["total"] or Decimal("0")
-    )
-
-    fecha_inicio_fondo = (
-        Aporte.objects.filter(fecha_aporte__year=año_actual)
-        .aggregate(fecha=Min("fecha_aporte"))["fecha"] or hoy
-    )
-    dias_fondo = max((hoy - fecha_inicio_fondo).days, 1)
-
-    usuarios = Usuario.objects.filter(tipo_usuario="asociado")
-
-    for usuario in usuarios:
-        total_aportes = (
-            Aporte.objects.filter(usuario=usuario, fecha_aporte__year=año_actual)
-            .aggregate(total=Sum("monto"))["total"] or Decimal("0")
-        )
-        primer_aporte = (
-            Aporte.objects.filter(usuario=usuario, fecha_aporte__year=año_actual)
-            .aggregate(fecha=Min("fecha_aporte"))["fecha"]
-        )
-        dias_vinculacion = (hoy - primer_aporte).days if primer_aporte else 0
-
-        intereses_ganados = Decimal("0")
-        if total_aportes > 0 and total_intereses_general > 0 and primer_aporte:
-            intereses_ganados = (
-                total_intereses_general
-                * (total_aportes / total_aportes_general)
-                * (Decimal(dias_vinculacion) / Decimal(dias_fondo))
-            )
-
-        pago_admin = intereses_ganados * Decimal("0.10")
-        intereses_neto = intereses_ganados - pago_admin
-        total_pagar = total_aportes + intereses_neto
+    for socio in socios:
+        total_aportes = socio["total_aportes"]
+        intereses_neto = socio["intereses_neto"]
+        total_pagar = socio["total_pagar"]
 
         if total_aportes > 0:
             if os.path.exists(logo_path):
@@ -485,8 +428,8 @@ def entregar_fondo_pdf(request):
             elements.append(Spacer(1, 20))
 
             datos_socio = [
-                ["Socio", f"{usuario.first_name} {usuario.last_name}"],
-                ["Correo", usuario.email or "-"],
+                ["Socio", socio["nombre"]],
+                ["Correo", socio["email"] or "-"],
                 ["Fecha", hoy.strftime("%d/%m/%Y")],
             ]
             tabla_socio = Table(datos_socio, colWidths=[100, 350])
@@ -521,3 +464,9 @@ def entregar_fondo_pdf(request):
             ]))
             elements.append(tabla_totales)
             elements.append(PageBreak())
+
+    if not elements:
+        elements.append(Paragraph(f"No hay aportes registrados en {año_actual}.", styles["Normal"]))
+
+    doc.build(elements)
+    return response
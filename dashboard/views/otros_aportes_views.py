@@ -1,15 +1,28 @@
 from datetime import datetime
 from decimal import Decimal
 from django.views.generic import ListView
-from django.db.models import Q
+from fonar.busqueda import filtro_usuario
+from fonar.fechas import en_anio_local
 from fonar.models import PagoAplicacion
+from dashboard.views.paginacion import PaginacionCursorMixin
 
-class OtrosAportesListView(ListView):
+class OtrosAportesListView(PaginacionCursorMixin, ListView):
     template_name = "dashboard/otros-aportes/list.html"
     context_object_name = "items"
     paginate_by = 25
 
     TIPOS_VALIDOS = ("aporte_viaje", "admin_app", "actividad_recaudo")
+    # valor de ?ordenar= → orden de la página (termina en id para el cursor)
+    ORDENES = {
+        "pago__fecha": ("pago__fecha", "id"),
+        "-pago__fecha": ("-pago__fecha", "-id"),
+        "monto_aplicado": ("monto_aplicado", "id"),
+        "-monto_aplicado": ("-monto_aplicado", "-id"),
+    }
+
+    def get_orden_cursor(self):
+        ordenar = self.request.GET.get("ordenar", "").strip()
+        return self.ORDENES.get(ordenar, self.ORDENES["-pago__fecha"])
 
     def get_queryset(self):
         qs = (PagoAplicacion.objects
@@ -18,12 +31,7 @@ class OtrosAportesListView(ListView):
 
         usuario = self.request.GET.get("usuario", "").strip()
         if usuario:
-            qs = qs.filter(
-                Q(pago__usuario__username__icontains=usuario) |
-                Q(pago__usuario__first_name__icontains=usuario) |
-                Q(pago__usuario__last_name__icontains=usuario) |
-                Q(pago__usuario__email__icontains=usuario)
-            )
+            qs = qs.filter(filtro_usuario(usuario, "pago__usuario"))
 
         tipo = self.request.GET.get("tipo", "").strip()
         if tipo in self.TIPOS_VALIDOS:
@@ -35,14 +43,7 @@ class OtrosAportesListView(ListView):
 
         anio = self.request.GET.get("anio", "").strip()
         if anio.isdigit():
-            qs = qs.filter(pago__fecha__year=int(anio))
-
-        ordenar = self.request.GET.get("ordenar", "").strip()
-        allowed_orders = {"pago__fecha", "-pago__fecha", "monto_aplicado", "-monto_aplicado"}
-        if ordenar in allowed_orders:
-            qs = qs.order_by(ordenar)
-        else:
-            qs = qs.order_by("-pago__fecha", "-id")
+            qs = qs.filter(en_anio_local("pago__fecha", int(anio)))
 
         return qs
 
@@ -0,0 +1,192 @@
+"""
+Paginación por cursor (keyset) para los listados del dashboard.
+
+En vez de OFFSET + COUNT(*), cada página se pide "después de" (o "antes de")
+la última fila vista, comparando por las columnas del orden. El orden debe
+terminar en una columna única (id) para que sea estable, y sus columnas no
+pueden ser NULL. Con un índice sobre esas columnas el costo de una página no
+depende de qué tan adentro esté ni del tamaño de la tabla.
+
+El cursor viaja en la URL como un token opaco (JSON en base64) con los
+valores de la fila frontera y la dirección. Las vistas basadas en ListView
+usan PaginacionCursorMixin; la plantilla dashboard/paginacion_cursor.html
+dibuja los enlaces conservando los filtros de la URL.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+ADELANTE = "s"
+ATRAS = "a"
+
+
+def codificar_cursor(valores, direccion):
+    crudo = json.dumps([direccion, [str(v) if not isinstance(v, int) else v for v in valores]])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(token, campos):
+    """
+    (dirección, valores) del token, o None si falta o no es válido (se muestra
+    la primera página). Cada valor se convierte al tipo de su campo del
+    modelo: un token alterado no llega a la consulta.
+    """
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direccion, valores = json.loads(crudo)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direccion not in (ADELANTE, ATRAS) or not isinstance(valores, list) or len(valores) != len(campos):
+        return None
+    try:
+        valores = [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValidationError, ValueError, TypeError):
+        return None
+    if any(valor is None for valor in valores):
+        return None
+    return direccion, valores
+
+
+def _campo(modelo, nombre):
+    # el campo del modelo detrás de una columna del orden ("pago__fecha" sigue la relación)
+    *relaciones, ultimo = nombre.split("__")
+    for parte in relaciones:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(ultimo)
+
+
+def _despues_de(orden, valores, hacia_atras=False):
+    """
+    Filas estrictamente posteriores a 'valores' según 'orden' (o anteriores si
+    hacia_atras): (a > x) OR (a = x AND b > y) OR ... con el sentido de cada
+    columna.
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        descendente = campo.startswith("-")
+        nombre = campo.lstrip("-")
+        operador = "lt" if descendente != hacia_atras else "gt"
+        condicion |= Q(**iguales, **{f"{nombre}__{operador}": valor})
+        iguales[nombre] = valor
+    # cota redundante sobre la primera columna: con ella el motor busca por
+    # rango en el índice en vez de recorrerlo desde el principio
+    primera = orden[0]
+    operador = "lte" if primera.startswith("-") != hacia_atras else "gte"
+    return Q(**{f"{primera.lstrip('-')}__{operador}": valores[0]}) & condicion
+
+
+def _valor(fila, nombre):
+    # admite columnas de relaciones ("pago__fecha"); conviene traerlas con select_related
+    for parte in nombre.split("__"):
+        fila = getattr(fila, parte)
+    return fila
+
+
+class PaginaCursor:
+    """Una página de resultados con los tokens para ir a la siguiente y a la anterior"""
+
+    def __init__(self, object_list, siguiente=None, anterior=None):
+        self.object_list = object_list
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def has_next(self):
+        return self.siguiente is not None
+
+    def has_previous(self):
+        return self.anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginar_por_cursor(qs, orden, token, por_pagina):
+    """
+    Página de 'qs' ordenada por 'orden' (p. ej. ("-fecha_aporte", "-id")) a
+    partir del token recibido. Es una sola consulta: se pide una fila de más
+    para saber si hay otra página en esa dirección.
+    """
+    orden = tuple(orden)
+    nombres = [campo.lstrip("-") for campo in orden]
+    cursor = decodificar_cursor(token, [_campo(qs.model, n) for n in nombres])
+
+    if cursor is None:
+        filas = list(qs.order_by(*orden)[:por_pagina + 1])
+        hay_mas, desde_cursor, hacia_atras = len(filas) > por_pagina, False, False
+        filas = filas[:por_pagina]
+    else:
+        direccion, valores = cursor
+        hacia_atras = direccion == ATRAS
+        if hacia_atras:
+            invertido = tuple(c[1:] if c.startswith("-") else f"-{c}" for c in orden)
+            filas = list(qs.filter(_despues_de(orden, valores, True)).order_by(*invertido)[:por_pagina + 1])
+            hay_mas = len(filas) > por_pagina
+            filas = filas[:por_pagina][::-1]
+        else:
+            filas = list(qs.filter(_despues_de(orden, valores)).order_by(*orden)[:por_pagina + 1])
+            hay_mas = len(filas) > por_pagina
+            filas = filas[:por_pagina]
+        desde_cursor = True
+
+    def token_de(fila, direccion):
+        return codificar_cursor([_valor(fila, n) for n in nombres], direccion)
+
+    siguiente = anterior = None
+    if filas:
+        # hacia atrás, "hay más" se refiere a páginas anteriores; la siguiente
+        # existe porque de allí venimos (y al revés)
+        if (hay_mas and not hacia_atras) or (desde_cursor and hacia_atras):
+            siguiente = token_de(filas[-1], ADELANTE)
+        if (hay_mas and hacia_atras) or (desde_cursor and not hacia_atras):
+            anterior = token_de(filas[0], ATRAS)
+    return PaginaCursor(filas, siguiente, anterior)
+
+
+def contar_hasta(qs, limite):
+    """
+    Conteo exacto hasta 'limite' filas (COUNT sobre una subconsulta con
+    LIMIT): nunca recorre más que eso. Devuelve (total, supera_el_limite).
+    """
+    total = qs.order_by()[:limite + 1].count()
+    return min(total, limite), total > limite
+
+
+class PaginacionCursorMixin:
+    """
+    Para ListView: cambia la paginación por número de página (OFFSET y
+    COUNT(*)) por cursores. page_obj es una PaginaCursor y paginator queda en
+    None. orden_cursor (o get_orden_cursor) define el orden y debe terminar en
+    id. Con contar_hasta se agrega al contexto un conteo acotado
+    (total_aprox y total_supera).
+    """
+    paginate_by = 25
+    orden_cursor = ("-id",)
+    parametro_cursor = "cursor"
+    contar_hasta = None
+
+    def get_orden_cursor(self):
+        return self.orden_cursor
+
+    def paginate_queryset(self, queryset, page_size):
+        pagina = paginar_por_cursor(
+            queryset, self.get_orden_cursor(), self.request.GET.get(self.parametro_cursor), page_size,
+        )
+        return None, pagina, pagina.object_list, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.contar_hasta:
+            context["total_aprox"], context["total_supera"] = contar_hasta(self.object_list, self.contar_hasta)
+        return context
@@ -1,59 +1,50 @@
 from django.shortcuts import get_object_or_404, redirect
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db import transaction
-from django.db.models import Sum, F, DecimalField, ExpressionWrapper
-from django.db.models.functions import Coalesce
-from fonar.models import Pago, PagoAplicacion
-from dashboard.forms import PagoForm,  ValidatingPagoAplicacionFormSet
-
-
-class PagoListView(ListView):
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core import signing
+from fonar import extractos, reparto
+from fonar.busqueda import filtro_usuario
+from fonar.models import Pago, PagoAplicacion, Usuario
+from fonar.signals import recalculo_diferido
+from dashboard.forms import ImportarExtractoForm, PagoForm,  ValidatingPagoAplicacionFormSet
+from dashboard.views.mixins import StaffRequiredMixin
+from dashboard.views.paginacion import PaginacionCursorMixin
+
+
+class PagoListView(PaginacionCursorMixin, ListView):
     model = Pago
     template_name = "dashboard/pagos/list.html"
     context_object_name = "pagos"
     paginate_by = 10
+    contar_hasta = 1000
+
+    # valor de ?ordenar= → orden de la página (termina en id para el cursor)
+    ORDENES = {
+        "fecha": ("fecha", "id"),
+        "-fecha": ("-fecha", "-id"),
+        "monto_reportado": ("monto_reportado", "id"),
+        "-monto_reportado": ("-monto_reportado", "-id"),
+    }
+
+    def get_orden_cursor(self):
+        return self.ORDENES.get(self.request.GET.get("ordenar"), self.ORDENES["-fecha"])
 
     def get_queryset(self):
-        queryset = (
-            Pago.objects.select_related("usuario")
-            .annotate(
-                aplicado=Coalesce(
-                    Sum("aplicaciones__monto_aplicado"),
-                    0,
-                    output_field=DecimalField(max_digits=12, decimal_places=2),
-                )
-            )
-            .order_by("-fecha")
-        )
+        # lo aplicado sale de monto_aplicado_total (total_aplicado), sin sumar aplicaciones
+        queryset = Pago.objects.select_related("usuario")
 
         # ---- filtros ----
         usuario = self.request.GET.get("usuario")
         validado = self.request.GET.get("validado")
-        ordenar = self.request.GET.get("ordenar")
 
         if usuario:
-            queryset = queryset.filter(usuario__username__icontains=usuario)
+            queryset = queryset.filter(filtro_usuario(usuario))
 
         if validado in ["True", "False"]:
             queryset = queryset.filter(validado=(validado == "True"))
 
-        # ordenar
-        if ordenar == "fecha":
-            queryset = queryset.order_by("-fecha")
-        elif ordenar == "monto":
-            queryset = queryset.order_by("-monto_reportado")
-        elif ordenar == "usuario":
-            queryset = queryset.order_by("usuario__username")
-
-     # ordenamiento dinámico
-        ordenar = self.request.GET.get("ordenar")
-        if ordenar in ["fecha", "-fecha", "monto_reportado", "-monto_reportado"]:
-            queryset = queryset.order_by(ordenar)
-        else:
-            queryset = queryset.order_by("-fecha")  # por defecto
-
         return queryset
 
 class PagoCreateView(CreateView):
@@ -64,17 +55,43 @@ class PagoCreateView(CreateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        if "formset" in kwargs:
+            return context
         if self.request.POST:
             context["formset"] = ValidatingPagoAplicacionFormSet(self.request.POST)
         else:
             context["formset"] = ValidatingPagoAplicacionFormSet()
         return context
 
+    def post(self, request, *args, **kwargs):
+        if request.POST.get("action") == "repartir":
+            return self.prellenar_reparto()
+        return super().post(request, *args, **kwargs)
+
+    def prellenar_reparto(self):
+        """Vuelve a mostrar el formulario con las aplicaciones que propone el reparto automático"""
+        self.object = None
+        form = self.get_form()
+        if not form.is_valid():
+            return self.form_invalid(form)
+
+        pago = form.save(commit=False)
+        aplicaciones = reparto.calcular(pago)
+        formset = ValidatingPagoAplicacionFormSet(
+            initial=reparto.datos_iniciales(aplicaciones), form_kwargs={"usuario": pago.usuario},
+        )
+        formset.extra = max(len(aplicaciones), 1)
+        if aplicaciones:
+            messages.info(self.request, "⚡ Reparto automático listo: revisa las aplicaciones y guarda el pago.")
+        else:
+            messages.warning(self.request, "⚠️ No hay nada que repartir para este pago.")
+        return self.render_to_response(self.get_context_data(form=form, formset=formset))
+
     def form_valid(self, form):
         context = self.get_context_data()
         formset = context["formset"]
         if formset.is_valid():
-            with transaction.atomic():
+            with recalculo_diferido():
                 self.object = form.save()
                 formset.instance = self.object
                 formset.save()
@@ -109,7 +126,7 @@ class PagoUpdateView(UpdateView):
         context = self.get_context_data()
         formset = context["formset"]
         if formset.is_valid():
-            with transaction.atomic():
+            with recalculo_diferido():
                 self.object = form.save()
                 formset.instance = self.object
                 formset.save()
@@ -153,7 +170,60 @@ class PagoDetailView(DetailView):
         self.object = self.get_object()
         formset = ValidatingPagoAplicacionFormSet(self.request.POST, instance=self.object)
         if formset.is_valid():
-            formset.save()
+            with recalculo_diferido():
+                formset.save()
             messages.success(self.request, "✅ Aplicaciones del pago actualizadas.")
             return redirect("dashboard:pagos-detail", pk=self.object.pk)
         return self.render_to_response(self.get_context_data(formset=formset))
+
+
+class PagoImportarView(LoginRequiredMixin, StaffRequiredMixin, FormView):
+    """
+    Importa un extracto en dos pasos: al subirlo se muestra el reporte de
+    prueba (no escribe nada) y al confirmar se crean los pagos de las líneas
+    nuevas. Lo confirmado viaja firmado en el formulario, sin volver a subir
+    el archivo.
+    """
+    form_class = ImportarExtractoForm
+    template_name = "dashboard/pagos/importar.html"
+    success_url = reverse_lazy("dashboard:pagos-list")
+
+    def post(self, request, *args, **kwargs):
+        if request.POST.get("action") == "importar":
+            return self.importar()
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        archivo = form.cleaned_data["archivo"]
+        try:
+            lineas = extractos.analizar(extractos.leer(archivo, archivo.name))
+        except ValueError as error:
+            form.add_error("archivo", str(error))
+            return self.form_invalid(form)
+
+        usuarios = Usuario.objects.in_bulk({l.usuario_id for l in lineas if l.usuario_id})
+        for linea in lineas:
+            linea.usuario = usuarios.get(linea.usuario_id)
+        conteo, total = extractos.resumen(lineas)
+        return self.render_to_response(self.get_context_data(
+            form=form, lineas=lineas, conteo=conteo, total=total,
+            medio=form.cleaned_data["medio"], token=extractos.firmar(lineas),
+        ))
+
+    def importar(self):
+        medio = self.request.POST.get("medio")
+        try:
+            lineas = extractos.leer_firma(self.request.POST.get("token", ""))
+        except (signing.BadSignature, ValueError):
+            messages.error(self.request, "❌ El reporte venció o no es válido. Vuelve a subir el extracto.")
+            return redirect("dashboard:pagos-importar")
+        if medio not in extractos.MEDIOS:
+            messages.error(self.request, "❌ Medio de pago no válido.")
+            return redirect("dashboard:pagos-importar")
+
+        pagos = extractos.importar(lineas, medio)
+        omitidos = len(lineas) - len(pagos)
+        messages.success(self.request, f"✅ {len(pagos)} pagos importados y repartidos.")
+        if omitidos:
+            messages.warning(self.request, f"⚠️ {omitidos} líneas ya estaban registradas y se omitieron.")
+        return redirect(self.success_url)
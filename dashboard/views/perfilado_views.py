@@ -0,0 +1,29 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
+from django.views.generic import TemplateView
+
+from dashboard.views.mixins import StaffRequiredMixin
+from fonar.middleware import ventana, MAX_REGISTROS, UMBRAL_LENTO_MS, UMBRAL_N_MAS_1, VENTANA_SEGUNDOS
+
+
+class PerfiladoSQLView(LoginRequiredMixin, StaffRequiredMixin, TemplateView):
+    """Peores endpoints (tiempo SQL) de las peticiones perfiladas en la ventana reciente"""
+    template_name = "dashboard/perfilado/list.html"
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        try:
+            minutos = max(int(self.request.GET.get("minutos", "")), 1)
+        except ValueError:
+            minutos = VENTANA_SEGUNDOS // 60
+
+        ctx["minutos"] = minutos
+        ctx["endpoints"] = ventana.peores_endpoints(segundos=minutos * 60)
+        ctx["umbral_lento_ms"] = UMBRAL_LENTO_MS
+        ctx["umbral_n_mas_1"] = UMBRAL_N_MAS_1
+        ctx["max_registros"] = MAX_REGISTROS
+        return ctx
+
+    def post(self, request, *args, **kwargs):
+        ventana.limpiar()
+        return redirect("dashboard:perfilado")
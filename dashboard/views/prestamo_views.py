@@ -3,22 +3,43 @@ from django.urls import reverse_lazy
 from django.contrib import messages
 from django.db import transaction
 from django.core.paginator import Paginator
-from fonar.models import Prestamo, CuotaPrestamo
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Lower, Round
+from fonar.busqueda import filtro_usuario
+from fonar.models import Prestamo, CuotaPrestamo, Usuario
 from dashboard.forms import PrestamoForm
 
+# Capital pendiente como expresión SQL, redondeado a centavos igual que
+# Prestamo.capital_pendiente (SQLite resta los decimales como flotantes)
+MONEDA = DecimalField(max_digits=12, decimal_places=2)
+SALDO_PRESTAMO = Round(F("monto") - F("capital_pagado_total"), 2, output_field=MONEDA)
+
+
+def _por_usuario(prestamos, agregado):
+    """Subconsulta con el agregado de 'prestamos' del usuario de la fila externa (0 si no tiene)"""
+    subconsulta = (
+        prestamos.filter(usuario_id=OuterRef("pk"))
+        .order_by()
+        .values("usuario_id")
+        .annotate(total=agregado)
+        .values("total")
+    )
+    return Coalesce(Subquery(subconsulta), Value(0), output_field=agregado.output_field)
+
 
 class PrestamoListView(ListView):
     model = Prestamo
     template_name = "dashboard/prestamos/list.html"
     context_object_name = "prestamos"
-    paginate_by = 10  # paginación clásica (por préstamos) que usa ListView
+    usuarios_por_pagina = 10  # la página es de usuarios (grupos), no de préstamos
 
     def get_queryset(self):
         """
-        Filtros originales (usuario, fechas, montos).
-        OJO: NO filtramos por 'capital_pendiente' aquí porque no es campo de BD.
+        Filtros originales (usuario, fechas, montos) y el capital pendiente de
+        cada préstamo como anotación 'saldo' (monto - capital pagado validado),
+        para poder filtrar, ordenar y sumar por saldo en la base de datos.
         """
-        qs = Prestamo.objects.select_related("usuario").order_by("-fecha_desembolso")
+        qs = Prestamo.objects.annotate(saldo=SALDO_PRESTAMO).order_by("-fecha_desembolso")
 
         usuario = self.request.GET.get("usuario")
         fecha_inicio = self.request.GET.get("fecha_inicio")
@@ -27,7 +48,7 @@ class PrestamoListView(ListView):
         monto_max = self.request.GET.get("monto_max")
 
         if usuario:
-            qs = qs.filter(usuario__username__icontains=usuario)
+            qs = qs.filter(filtro_usuario(usuario))
 
         if fecha_inicio:
             qs = qs.filter(fecha_desembolso__gte=fecha_inicio)
@@ -43,63 +64,60 @@ class PrestamoListView(ListView):
 
     def get_context_data(self, **kwargs):
         """
-        Además del contexto clásico (page_obj/paginator/prestamos),
-        añadimos el agrupado por usuario usando un queryset NO paginado,
-        y ahí aplicamos el criterio de 'histórico' con la propiedad Python
-        'capital_pendiente' (no campo de BD).
+        Agrupado por usuario y paginado por usuario, todo en la base de datos:
+        una consulta cuenta los usuarios, otra trae la página con el saldo
+        acumulado y los créditos pendientes como subconsultas, y una última
+        trae los préstamos de esos usuarios. El costo no depende de cuántos
+        préstamos haya.
         """
         context = super().get_context_data(**kwargs)
 
         historico = self.request.GET.get("historico") == "1"
+        orden = self.request.GET.get("orden")
 
-        # ✅ Queryset completo y SIN paginar para el agrupado
-        full_qs = self.get_queryset().select_related("usuario")
-
-        # Helper para leer capital_pendiente de forma segura
-        def cap_pend(p):
-            # Usa la propiedad Python si existe; de lo contrario, 0 (no rompe)
-            return getattr(p, "capital_pendiente", 0) or 0
-
+        filtrados = self.get_queryset()
         # Si NO es histórico, ocultamos préstamos con saldo 0
-        if historico:
-            qs_display = list(full_qs)
+        mostrados = filtrados if historico else filtrados.filter(saldo__gt=0)
+
+        usuarios = (
+            Usuario.objects.filter(pk__in=mostrados.values("usuario_id"))
+            .annotate(
+                saldo_total=_por_usuario(mostrados, Sum("saldo", output_field=MONEDA)),
+                # los pendientes se cuentan sobre todos los filtrados, también en histórico
+                pendientes_count=_por_usuario(filtrados.filter(saldo__gt=0), Count("id")),
+            )
+        )
+        if orden == "saldo":
+            usuarios = usuarios.order_by("-saldo_total", Lower("username"), "pk")
         else:
-            qs_display = [p for p in full_qs if cap_pend(p) > 0]
-
-        # Contador de préstamos pendientes por usuario (usando full_qs)
-        pendientes_por_usuario = {}
-        for p in full_qs:
-            if cap_pend(p) > 0:
-                pendientes_por_usuario[p.usuario_id] = pendientes_por_usuario.get(p.usuario_id, 0) + 1
-
-        # Agrupar lo que se mostrará
-        grupos = {}  # user_id -> {"usuario": User, "prestamos": [Prestamo], "saldo_total": Decimal, "pendientes_count": int}
-        for p in qs_display:
-            d = grupos.get(p.usuario_id)
-            if not d:
-                d = {
-                    "usuario": p.usuario,
-                    "prestamos": [],
-                    "saldo_total": 0,
-                    "pendientes_count": pendientes_por_usuario.get(p.usuario_id, 0),
-                }
-                grupos[p.usuario_id] = d
-            d["prestamos"].append(p)
-            d["saldo_total"] += cap_pend(p)
-
-        # Orden por nombre de usuario (cámbialo a saldo_total desc si prefieres)
-        items = list(grupos.values())
-        items.sort(key=lambda x: (x["usuario"].username or "").lower())
-
-        # Paginación por usuario (independiente de la clásica)
+            usuarios = usuarios.order_by(Lower("username"), "pk")
+
+        # Paginación por usuario
         page_number = self.request.GET.get("page")
-        paginator_users = Paginator(items, self.paginate_by)
+        paginator_users = Paginator(usuarios, self.usuarios_por_pagina)
         users_page = paginator_users.get_page(page_number)
 
+        # Préstamos solo de los usuarios de la página
+        grupos = {
+            u.pk: {
+                "usuario": u,
+                "prestamos": [],
+                "saldo_total": u.saldo_total,
+                "pendientes_count": u.pendientes_count,
+            }
+            for u in users_page.object_list
+        }
+        if grupos:
+            for p in mostrados.filter(usuario_id__in=grupos):
+                p.usuario = grupos[p.usuario_id]["usuario"]
+                grupos[p.usuario_id]["prestamos"].append(p)
+        users_page.object_list = list(grupos.values())
+
         context["users_page"] = users_page
         context["paginator_users"] = paginator_users
         context["is_paginated_users"] = paginator_users.num_pages > 1
         context["historico"] = historico
+        context["orden"] = orden
 
         # Compatibilidad con plantillas antiguas
         context["prestamos_filtrados_estado"] = None
@@ -2,18 +2,19 @@ from django.views.generic import ListView, UpdateView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from dashboard.views.mixins import StaffRequiredMixin
+from dashboard.views.paginacion import PaginacionCursorMixin
+from fonar.busqueda import filtro_usuario
 from fonar.models import SolicitudPrestamo, Prestamo
-from decimal import Decimal, ROUND_HALF_UP
 
 
-class SolicitudListView(LoginRequiredMixin, StaffRequiredMixin, ListView):
+class SolicitudListView(LoginRequiredMixin, StaffRequiredMixin, PaginacionCursorMixin, ListView):
     model = SolicitudPrestamo
     template_name = "dashboard/solicitudes/list.html"
     context_object_name = "solicitudes"
-    ordering = ["-fecha_solicitud"]
+    orden_cursor = ("-fecha_solicitud", "-id")
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related("usuario")
 
         usuario = self.request.GET.get("usuario")
         estado = self.request.GET.get("estado")
@@ -22,7 +23,7 @@ class SolicitudListView(LoginRequiredMixin, StaffRequiredMixin, ListView):
 
         # 🔎 Filtro por usuario
         if usuario:
-            queryset = queryset.filter(usuario__username__icontains=usuario)
+            queryset = queryset.filter(filtro_usuario(usuario))
 
         # 🔎 Filtro por estado
         if estado:
@@ -43,52 +44,29 @@ class SolicitudUpdateView(LoginRequiredMixin, StaffRequiredMixin, UpdateView):
     template_name = "dashboard/solicitudes/update.html"
     success_url = reverse_lazy("dashboard:solicitudes-list")
 
-    def calcular_cuota_fija(self, monto, interes, cuotas):
-        interes_mensual = interes / Decimal('100')
-        if interes_mensual == 0:
-            return (monto / cuotas).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        cuota = monto * (interes_mensual * (1 + interes_mensual) ** cuotas) / (
-            (1 + interes_mensual) ** cuotas - 1
-        )
-        return cuota.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
     def get_context_data(self, **kwargs):
-        """Agrega la simulación de cuotas al contexto"""
+        """Agrega la simulación de cuotas al contexto (el mismo plan que se guardará)"""
         context = super().get_context_data(**kwargs)
         solicitud = self.object
 
-        cuotas = []
         if solicitud.monto and solicitud.cuotas and solicitud.interes is not None:
-            monto = Decimal(solicitud.monto)
-            interes = Decimal(solicitud.interes)
-            cuotas_totales = int(solicitud.cuotas)
-            cuota_fija = self.calcular_cuota_fija(monto, interes, cuotas_totales)
-
-            saldo = monto
-            interes_mensual = interes / Decimal('100')
-
-            for i in range(1, cuotas_totales + 1):
-                interes_mes = (saldo * interes_mensual).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                abono_capital = (cuota_fija - interes_mes).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                saldo -= abono_capital
-                saldo = saldo.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-                cuotas.append({
-                    "numero": i,
-                    "capital": round(abono_capital, 0),
-                    "interes": round(interes_mes, 0),
-                    "cuota": round(cuota_fija, 0),
-                    "saldo": round(max(saldo, 0), 0),
-                })
-
-            total_credito = monto
-            total_intereses = sum(c["interes"] for c in cuotas)
-            total_pagar = total_credito + Decimal(total_intereses)
+            plan = solicitud.plan_amortizacion()
+
+            cuotas = [
+                {
+                    "numero": periodo.numero,
+                    "capital": round(periodo.capital, 0),
+                    "interes": round(periodo.interes, 0),
+                    "cuota": round(periodo.cuota, 0),
+                    "saldo": round(max(periodo.saldo, 0), 0),
+                }
+                for periodo in plan.periodos
+            ]
 
             context["simulacion"] = cuotas
-            context["total_credito"] = total_credito
-            context["total_intereses"] = total_intereses
-            context["total_pagar"] = total_pagar
+            context["total_credito"] = plan.monto
+            context["total_intereses"] = plan.total_intereses
+            context["total_pagar"] = plan.monto + plan.total_intereses
 
         return context
 
@@ -1,24 +1,29 @@
 from dashboard.views.mixins import StaffRequiredMixin
+from dashboard.views.paginacion import PaginacionCursorMixin
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AdminPasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import View
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from dashboard.forms import UsuarioCreateForm, UsuarioUpdateForm
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, FormView
+from dashboard.forms import ImportarSociosForm, UsuarioCreateForm, UsuarioUpdateForm
+from fonar import altas, extractos
+from fonar.busqueda import filtro_usuario, sugerencias
 
 Usuario = get_user_model()
 
 
-class UsuarioListView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequiredMixin, ListView):
+class UsuarioListView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequiredMixin, PaginacionCursorMixin, ListView):
     model = Usuario
     template_name = "dashboard/usuarios/list.html"
     context_object_name = "usuarios"
     permission_required = "auth.view_user"
     paginate_by = 10
+    orden_cursor = ("username", "id")
+    contar_hasta = 1000
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -28,11 +33,8 @@ class UsuarioListView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequired
         staff = self.request.GET.get("staff")
         tipo_usuario = self.request.GET.get("tipo_usuario")
 
-        if search.strip():
-            qs = qs.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search)
-            )
+        # 🔎 usuario, nombre o correo (por prefijo de palabra, sin tildes)
+        qs = qs.filter(filtro_usuario(search, "pk"))
 
         if activo in {"1", "0"}:
             qs = qs.filter(is_active=(activo == "1"))
@@ -44,15 +46,7 @@ class UsuarioListView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequired
         if tipo_usuario in {"asociado", "tercero"}:
             qs = qs.filter(tipo_usuario=tipo_usuario)
 
-        return qs.order_by("username")
-
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        params = self.request.GET.copy()
-        # para que la paginación conserve filtros/búsqueda
-        params.pop("page", None)
-        ctx["params"] = params.urlencode()
-        return ctx
+        return qs
 
 
 class UsuarioCreateView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequiredMixin, CreateView):
@@ -63,6 +57,37 @@ class UsuarioCreateView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequir
     permission_required = "auth.add_user"
 
 
+class UsuarioImportarView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequiredMixin, FormView):
+    """
+    Alta masiva desde un CSV o XLSX. "Revisar" solo valida; "Crear" valida
+    otra vez el mismo archivo y crea los socios únicamente si ninguna fila
+    tiene errores. Las claves no se guardan entre un paso y otro.
+    """
+    form_class = ImportarSociosForm
+    template_name = "dashboard/usuarios/importar.html"
+    success_url = reverse_lazy("dashboard:usuarios-list")
+    permission_required = "auth.add_user"
+
+    def form_valid(self, form):
+        archivo = form.cleaned_data["archivo"]
+        try:
+            filas = altas.validar(extractos.leer(
+                archivo, archivo.name, alias=altas.ALIAS, obligatorias=altas.OBLIGATORIAS,
+            ))
+        except ValueError as error:
+            form.add_error("archivo", str(error))
+            return self.form_invalid(form)
+
+        con_errores = [f for f in filas if f.errores]
+        if self.request.POST.get("action") == "crear" and filas and not con_errores:
+            usuarios = altas.crear(filas)
+            messages.success(self.request, f"✅ {len(usuarios)} socios creados.")
+            return redirect(self.success_url)
+        if con_errores:
+            messages.warning(self.request, "⚠️ Corrige las filas con errores: no se creará ningún socio.")
+        return self.render_to_response(self.get_context_data(form=form, filas=filas, con_errores=len(con_errores)))
+
+
 class UsuarioUpdateView(LoginRequiredMixin, StaffRequiredMixin, PermissionRequiredMixin, UpdateView):
     model = Usuario
     form_class = UsuarioUpdateForm
@@ -95,3 +120,22 @@ class UsuarioPasswordChangeView(LoginRequiredMixin, StaffRequiredMixin, Permissi
             messages.success(request, "Contraseña actualizada correctamente.")
             return redirect("dashboard:usuarios-update", pk=usuario.pk)
         return render(request, self.template_name, {"form": form, "object": usuario})
+
+
+class UsuarioAutocompletarView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """Sugerencias para los filtros por usuario: GET ?q=texto → JSON con hasta 10 usuarios"""
+    limite = 10
+
+    def get(self, request):
+        usuarios = sugerencias(request.GET.get("q", ""), self.limite)
+        return JsonResponse({
+            "resultados": [
+                {
+                    "id": u.pk,
+                    "username": u.username,
+                    "nombre": u.get_full_name(),
+                    "email": u.email,
+                }
+                for u in usuarios
+            ]
+        })
@@ -1,5 +1,4 @@
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from decimal import Decimal, InvalidOperation
@@ -7,6 +6,8 @@ from django.forms.models import BaseInlineFormSet
 from .models import Usuario, Aporte, Prestamo, Retiro, CuotaPrestamo, Pago, PagoAplicacion, SolicitudPrestamo, TasaInteres
 from .forms import PagoAplicacionForm
 from django.utils.formats import number_format
+from django.utils.safestring import mark_safe
+from . import reparto
 
 
 # ========== InlineFormSet con validación ==========
@@ -63,6 +64,16 @@ class PagoAplicacionInlineFormSet(BaseInlineFormSet):
         return CustomFormset
 
 
+# ========== Reparto automático (?repartir=1 en la edición de un pago) ==========
+def reparto_pedido(request, obj):
+    """Aplicaciones propuestas para el faltante del pago, calculadas una vez por petición"""
+    if obj is None or request.method != "GET" or "repartir" not in request.GET:
+        return []
+    if not hasattr(request, "_reparto"):
+        request._reparto = reparto.calcular(obj)
+    return request._reparto
+
+
 # ========== Inline de PagoAplicacion ==========
 class PagoAplicacionInline(admin.TabularInline):
     model = PagoAplicacion
@@ -72,6 +83,9 @@ class PagoAplicacionInline(admin.TabularInline):
     can_delete = True
     fields = ("tipo", "cuota", "capital", "interes", "monto_aplicado", "fecha_aporte")
 
+    def get_extra(self, request, obj=None, **kwargs):
+        return len(reparto_pedido(request, obj)) or self.extra
+
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         from .models import Prestamo, CuotaPrestamo, Pago, PagoAplicacion
 
@@ -127,9 +141,11 @@ class PagoAdmin(admin.ModelAdmin):
     list_display = ("id", "usuario", "monto_reportado_moneda", "faltante", "validado", "fecha")
     inlines = [PagoAplicacionInline]
 
+    actions = ["repartir_faltante"]
+
     fieldsets = (
         ('Información del pago', {
-            'fields': ('usuario', 'monto_reportado', 'faltante', 'comentarios', 'soporte', 'fecha')
+            'fields': ('usuario', 'monto_reportado', 'faltante', 'reparto_automatico', 'comentarios', 'soporte', 'fecha')
         }),
         ('Gestión del administrador', {
             'fields': ('validado',)
@@ -138,14 +154,37 @@ class PagoAdmin(admin.ModelAdmin):
 
     def get_readonly_fields(self, request, obj=None):
         """Hace que ciertos campos sean editables al crear y de solo lectura al editar."""
+        # validado siempre es de solo lectura: lo derivan las señales del total aplicado
         if obj:  # Si es edición
-            return ('usuario', 'soporte', 'faltante')
-        return ('faltante',)  # En creación, solo 'faltante' y 'fecha' quedan readonly
+            return ('usuario', 'soporte', 'faltante', 'validado', 'reparto_automatico')
+        return ('faltante', 'validado', 'reparto_automatico')  # En creación, solo 'faltante' y 'fecha' quedan readonly
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        aplicaciones = reparto_pedido(request, obj) if isinstance(inline, PagoAplicacionInline) else []
+        if aplicaciones:
+            kwargs["initial"] = reparto.datos_iniciales(aplicaciones)
+        return kwargs
+
+    def reparto_automatico(self, obj):
+        if obj is None or not obj.pk:
+            return "Guarda el pago para usar el reparto automático."
+        if obj.faltante <= 0:
+            return "El pago ya está aplicado por completo."
+        return mark_safe(
+            '<a class="button" href="?repartir=1">⚡ Prellenar reparto automático</a> '
+            '<span class="help">Interés y capital de las cuotas del mes, aporte mensual y el resto como aporte adicional. '
+            'Revisa las filas y guarda.</span>'
+        )
+    reparto_automatico.short_description = "Reparto automático"
+
+    @admin.action(description="⚡ Repartir automáticamente el faltante de los pagos seleccionados")
+    def repartir_faltante(self, request, queryset):
+        repartidos = sum(1 for pago in queryset if reparto.aplicar(pago))
+        self.message_user(request, f"✅ Se repartieron {repartidos} pago(s).")
 
     def faltante(self, obj):
-        total_aplicado = obj.aplicaciones.aggregate(total=Sum("monto_aplicado"))["total"] or 0
-        valor = obj.monto_reportado - total_aplicado
-        return f"${number_format(valor, decimal_pos=2)}"
+        return f"${number_format(obj.faltante, decimal_pos=2)}"
     faltante.short_description = "Monto faltante por cruzar"
 
     def monto_reportado_moneda(self, obj):
@@ -153,39 +192,31 @@ class PagoAdmin(admin.ModelAdmin):
     monto_reportado_moneda.short_description = "Monto reportado"
 
     def save_related(self, request, form, formsets, change):
-        super().save_related(request, form, formsets, change)
-
-        from .models import PagoAplicacion
-        from .signals import recalcular_cuota, recalcular_pago
-
-        pago = form.instance
-
-        # Recalcular todas las cuotas asociadas al pago
-        aplicaciones = PagoAplicacion.objects.filter(pago=pago)
-        for app in aplicaciones:
-            if app.cuota:
-                recalcular_cuota(app.cuota)
+        from .signals import recalculo_diferido
 
-        # Recalcular el estado del pago
-        recalcular_pago(pago)
+        # Las señales anotan las cuotas/pagos afectados y se recalculan una sola vez
+        # al salir del bloque; el estado del pago se recalcula siempre, como antes.
+        with recalculo_diferido() as pendientes:
+            super().save_related(request, form, formsets, change)
+            pendientes["pagos"].add(form.instance.pk)
 
 # ========== Admin de Usuario ==========
 @admin.register(Usuario)
 class UsuarioAdmin(UserAdmin):
     list_display = ('username', 'email', 'tipo_usuario', 'is_admin', 'is_staff', 'is_active')
     list_filter = ('tipo_usuario', 'is_admin', 'is_staff')
-    search_fields = ('username', 'email')
+    search_fields = ('username', 'email', 'telefono', 'documento')
     ordering = ('username',)
 
     fieldsets = UserAdmin.fieldsets + (
         ('Información adicional', {
-            'fields': ('tipo_usuario', 'is_admin')
+            'fields': ('tipo_usuario', 'is_admin', 'telefono', 'documento')
         }),
     )
 
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Información adicional', {
-            'fields': ('tipo_usuario', 'is_admin')
+            'fields': ('tipo_usuario', 'is_admin', 'telefono', 'documento')
         }),
     )
 
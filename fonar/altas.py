@@ -0,0 +1,180 @@
+"""
+Alta masiva de socios desde un CSV (o XLSX) con una fila por socio.
+
+validar() revisa todas las filas juntas: formato de cada campo, claves con
+los validadores de AUTH_PASSWORD_VALIDATORS, y usuarios o documentos
+repetidos en el archivo o ya registrados (una sola consulta). No escribe.
+
+crear() hashea las claves en paralelo (claves.hashear) antes de abrir la
+transacción y luego, todo junto, crea los usuarios con bulk_create, sus
+aportes iniciales y sus términos de búsqueda. bulk_create no pasa por
+Usuario.save ni por las señales: el celular y el documento se normalizan
+aquí, los términos se escriben con busqueda.actualizar_terminos y los
+resúmenes anuales y la caché se ponen al día con recalculo_diferido.
+
+Una fila sin clave crea el usuario con la clave inhabilitada; se le asigna
+después desde el dashboard.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db.models import Q
+from django.utils import timezone
+
+from . import busqueda, claves, extractos
+from .models import Aporte, Usuario, normalizar_telefono, solo_digitos
+from .signals import recalculo_diferido
+
+LOTE = 500
+
+# encabezado normalizado → campo
+ALIAS = {
+    "usuario": "username", "username": "username",
+    "clave": "clave", "contrasena": "clave", "password": "clave",
+    "nombre": "first_name", "nombres": "first_name", "first_name": "first_name",
+    "apellido": "last_name", "apellidos": "last_name", "last_name": "last_name",
+    "correo": "email", "correo_electronico": "email", "email": "email",
+    "tipo": "tipo_usuario", "tipo_usuario": "tipo_usuario",
+    "telefono": "telefono", "celular": "telefono",
+    "documento": "documento", "cedula": "documento", "cc": "documento",
+    "aporte": "aporte", "aporte_inicial": "aporte", "saldo_inicial": "aporte",
+    "fecha_aporte": "fecha_aporte",
+}
+OBLIGATORIAS = {"username"}
+TIPOS = dict(Usuario.TIPO_CHOICES)
+
+
+@dataclass
+class FilaAlta:
+    numero: int
+    username: str = ""
+    clave: str = ""
+    first_name: str = ""
+    last_name: str = ""
+    email: str = ""
+    tipo_usuario: str = "asociado"
+    telefono: str = ""
+    documento: str = ""
+    aporte: Decimal = None
+    fecha_aporte: date = None
+    errores: list = field(default_factory=list)
+
+
+def _fila(numero, datos, hoy):
+    texto = {campo: extractos.texto_celda(datos.get(campo)) for campo in ALIAS.values()}
+    alta = FilaAlta(
+        numero=numero,
+        username=texto["username"],
+        clave=texto["clave"],
+        first_name=texto["first_name"],
+        last_name=texto["last_name"],
+        email=texto["email"].lower(),
+        tipo_usuario=texto["tipo_usuario"].lower() or "asociado",
+        telefono=normalizar_telefono(texto["telefono"]),
+        documento=solo_digitos(texto["documento"]),
+        fecha_aporte=hoy,
+    )
+    errores = alta.errores
+
+    if not alta.username:
+        errores.append("Falta el usuario")
+    else:
+        try:
+            UnicodeUsernameValidator()(alta.username)
+        except ValidationError:
+            errores.append(f"Usuario no válido: {alta.username!r}")
+    if alta.email:
+        try:
+            validate_email(alta.email)
+        except ValidationError:
+            errores.append(f"Correo no válido: {alta.email!r}")
+    if alta.tipo_usuario not in TIPOS:
+        errores.append(f"Tipo de usuario no válido: {alta.tipo_usuario!r}")
+    for campo, maximo in (("username", 150), ("first_name", 150), ("last_name", 150), ("telefono", 20), ("documento", 20)):
+        if len(getattr(alta, campo)) > maximo:
+            errores.append(f"{campo} supera {maximo} caracteres")
+
+    if texto["aporte"]:
+        alta.aporte = extractos.monto_de(datos.get("aporte"))
+        if alta.aporte is None or alta.aporte < 0:
+            errores.append(f"Aporte inicial no válido: {texto['aporte']!r}")
+    if texto["fecha_aporte"]:
+        momento = extractos.momento_de(datos.get("fecha_aporte"))
+        if momento is None:
+            errores.append(f"Fecha de aporte no válida: {texto['fecha_aporte']!r}")
+        else:
+            alta.fecha_aporte = timezone.localtime(momento).date()
+    return alta
+
+
+def _usuario(alta):
+    return Usuario(
+        username=alta.username, first_name=alta.first_name, last_name=alta.last_name,
+        email=alta.email, tipo_usuario=alta.tipo_usuario, telefono=alta.telefono, documento=alta.documento,
+    )
+
+
+def validar(filas):
+    """FilaAlta de cada fila, con sus errores. No escribe nada."""
+    hoy = timezone.localdate()
+    altas = [_fila(numero, datos, hoy) for numero, datos in enumerate(filas, start=1)]
+
+    usernames = {a.username for a in altas if a.username}
+    documentos = {a.documento for a in altas if a.documento}
+    registrados = Usuario.objects.filter(Q(username__in=usernames) | Q(documento__in=documentos))
+    usernames_usados, documentos_usados = set(), set()
+    for username, documento in registrados.values_list("username", "documento"):
+        usernames_usados.add(username)
+        if documento:
+            documentos_usados.add(documento)
+
+    vistos, documentos_vistos = set(), set()
+    for alta in altas:
+        if alta.username in usernames_usados:
+            alta.errores.append("El usuario ya existe")
+        elif alta.username and alta.username in vistos:
+            alta.errores.append("Usuario repetido en el archivo")
+        if alta.documento in documentos_usados:
+            alta.errores.append("Ya hay un socio con ese documento")
+        elif alta.documento and alta.documento in documentos_vistos:
+            alta.errores.append("Documento repetido en el archivo")
+        vistos.add(alta.username)
+        documentos_vistos.add(alta.documento)
+
+        if alta.clave and not alta.errores:
+            try:
+                validate_password(alta.clave, user=_usuario(alta))
+            except ValidationError as error:
+                alta.errores.extend(error.messages)
+    return altas
+
+
+def crear(altas, procesos=None):
+    """
+    Crea los usuarios de las filas sin errores y sus aportes iniciales, en
+    una transacción. Devuelve los usuarios creados.
+    """
+    validas = [a for a in altas if not a.errores]
+    hashes = iter(claves.hashear([a.clave for a in validas if a.clave], procesos))
+    usuarios = []
+    for alta in validas:
+        usuario = _usuario(alta)
+        usuario.password = next(hashes) if alta.clave else make_password(None)
+        usuarios.append(usuario)
+
+    with recalculo_diferido() as pendientes:
+        usuarios = Usuario.objects.bulk_create(usuarios, batch_size=LOTE)
+        aportes = Aporte.objects.bulk_create([
+            Aporte(usuario=usuario, fecha_aporte=alta.fecha_aporte, monto=alta.aporte)
+            for alta, usuario in zip(validas, usuarios) if alta.aporte
+        ], batch_size=LOTE)
+        busqueda.actualizar_terminos(usuarios)
+        # bulk_create no dispara señales: se anotan los resúmenes de los aportes
+        pendientes["resumenes"].update((a.usuario_id, a.fecha_aporte.year) for a in aportes)
+    return usuarios
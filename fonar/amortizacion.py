@@ -0,0 +1,154 @@
+"""
+Motor de amortización (sistema francés, cuota fija).
+
+Funciones puras, sin acceso a la base de datos. Las usan Prestamo,
+SolicitudPrestamo y el simulador del dashboard, así lo que se simula es
+exactamente lo que se guarda como CuotaPrestamo.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+
+from dateutil.relativedelta import relativedelta
+
+CENTAVO = Decimal("0.01")
+
+# Planes distintos que se guardan en memoria (monto, interés, cuotas)
+PLANES_EN_CACHE = 512
+
+
+def redondear(valor):
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class PeriodoAmortizacion:
+    numero: int
+    cuota: Decimal
+    capital: Decimal
+    interes: Decimal
+    saldo: Decimal  # saldo de capital después de pagar este periodo
+
+
+@dataclass(frozen=True)
+class PlanAmortizacion:
+    monto: Decimal
+    interes: Decimal  # tasa mensual en %
+    cuotas: int
+    cuota_fija: Decimal
+    periodos: tuple
+
+    @property
+    def total_capital(self):
+        return sum((p.capital for p in self.periodos), Decimal("0"))
+
+    @property
+    def total_intereses(self):
+        return sum((p.interes for p in self.periodos), Decimal("0"))
+
+    @property
+    def total_pagar(self):
+        return sum((p.cuota for p in self.periodos), Decimal("0"))
+
+
+def _a_decimal(valor):
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def calcular_cuota_fija(monto, interes, cuotas):
+    """Cuota fija mensual para `monto` a `cuotas` meses con tasa mensual `interes` (%)."""
+    monto = _a_decimal(monto)
+    cuotas = int(cuotas)
+    interes_mensual = _a_decimal(interes) / Decimal("100")
+    if interes_mensual == 0:
+        return redondear(monto / cuotas)
+    cuota = monto * (interes_mensual * (1 + interes_mensual) ** cuotas) / (
+        (1 + interes_mensual) ** cuotas - 1
+    )
+    return redondear(cuota)
+
+
+def plan_amortizacion(monto, interes, cuotas):
+    """
+    Plan completo (capital, interés y saldo por periodo).
+    El resultado es inmutable y se memoiza por (monto, interes, cuotas).
+    """
+    return _plan_amortizacion(_a_decimal(monto), _a_decimal(interes), int(cuotas))
+
+
+@lru_cache(maxsize=PLANES_EN_CACHE)
+def _plan_amortizacion(monto, interes, cuotas):
+    cuota_fija = calcular_cuota_fija(monto, interes, cuotas)
+    interes_mensual = interes / Decimal("100")
+    saldo = monto
+    periodos = []
+
+    for i in range(1, cuotas + 1):
+        interes_periodo = redondear(saldo * interes_mensual)
+        capital = redondear(cuota_fija - interes_periodo)
+
+        # última cuota ajusta saldo
+        if i == cuotas:
+            capital = redondear(saldo)
+            cuota = redondear(capital + interes_periodo)
+        else:
+            cuota = cuota_fija
+
+        saldo = redondear(saldo - capital)
+        periodos.append(PeriodoAmortizacion(
+            numero=i,
+            cuota=cuota,
+            capital=capital,
+            interes=interes_periodo,
+            saldo=saldo,
+        ))
+
+    return PlanAmortizacion(
+        monto=monto,
+        interes=interes,
+        cuotas=cuotas,
+        cuota_fija=cuota_fija,
+        periodos=tuple(periodos),
+    )
+
+
+def cuotas_programadas(monto, interes, cuotas, fecha_desembolso):
+    """
+    Filas (numero, fecha_vencimiento, monto_cuota, capital, interes) del plan,
+    con vencimientos mensuales desde la fecha de desembolso.
+    """
+    fecha_venc = fecha_desembolso
+    filas = []
+    for periodo in plan_amortizacion(monto, interes, cuotas).periodos:
+        fecha_venc = fecha_venc + relativedelta(months=+1)
+        filas.append((periodo.numero, fecha_venc, periodo.cuota, periodo.capital, periodo.interes))
+    return filas
+
+
+def simular_escenarios(escenarios, fecha_desembolso=None):
+    """
+    Planes de varios escenarios (monto, interes, cuotas) para compararlos.
+    Escenarios repetidos o ya simulados salen de la memoria de
+    plan_amortizacion. Con fecha_desembolso cada periodo trae su vencimiento,
+    igual que las CuotaPrestamo que se guardarían.
+    """
+    resultados = []
+    for monto, interes, cuotas in escenarios:
+        plan = plan_amortizacion(monto, interes, cuotas)
+        vencimientos = [None] * plan.cuotas
+        if fecha_desembolso:
+            vencimientos = [fila[1] for fila in cuotas_programadas(monto, interes, cuotas, fecha_desembolso)]
+        resultados.append((plan, vencimientos))
+    return resultados
+
+
+def programar_lote(prestamos):
+    """
+    Calcula las filas de varios préstamos: recibe tuplas
+    (prestamo_id, monto, interes, cuotas, fecha_desembolso) y devuelve
+    (prestamo_id, filas). No usa Django, así se puede repartir entre procesos.
+    """
+    return [
+        (prestamo_id, cuotas_programadas(monto, interes, cuotas, fecha_desembolso))
+        for prestamo_id, monto, interes, cuotas, fecha_desembolso in prestamos
+    ]
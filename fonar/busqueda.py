@@ -0,0 +1,136 @@
+"""
+Búsqueda de usuarios para los filtros del dashboard y el autocompletado.
+
+Cada palabra de usuario, nombre, apellido y correo se normaliza (minúsculas,
+sin tildes, solo letras y dígitos) y se guardan todos sus prefijos en
+TerminoBusqueda. Así "buscar por el comienzo de cualquier palabra" es una
+igualdad sobre un índice, igual en SQLite y en PostgreSQL, en vez de un
+LIKE '%...%' que recorre la tabla. Con varias palabras el usuario debe
+coincidir con todas.
+
+Si no hay coincidencias exactas, sugerencias() prueba palabras parecidas
+(errores de digitación) a partir de prefijos más cortos.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import TerminoBusqueda, Usuario
+
+LARGO_MAXIMO = 30  # = TerminoBusqueda.termino.max_length
+CAMPOS = ("username", "first_name", "last_name", "email")
+PARECIDO = 0.75  # razón mínima de SequenceMatcher para una palabra parecida
+CANDIDATOS = 500
+
+_PALABRA = re.compile(r"[^\W_]+")
+
+
+def palabras(texto):
+    """Palabras normalizadas de texto: 'José Pérez-Núñez' → ['jose', 'perez', 'nunez']"""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return [p[:LARGO_MAXIMO] for p in _PALABRA.findall(texto)]
+
+
+def terminos(*textos):
+    """{prefijo: es_palabra_completa} de todas las palabras de los textos"""
+    resultado = {}
+    for palabra in palabras(" ".join(t or "" for t in textos)):
+        for fin in range(1, len(palabra) + 1):
+            prefijo = palabra[:fin]
+            resultado[prefijo] = resultado.get(prefijo, False) or fin == len(palabra)
+    return resultado
+
+
+def texto_de(usuario):
+    return " ".join(getattr(usuario, campo) or "" for campo in CAMPOS)
+
+
+def actualizar_terminos(usuarios):
+    """Reescribe los términos de estos usuarios (ya guardados) con un delete y un bulk_create"""
+    usuarios = [u for u in usuarios if u.pk]
+    if not usuarios:
+        return
+    filas = [
+        TerminoBusqueda(usuario_id=u.pk, termino=termino, completo=completo)
+        for u in usuarios
+        for termino, completo in terminos(texto_de(u)).items()
+    ]
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(usuario_id__in=[u.pk for u in usuarios]).delete()
+        TerminoBusqueda.objects.bulk_create(filas, batch_size=1000)
+
+
+def ids_usuarios(texto):
+    """
+    Subconsulta (sin evaluar) con los id de usuarios que tienen alguna palabra
+    que empieza por cada palabra de texto. None si texto no tiene palabras.
+    """
+    buscadas = palabras(texto)
+    if not buscadas:
+        return None
+    ids = None
+    for palabra in dict.fromkeys(buscadas):
+        coincide = TerminoBusqueda.objects.filter(termino=palabra)
+        if ids is not None:
+            coincide = coincide.filter(usuario_id__in=ids)
+        ids = coincide.values("usuario_id")
+    return ids
+
+
+def filtro_usuario(texto, campo="usuario"):
+    """
+    Q para filtrar cualquier queryset por el usuario en 'campo' (p. ej.
+    "usuario", "pago__usuario" o "pk" sobre Usuario). Texto vacío no filtra.
+    """
+    ids = ids_usuarios(texto)
+    if ids is None:
+        return Q()
+    return Q(**{f"{campo}__in": ids})
+
+
+def _usuarios_parecidos(palabra):
+    """
+    Ids de usuarios con alguna palabra parecida a 'palabra': candidatos que
+    comparten al menos la mitad inicial y pasan el umbral de SequenceMatcher.
+    """
+    minimo = max(2, len(palabra) // 2)
+    if len(palabra) <= minimo:
+        return set()
+    prefijos = [palabra[:fin] for fin in range(minimo, len(palabra))]
+    candidatos = (
+        TerminoBusqueda.objects.filter(
+            completo=True,
+            usuario_id__in=TerminoBusqueda.objects.filter(termino__in=prefijos).values("usuario_id"),
+        )
+        .values_list("usuario_id", "termino")[:CANDIDATOS]
+    )
+    return {
+        usuario_id for usuario_id, termino in candidatos
+        if SequenceMatcher(None, palabra, termino).ratio() >= PARECIDO
+    }
+
+
+def sugerencias(texto, limite=10):
+    """
+    Usuarios para el autocompletado: primero los que coinciden por prefijo y,
+    si no hay ninguno, los que tienen palabras parecidas a todas las buscadas.
+    """
+    ids = ids_usuarios(texto)
+    if ids is None:
+        return []
+    encontrados = list(Usuario.objects.filter(pk__in=ids).order_by("username")[:limite])
+    if encontrados:
+        return encontrados
+
+    parecidos = None
+    for palabra in dict.fromkeys(palabras(texto)):
+        exactos = set(TerminoBusqueda.objects.filter(termino=palabra).values_list("usuario_id", flat=True)[:CANDIDATOS])
+        ids_palabra = exactos | _usuarios_parecidos(palabra)
+        parecidos = ids_palabra if parecidos is None else parecidos & ids_palabra
+        if not parecidos:
+            return []
+    return list(Usuario.objects.filter(pk__in=parecidos).order_by("username")[:limite])
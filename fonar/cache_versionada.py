@@ -0,0 +1,71 @@
+"""
+Caché de cálculos (dashboard, entrega de fondo) atada a una versión de los datos.
+
+Cada entrada se guarda con la versión actual en la clave. Cualquier escritura
+en aportes, pagos, préstamos o balances cambia la versión (señales en
+signals.py) y las entradas viejas dejan de usarse: no hace falta borrarlas una
+por una y funciona entre workers mientras compartan la caché "datos" (base de
+datos o carpeta local, ver CACHES en settings).
+"""
+import functools
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+ALIAS = "datos"
+CLAVE_VERSION = "fonar:version_datos"
+SEGUNDOS = getattr(settings, "CACHE_DATOS_SEGUNDOS", 60 * 60 * 24)
+
+
+def cache_datos():
+    """La caché compartida entre workers (CACHES["datos"] en settings)"""
+    return caches[ALIAS]
+
+
+def version_datos():
+    cache = cache_datos()
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # add: si otro worker la creó primero, se usa la suya
+        cache.add(CLAVE_VERSION, uuid.uuid4().hex, None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def subir_version():
+    # un valor nuevo (no un contador) para no chocar con entradas viejas si la
+    # clave de versión se pierde y vuelve a crearse
+    cache_datos().set(CLAVE_VERSION, uuid.uuid4().hex, None)
+
+
+def invalidar():
+    """
+    Cambia la versión al confirmar la transacción actual (en seguida si no hay
+    ninguna). Si se invalida antes, otro worker podría recalcular con los datos
+    viejos y guardarlos con la versión nueva. Varias escrituras en el mismo
+    bloque atómico suben la versión una sola vez.
+    """
+    # La marca en la conexión es el bloque y una referencia débil a la subida
+    # pendiente: al confirmar (se ejecuta) o revertir (se descarta) Django suelta
+    # la función y la marca deja de valer
+    bloque = tuple(connection.savepoint_ids)
+    pendiente = getattr(connection, "fonar_version_pendiente", None)
+    if pendiente is not None and pendiente[0] == bloque and pendiente[1]() is not None:
+        return
+    publicar = functools.partial(subir_version)
+    connection.fonar_version_pendiente = (bloque, weakref.ref(publicar))
+    transaction.on_commit(publicar)
+
+
+def en_cache(nombre, calcular, *partes):
+    """Valor de calcular() guardado bajo nombre + partes + versión de los datos"""
+    cache = cache_datos()
+    clave = ":".join(["fonar", nombre, str(version_datos()), *map(str, partes)])
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, SEGUNDOS)
+    return valor
@@ -0,0 +1,33 @@
+"""
+Hash de contraseñas en varios procesos, para las altas masivas (fonar.altas).
+
+PBKDF2 tarda cientos de milisegundos por clave a propósito y ocupa un núcleo
+mientras tanto: cientos de socios nuevos son minutos en un solo proceso.
+hashear() reparte las claves en trozos entre un ProcessPoolExecutor.
+
+Este módulo no importa modelos: los procesos hijos solo necesitan los
+settings (PASSWORD_HASHERS), así que también sirve donde los procesos
+arrancan con spawn en vez de fork.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+
+MINIMO_EN_PARALELO = 8  # con menos claves no compensa arrancar los procesos
+
+
+def _hashear_trozo(claves):
+    return [make_password(clave) for clave in claves]
+
+
+def hashear(claves, procesos=None):
+    """make_password de cada clave, en el mismo orden. procesos=None usa todos los núcleos."""
+    claves = list(claves)
+    procesos = min(procesos or os.cpu_count() or 1, len(claves))
+    if procesos < 2 or len(claves) < MINIMO_EN_PARALELO:
+        return _hashear_trozo(claves)
+    tamano = -(-len(claves) // procesos)
+    trozos = [claves[i:i + tamano] for i in range(0, len(claves), tamano)]
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        return [h for hashes in ejecutor.map(_hashear_trozo, trozos) for h in hashes]
@@ -0,0 +1,171 @@
+"""
+Generador de un fondo sintético para medir rendimiento en local.
+
+Crea socios y terceros (usuarios "demo_*"), aportes mensuales, préstamos con
+su plan de cuotas y pagos aplicados total o parcialmente. Todo se inserta con
+bulk_create y al final se recalculan los totales desnormalizados y el
+resumen anual con recalcular_todo, así el resultado es el mismo que si se
+hubiera cargado a mano.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import amortizacion, busqueda
+from .models import Aporte, CuotaPrestamo, Pago, PagoAplicacion, Prestamo, Usuario
+from .signals import recalculo_diferido
+
+PREFIJO = "demo_"
+CLAVE_DEMO = "demo1234"
+LOTE = 1000
+
+MONTOS_APORTE = [Decimal("50000"), Decimal("100000"), Decimal("150000"), Decimal("200000")]
+OTROS_CONCEPTOS = ["aporte_viaje", "admin_app", "actividad_recaudo"]
+HOSTS_LOCALES = ("", "localhost", "127.0.0.1", "::1")
+
+
+def es_base_local():
+    """SQLite o un servidor en esta máquina: no escribir datos de prueba en producción"""
+    if connection.vendor == "sqlite":
+        return True
+    return connection.settings_dict.get("HOST") in HOSTS_LOCALES
+
+
+def borrar_fondo():
+    """Elimina los usuarios demo_* y todo lo que cuelga de ellos"""
+    with recalculo_diferido():
+        borrados, _ = Usuario.objects.filter(username__startswith=PREFIJO).delete()
+    return borrados
+
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        mes += 1
+        if mes > 12:
+            anio, mes = anio + 1, 1
+
+
+def _momento(dia):
+    return timezone.make_aware(datetime.combine(dia, time(10, 0)))
+
+
+def generar_fondo(socios=50, terceros=10, anios=2, prestamos_max=2, semilla=1):
+    """
+    Genera el fondo y devuelve un dict con cuántas filas se crearon de cada tipo.
+    Es determinista para una misma semilla.
+    """
+    rnd = random.Random(semilla)
+    hoy = timezone.localdate()
+    inicio = date(hoy.year - anios + 1, 1, 1)
+    clave = make_password(CLAVE_DEMO)
+
+    with transaction.atomic():
+        # ---- Usuarios ----
+        usuarios = [
+            Usuario(
+                username=f"{PREFIJO}socio_{i:05d}", first_name=f"Socio {i}", last_name="Demo",
+                email=f"socio{i}@demo.fonar", tipo_usuario="asociado", password=clave,
+            )
+            for i in range(1, socios + 1)
+        ] + [
+            Usuario(
+                username=f"{PREFIJO}tercero_{i:05d}", first_name=f"Tercero {i}", last_name="Demo",
+                email=f"tercero{i}@demo.fonar", tipo_usuario="tercero", password=clave,
+            )
+            for i in range(1, terceros + 1)
+        ]
+        usuarios = Usuario.objects.bulk_create(usuarios, batch_size=LOTE)
+        busqueda.actualizar_terminos(usuarios)  # bulk_create no pasa por la señal
+
+        # ---- Aportes mensuales de los socios (algunos meses se saltan) ----
+        aportes = [
+            Aporte(
+                usuario=u, fecha_aporte=date(anio, mes, rnd.randint(1, 28)),
+                monto=rnd.choice(MONTOS_APORTE),
+            )
+            for u in usuarios if u.tipo_usuario == "asociado"
+            for anio, mes in _meses(inicio, hoy)
+            if rnd.random() < 0.9
+        ]
+        aportes = [a for a in aportes if a.fecha_aporte <= hoy]
+        Aporte.objects.bulk_create(aportes, batch_size=LOTE)
+
+        # ---- Préstamos (bulk_create no pasa por save: las cuotas se crean aquí) ----
+        dias_periodo = (hoy - inicio).days
+        prestamos = []
+        for u in usuarios:
+            minimo = 1 if u.tipo_usuario == "tercero" else 0
+            for _ in range(rnd.randint(minimo, prestamos_max)):
+                prestamos.append(Prestamo(
+                    usuario=u,
+                    monto=Decimal(rnd.randint(5, 100) * 100000),
+                    interes=rnd.choice([Decimal("1.50"), Decimal("2.00"), Decimal("2.50")]),
+                    cuotas=rnd.choice([3, 6, 12, 18, 24]),
+                    fecha_desembolso=inicio + timedelta(days=rnd.randint(0, dias_periodo)),
+                ))
+        prestamos = Prestamo.objects.bulk_create(prestamos, batch_size=LOTE)
+
+        cuotas = [
+            CuotaPrestamo(
+                prestamo=p, numero=numero, fecha_vencimiento=vence, monto_cuota=monto_cuota,
+                capital=capital, interes=interes, saldo=p.monto, pagada=False,
+            )
+            for p in prestamos
+            for numero, vence, monto_cuota, capital, interes in amortizacion.cuotas_programadas(
+                p.monto, p.interes, p.cuotas, p.fecha_desembolso
+            )
+        ]
+        cuotas = CuotaPrestamo.objects.bulk_create(cuotas, batch_size=LOTE)
+
+        # ---- Pagos de cuotas vencidas: la mayoría completos, algunos parciales ----
+        pagos, aplicaciones = [], []
+        for c in cuotas:
+            if c.fecha_vencimiento > hoy or rnd.random() > 0.85:
+                continue
+            pago = Pago(usuario=c.prestamo.usuario, monto_reportado=c.monto_cuota, fecha=_momento(c.fecha_vencimiento))
+            parcial = rnd.random() < 0.15
+            capital = (c.capital / 2).quantize(amortizacion.CENTAVO) if parcial else c.capital
+            pagos.append(pago)
+            aplicaciones.append((pago, PagoAplicacion(
+                tipo="prestamo", prestamo=c.prestamo, cuota=c, capital=capital, interes=c.interes,
+                monto_aplicado=capital + c.interes,
+            )))
+
+        # ---- Otros aportes (viaje, administración, actividades) ----
+        for u in usuarios:
+            if u.tipo_usuario != "asociado":
+                continue
+            for _ in range(rnd.randint(0, 3)):
+                dia = inicio + timedelta(days=rnd.randint(0, dias_periodo))
+                monto = Decimal(rnd.randint(1, 10) * 10000)
+                pago = Pago(usuario=u, monto_reportado=monto, fecha=_momento(dia))
+                pagos.append(pago)
+                aplicaciones.append((pago, PagoAplicacion(
+                    tipo=rnd.choice(OTROS_CONCEPTOS), monto_aplicado=monto, fecha_aporte=dia,
+                )))
+
+        Pago.objects.bulk_create(pagos, batch_size=LOTE)
+        for pago, aplicacion in aplicaciones:
+            aplicacion.pago = pago
+        PagoAplicacion.objects.bulk_create([a for _, a in aplicaciones], batch_size=LOTE)
+
+        # bulk_create no dispara señales: totales de cuotas, pagos y préstamos,
+        # y después el resumen anual que depende de ellos
+        call_command("recalcular_todo", stdout=StringIO())
+
+    return {
+        "usuarios": len(usuarios),
+        "aportes": len(aportes),
+        "prestamos": len(prestamos),
+        "cuotas": len(cuotas),
+        "pagos": len(pagos),
+        "aplicaciones": len(aplicaciones),
+    }
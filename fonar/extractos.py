@@ -0,0 +1,356 @@
+"""
+Importación de extractos (Nequi, Daviplata, planillas de efectivo) como pagos.
+
+1. leer() recorre el archivo (CSV o XLSX) fila por fila, sin cargarlo entero:
+   salta lo que haya antes de la fila de encabezados y normaliza sus nombres
+   (alias como "valor" → "monto" o "celular" → "telefono").
+2. analizar() convierte cada fila en una LineaExtracto y la marca: nuevo,
+   duplicado, sin_socio, ambiguo o invalido. El socio se busca primero por
+   celular, luego por documento (una sola consulta para todo el archivo) y
+   al final por nombre, con el índice de TerminoBusqueda; si el nombre
+   coincide con más de un socio la línea queda ambigua. Es duplicado si ya
+   hay un pago con el mismo (usuario, monto, día) o si se repite en el archivo.
+3. importar() crea los Pago de las líneas nuevas con bulk_create, los reparte
+   con reparto.repartir y guarda las aplicaciones en la misma transacción;
+   recalculo_diferido pone al día los totales una sola vez, en la misma transacción.
+
+analizar() no escribe nada: su resultado es el reporte de prueba que se
+revisa antes de importar.
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import busqueda, reparto
+from .models import Pago, Usuario, normalizar_telefono, solo_digitos
+from .signals import recalculo_diferido
+
+MEDIOS = ("nequi", "daviplata", "efectivo")
+LOTE = 1000
+FIRMA = "fonar.extractos"
+VIGENCIA_FIRMA = 60 * 60  # segundos para confirmar un reporte en el dashboard
+
+NUEVO = "nuevo"
+DUPLICADO = "duplicado"
+SIN_SOCIO = "sin_socio"
+AMBIGUO = "ambiguo"
+INVALIDO = "invalido"
+
+# encabezado normalizado → columna
+ALIAS = {
+    "fecha": "fecha", "fecha_transaccion": "fecha", "fecha_de_la_transaccion": "fecha",
+    "fecha_movimiento": "fecha", "fecha_pago": "fecha", "dia": "fecha",
+    "monto": "monto", "valor": "monto", "valor_transaccion": "monto", "importe": "monto",
+    "cantidad": "monto", "abono": "monto",
+    "telefono": "telefono", "celular": "telefono", "numero_celular": "telefono",
+    "cuenta_origen": "telefono", "origen": "telefono",
+    "documento": "documento", "cedula": "documento", "cc": "documento",
+    "identificacion": "documento", "numero_documento": "documento",
+    "nombre": "nombre", "remitente": "nombre", "nombre_remitente": "nombre",
+    "socio": "nombre", "de": "nombre",
+    "referencia": "referencia", "ref": "referencia", "comprobante": "referencia",
+    "numero_comprobante": "referencia", "descripcion": "referencia", "detalle": "referencia",
+}
+OBLIGATORIAS = {"fecha", "monto"}
+FORMATOS_FECHA = (
+    "%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%Y", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d-%m-%Y", "%d/%m/%y",
+)
+HORA_POR_DEFECTO = time(12, 0)  # si el extracto solo trae el día
+
+
+@dataclass
+class LineaExtracto:
+    numero: int
+    fecha: date = None
+    momento: datetime = None
+    monto: Decimal = None
+    telefono: str = ""
+    documento: str = ""
+    nombre: str = ""
+    referencia: str = ""
+    usuario_id: int = None
+    estado: str = ""
+    detalle: str = ""
+
+
+# ==== Lectura ====
+def _columna(encabezado, alias):
+    nombre = "_".join(busqueda.palabras(str(encabezado or "")))
+    return alias.get(nombre, nombre)
+
+
+def _filas_csv(archivo):
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    codificacion = "utf-8-sig"
+    try:
+        muestra.decode("utf-8")
+    except UnicodeDecodeError as error:
+        # un carácter cortado al final de la muestra no cuenta
+        if error.start < len(muestra) - 3:
+            codificacion = "latin-1"
+    # el separador que más aparece: csv.Sniffer se confunde con montos como "80.000,00"
+    separador = max(",;\t", key=muestra.decode(codificacion, errors="ignore").count)
+    texto = io.TextIOWrapper(archivo, encoding=codificacion, newline="")
+    yield from csv.reader(texto, delimiter=separador)
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def leer(archivo, nombre="", alias=ALIAS, obligatorias=OBLIGATORIAS):
+    """
+    Filas del archivo (abierto en binario) como dicts {columna: valor}, una a
+    una. Es XLSX o CSV según la extensión de 'nombre'. Los encabezados se
+    traducen con 'alias'; ValueError si no hay una fila de encabezados con
+    todas las columnas 'obligatorias' (por defecto las de un extracto).
+    """
+    filas = _filas_xlsx(archivo) if nombre.lower().endswith((".xlsx", ".xlsm")) else _filas_csv(archivo)
+    columnas = None
+    for valores in filas:
+        if columnas is None:
+            candidatas = [_columna(v, alias) for v in valores]
+            if obligatorias <= set(candidatas):
+                columnas = candidatas
+            continue
+        if any(v not in (None, "") for v in valores):
+            yield dict(zip(columnas, valores))
+    if columnas is None:
+        raise ValueError(f"El archivo no tiene una fila de encabezados con {' y '.join(sorted(obligatorias))}.")
+
+
+# ==== Conversión ====
+def monto_de(valor):
+    """Decimal del valor ('$ 1.250.000', '1,250.50', 50000.0), o None"""
+    if isinstance(valor, (int, float, Decimal)):
+        texto = str(valor)
+    else:
+        texto = re.sub(r"[^\d,.\-]", "", str(valor or ""))
+        separadores = [c for c in texto if c in ",."]
+        if separadores:
+            ultimo = separadores[-1]
+            decimales = len(texto) - texto.rfind(ultimo) - 1
+            # "1.500" o "1,500" (un solo separador y tres dígitos) son miles
+            es_decimal = separadores.count(ultimo) == 1 and (len(set(separadores)) == 2 or decimales != 3)
+            miles = {",", "."} - ({ultimo} if es_decimal else set())
+            for separador in miles:
+                texto = texto.replace(separador, "")
+            texto = texto.replace(",", ".")
+    try:
+        return Decimal(texto).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return None
+
+
+def momento_de(valor):
+    """datetime con zona horaria del valor de la celda, o None"""
+    if isinstance(valor, datetime):
+        momento = valor
+    elif isinstance(valor, date):
+        momento = datetime.combine(valor, HORA_POR_DEFECTO)
+    else:
+        texto = str(valor or "").strip()
+        momento = None
+        for formato in FORMATOS_FECHA:
+            try:
+                momento = datetime.strptime(texto, formato)
+            except ValueError:
+                continue
+            if "%H" not in formato:
+                momento = datetime.combine(momento.date(), HORA_POR_DEFECTO)
+            break
+        if momento is None:
+            return None
+    return momento if timezone.is_aware(momento) else timezone.make_aware(momento)
+
+
+def texto_celda(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # Excel guarda celulares y cédulas como números
+    return str(valor).strip() if valor is not None else ""
+
+
+def _linea(numero, fila):
+    linea = LineaExtracto(
+        numero=numero,
+        telefono=normalizar_telefono(texto_celda(fila.get("telefono"))),
+        documento=solo_digitos(texto_celda(fila.get("documento"))),
+        nombre=texto_celda(fila.get("nombre")),
+        referencia=texto_celda(fila.get("referencia"))[:200],
+    )
+    linea.momento = momento_de(fila.get("fecha"))
+    linea.monto = monto_de(fila.get("monto"))
+    if linea.momento is None:
+        linea.estado, linea.detalle = INVALIDO, f"Fecha no reconocida: {fila.get('fecha')!r}"
+    elif linea.monto is None:
+        linea.estado, linea.detalle = INVALIDO, f"Monto no reconocido: {fila.get('monto')!r}"
+    elif linea.monto <= 0:
+        linea.estado, linea.detalle = INVALIDO, "No es un ingreso"
+    else:
+        linea.fecha = timezone.localtime(linea.momento).date()
+    return linea
+
+
+# ==== Socios y duplicados ====
+class IndiceSocios:
+    """
+    Celular y documento → ids de usuario, con una consulta para todos los
+    valores del extracto. Los nombres se buscan en TerminoBusqueda, una vez
+    por nombre distinto.
+    """
+
+    def __init__(self, lineas):
+        telefonos = {l.telefono for l in lineas if l.telefono}
+        documentos = {l.documento for l in lineas if l.documento}
+        self.por_telefono = defaultdict(set)
+        self.por_documento = defaultdict(set)
+        self._por_nombre = {}
+        if telefonos or documentos:
+            usuarios = Usuario.objects.filter(
+                Q(telefono__in=telefonos) | Q(documento__in=documentos)
+            ).values_list("pk", "telefono", "documento")
+            for pk, telefono, documento in usuarios:
+                if telefono in telefonos:
+                    self.por_telefono[telefono].add(pk)
+                if documento in documentos:
+                    self.por_documento[documento].add(pk)
+
+    def _nombre(self, nombre):
+        clave = " ".join(busqueda.palabras(nombre))
+        if clave not in self._por_nombre:
+            ids = busqueda.ids_usuarios(clave)
+            # con dos basta para saber que es ambiguo
+            self._por_nombre[clave] = (
+                set(Usuario.objects.filter(pk__in=ids).values_list("pk", flat=True)[:2]) if ids is not None else set()
+            )
+        return self._por_nombre[clave]
+
+    def buscar(self, linea):
+        """(ids de usuario, cómo se encontró)"""
+        if linea.telefono and self.por_telefono.get(linea.telefono):
+            return self.por_telefono[linea.telefono], "celular"
+        if linea.documento and self.por_documento.get(linea.documento):
+            return self.por_documento[linea.documento], "documento"
+        if linea.nombre:
+            return self._nombre(linea.nombre), "nombre"
+        return set(), ""
+
+
+def _asignar_socios(lineas):
+    indice = IndiceSocios(lineas)
+    for linea in lineas:
+        ids, via = indice.buscar(linea)
+        if len(ids) == 1:
+            linea.usuario_id = next(iter(ids))
+            linea.detalle = f"Por {via}"
+        elif ids:
+            linea.estado, linea.detalle = AMBIGUO, f"Varios socios coinciden por {via}"
+        else:
+            linea.estado, linea.detalle = SIN_SOCIO, "Ningún socio coincide"
+
+
+def marcar_duplicados(lineas):
+    """
+    Marca como nuevo o duplicado cada línea con socio y sin otro estado
+    (o ya marcada nuevo/duplicado, para volver a revisarla antes de importar).
+    """
+    revisar = [l for l in lineas if l.usuario_id and l.estado in ("", NUEVO, DUPLICADO)]
+    if not revisar:
+        return lineas
+    inicio = timezone.make_aware(datetime.combine(min(l.fecha for l in revisar), time.min))
+    fin = timezone.make_aware(datetime.combine(max(l.fecha for l in revisar) + timedelta(days=1), time.min))
+    existentes = {
+        (usuario_id, monto, timezone.localtime(fecha).date())
+        for usuario_id, monto, fecha in Pago.objects.filter(
+            usuario_id__in={l.usuario_id for l in revisar}, fecha__gte=inicio, fecha__lt=fin,
+        ).values_list("usuario_id", "monto_reportado", "fecha")
+    }
+    vistas = set()
+    for linea in revisar:
+        clave = (linea.usuario_id, linea.monto, linea.fecha)
+        if clave in existentes:
+            linea.estado, linea.detalle = DUPLICADO, "Ya existe un pago igual ese día"
+        elif clave in vistas:
+            linea.estado, linea.detalle = DUPLICADO, "Repetido en el archivo"
+        else:
+            linea.estado = NUEVO
+            vistas.add(clave)
+    return lineas
+
+
+def analizar(filas):
+    """LineaExtracto de cada fila, con su socio y su estado. No escribe nada."""
+    lineas = [_linea(numero, fila) for numero, fila in enumerate(filas, start=1)]
+    _asignar_socios([l for l in lineas if not l.estado])
+    return marcar_duplicados(lineas)
+
+
+def resumen(lineas):
+    """{estado: cantidad} y total de las líneas nuevas, para el reporte"""
+    conteo = {estado: 0 for estado in (NUEVO, DUPLICADO, SIN_SOCIO, AMBIGUO, INVALIDO)}
+    for linea in lineas:
+        conteo[linea.estado] += 1
+    total = sum((l.monto for l in lineas if l.estado == NUEVO), Decimal("0"))
+    return conteo, total
+
+
+# ==== Confirmación desde el dashboard ====
+def firmar(lineas):
+    """Las líneas nuevas como token firmado, para confirmar el reporte sin volver a subir el archivo"""
+    return signing.dumps([
+        [l.numero, l.momento.isoformat(), str(l.monto), l.usuario_id, l.referencia]
+        for l in lineas if l.estado == NUEVO
+    ], salt=FIRMA, compress=True)
+
+
+def leer_firma(token):
+    """Líneas del token de firmar(); signing.BadSignature si no es válido o venció"""
+    return [
+        LineaExtracto(
+            numero=numero, momento=datetime.fromisoformat(momento), monto=Decimal(monto),
+            usuario_id=usuario_id, referencia=referencia, estado=NUEVO,
+            fecha=timezone.localtime(datetime.fromisoformat(momento)).date(),
+        )
+        for numero, momento, monto, usuario_id, referencia in signing.loads(token, salt=FIRMA, max_age=VIGENCIA_FIRMA)
+    ]
+
+
+# ==== Importación ====
+def importar(lineas, medio):
+    """
+    Crea un Pago por cada línea nueva y lo reparte (reparto.POLITICA), todo en
+    una transacción. Antes vuelve a revisar duplicados: si el mismo reporte
+    se confirma dos veces, la segunda no crea nada. Devuelve los pagos creados.
+    """
+    with transaction.atomic():
+        marcar_duplicados(lineas)
+        nuevas = [l for l in lineas if l.estado == NUEVO]
+        with recalculo_diferido() as pendientes:
+            pagos = Pago.objects.bulk_create([
+                Pago(
+                    usuario_id=l.usuario_id, monto_reportado=l.monto, fecha=l.momento,
+                    comentarios=f"Importado de extracto {medio}" + (f" · {l.referencia}" if l.referencia else ""),
+                )
+                for l in nuevas
+            ], batch_size=LOTE)
+            # bulk_create no dispara señales: los pagos se validan al recalcular
+            pendientes["pagos"].update(p.pk for p in pagos)
+            reparto.guardar([a for aplicaciones in reparto.repartir(pagos) for a in aplicaciones])
+    return pagos
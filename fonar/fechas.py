@@ -0,0 +1,36 @@
+"""
+Filtros por año como rangos (campo >= 1 de enero y < 1 de enero siguiente).
+
+`campo__year=anio` sobre un DateTimeField con USE_TZ obliga a convertir la
+fecha de cada fila a la zona local; con un rango la base de datos puede usar
+los índices de fecha.
+"""
+from datetime import date, datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def rango_anio(anio):
+    """(inicio, fin) del año como fechas; fin es exclusivo"""
+    return date(anio, 1, 1), date(anio + 1, 1, 1)
+
+
+def rango_anio_local(anio):
+    """(inicio, fin) del año como datetimes en la zona horaria actual; fin es exclusivo"""
+    return (
+        timezone.make_aware(datetime(anio, 1, 1)),
+        timezone.make_aware(datetime(anio + 1, 1, 1)),
+    )
+
+
+def en_anio(campo, anio):
+    """Q para un DateField (o lookup que termine en uno) dentro del año"""
+    inicio, fin = rango_anio(anio)
+    return Q(**{f"{campo}__gte": inicio, f"{campo}__lt": fin})
+
+
+def en_anio_local(campo, anio):
+    """Q para un DateTimeField dentro del año local"""
+    inicio, fin = rango_anio_local(anio)
+    return Q(**{f"{campo}__gte": inicio, f"{campo}__lt": fin})
@@ -1,7 +1,8 @@
 from django import forms
 from decimal import Decimal, InvalidOperation
 from datetime import date
-from .models import PagoAplicacion, Pago, CuotaPrestamo, SolicitudPrestamo, TasaInteres
+from .models import PagoAplicacion, Pago, CuotaPrestamo, SolicitudPrestamo
+from . import tasas
 
 
 class PagoAplicacionForm(forms.ModelForm):
@@ -125,19 +126,9 @@ class SolicitudPrestamoForm(forms.ModelForm):
         instance = super().save(commit=False)
         instance.usuario = self.usuario
 
-        tasa = (
-            TasaInteres.objects.filter(
-                tipo_usuario=self.usuario.tipo_usuario,
-                cuotas_min__lte=instance.cuotas,
-                cuotas_max__gte=instance.cuotas
-            )
-            .order_by("-vigente_desde")
-            .first()
-        )
-        if tasa:
-            instance.interes = tasa.interes_mensual
-        else:
-            instance.interes = Decimal("0.00")
+        # tasa vigente hoy para sus cuotas (índice en memoria, ver tasas.py)
+        tasa = tasas.tasa_para(self.usuario.tipo_usuario, instance.cuotas)
+        instance.interes = tasa if tasa is not None else Decimal("0.00")
 
         if commit:
             instance.save()
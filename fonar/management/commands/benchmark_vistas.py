@@ -0,0 +1,128 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from fonar.datos_prueba import PREFIJO, borrar_fondo, es_base_local, generar_fondo
+from fonar.models import Pago, Usuario
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo y las consultas SQL de las vistas principales con fondos sintéticos "
+        "de varios tamaños y escribe un reporte JSON comparable entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tamanos", default="20,100",
+                            help="Cantidades de socios separadas por coma (terceros = socios / 5)")
+        parser.add_argument("--anios", type=int, default=2)
+        parser.add_argument("--repeticiones", type=int, default=5, help="Peticiones medidas por vista")
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--salida", default="benchmark_vistas.json", help="Archivo JSON del reporte")
+        parser.add_argument("--conservar", action="store_true", help="No borra el último fondo generado al terminar")
+        parser.add_argument("--forzar", action="store_true", help="Permite usar una base que no es local")
+
+    def handle(self, *args, **options):
+        if not es_base_local() and not options["forzar"]:
+            raise CommandError("La base configurada no es local. Define DATABASE_URL o usa --forzar.")
+        try:
+            tamanos = [int(t) for t in options["tamanos"].split(",") if t.strip()]
+        except ValueError:
+            raise CommandError("--tamanos debe ser una lista de enteros, p. ej. 20,100,500")
+
+        reporte = {
+            "fecha": timezone.now().isoformat(),
+            "commit": _commit_actual(),
+            "motor": connection.vendor,
+            "repeticiones": options["repeticiones"],
+            "resultados": [],
+        }
+
+        for socios in tamanos:
+            borrar_fondo()
+            creados = generar_fondo(
+                socios=socios, terceros=max(socios // 5, 1), anios=options["anios"], semilla=options["semilla"],
+            )
+            self.stdout.write(f"📦 Tamaño {socios} socios: {creados}")
+            vistas = self.medir_vistas(options["repeticiones"])
+            reporte["resultados"].append({"socios": socios, "datos": creados, "vistas": vistas})
+
+        if not options["conservar"]:
+            borrar_fondo()
+
+        with open(options["salida"], "w") as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"✅ Reporte escrito en {options['salida']}"))
+
+    def clientes(self):
+        """Cliente staff para el dashboard y cliente socio (el que más préstamos tiene) para el portal"""
+        admin, _ = Usuario.objects.get_or_create(
+            username=f"{PREFIJO}admin", defaults={"is_staff": True, "is_superuser": True},
+        )
+        pago = (
+            Pago.objects.filter(usuario__username__startswith=f"{PREFIJO}socio_", validado=True)
+            .order_by("-usuario__prestamo__cuotas", "pk")
+            .select_related("usuario")
+            .first()
+        )
+        if pago is None:
+            raise CommandError("El fondo generado no tiene pagos validados de socios; usa un tamaño mayor.")
+
+        staff = Client()
+        staff.force_login(admin)
+        socio = Client()
+        socio.force_login(pago.usuario)
+        return staff, socio, pago
+
+    def medir_vistas(self, repeticiones):
+        staff, socio, pago = self.clientes()
+        vistas = [
+            ("inicio", socio, reverse("inicio")),
+            ("ver_prestamos", socio, reverse("ver_prestamos")),
+            ("pago_pdf", socio, reverse("pago_pdf", args=[pago.pk])),
+            ("dashboard_home", staff, reverse("dashboard:home")),
+            ("prestamos_list", staff, reverse("dashboard:prestamos-list")),
+            ("entregar_fondo_pdf", staff, reverse("dashboard:entregar_fondo")),
+        ]
+
+        resultados = {}
+        for nombre, cliente, url in vistas:
+            cliente.get(url)  # calentamiento (plantillas, cachés)
+            tiempos = []
+            for _ in range(repeticiones):
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    respuesta = cliente.get(url)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nombre] = {
+                "url": url,
+                "status": respuesta.status_code,
+                "consultas": len(consultas),
+                "ms_min": round(min(tiempos), 2),
+                "ms_mediana": round(statistics.median(tiempos), 2),
+                "ms_max": round(max(tiempos), 2),
+            }
+            self.stdout.write(
+                f"   {nombre:<20} {respuesta.status_code}  {len(consultas):>5} consultas  "
+                f"{resultados[nombre]['ms_mediana']:>9.2f} ms (mediana)"
+            )
+        return resultados
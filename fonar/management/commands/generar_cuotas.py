@@ -1,19 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+
 from django.core.management.base import BaseCommand
-from fonar.models import Prestamo
+from django.db import transaction
+from fonar import cache_versionada
+from fonar.amortizacion import programar_lote
+from fonar.models import Prestamo, CuotaPrestamo
+
 
 class Command(BaseCommand):
     help = "Genera cuotas para todos los préstamos existentes que no tengan plan de amortización"
 
-    def handle(self, *args, **kwargs):
-        prestamos = Prestamo.objects.all()
-        total = 0
-
-        for prestamo in prestamos:
-            if prestamo.cuotaprestamo_set.count() == 0:  # Solo si aún no tiene cuotas
-                prestamo.generar_cuotas()
-                total += 1
-                self.stdout.write(self.style.SUCCESS(f"Cuotas generadas para Préstamo #{prestamo.id}"))
-            else:
-                self.stdout.write(self.style.WARNING(f"Préstamo #{prestamo.id} ya tiene cuotas"))
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200,
+                            help="Préstamos por lote (cada lote se escribe con un bulk_create)")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Procesos para calcular los planes en paralelo (cargas históricas grandes)")
+
+    def handle(self, *args, **options):
+        batch_size = max(options["batch_size"], 1)
+        workers = max(options["workers"], 1)
+
+        # Una sola consulta (anti-join): préstamos sin ninguna cuota
+        pendientes = list(
+            Prestamo.objects.filter(cuotaprestamo__isnull=True)
+            .order_by("pk")
+            .values_list("pk", "monto", "interes", "cuotas", "fecha_desembolso")
+        )
+        if not pendientes:
+            self.stdout.write(self.style.WARNING("Todos los préstamos ya tienen cuotas."))
+            return
+
+        montos = {pk: monto for pk, monto, *_ in pendientes}
+        lotes = [pendientes[i:i + batch_size] for i in range(0, len(pendientes), batch_size)]
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            resultados = executor.map(programar_lote, lotes) if executor else map(programar_lote, lotes)
+
+            total = 0
+            for lote in resultados:
+                cuotas = [
+                    CuotaPrestamo(
+                        prestamo_id=prestamo_id,
+                        numero=numero,
+                        fecha_vencimiento=fecha_vencimiento,
+                        monto_cuota=monto_cuota,
+                        capital=capital,
+                        interes=interes,
+                        saldo=montos[prestamo_id],  # sin pagos todavía
+                        pagada=False,
+                    )
+                    for prestamo_id, filas in lote
+                    for numero, fecha_vencimiento, monto_cuota, capital, interes in filas
+                ]
+                with transaction.atomic():
+                    CuotaPrestamo.objects.bulk_create(cuotas, batch_size=1000)
+
+                total += len(lote)
+                if options["verbosity"] > 1:
+                    for prestamo_id, _ in lote:
+                        self.stdout.write(self.style.SUCCESS(f"Cuotas generadas para Préstamo #{prestamo_id}"))
+                self.stdout.write(f"   {total}/{len(pendientes)} préstamos ({len(cuotas)} cuotas en este lote)")
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # bulk_create no pasa por señales: la caché de datos se invalida aquí
+        cache_versionada.invalidar()
 
         self.stdout.write(self.style.SUCCESS(f"\nProceso completado. Se generaron cuotas para {total} préstamo(s)."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from fonar.datos_prueba import PREFIJO, CLAVE_DEMO, borrar_fondo, es_base_local, generar_fondo
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un fondo sintético (socios, terceros, aportes, préstamos con cuotas y pagos) "
+        "para medir rendimiento en local. La base se elige con DATABASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socios", type=int, default=50)
+        parser.add_argument("--terceros", type=int, default=10)
+        parser.add_argument("--anios", type=int, default=2, help="Años de aportes y préstamos hacia atrás (incluye el actual)")
+        parser.add_argument("--prestamos-max", type=int, default=2, help="Máximo de préstamos por usuario")
+        parser.add_argument("--semilla", type=int, default=1)
+        parser.add_argument("--limpiar", action="store_true",
+                            help=f"Borra antes los usuarios {PREFIJO}* y todo lo asociado")
+        parser.add_argument("--forzar", action="store_true",
+                            help="Permite escribir en una base que no es local")
+
+    def handle(self, *args, **options):
+        if not es_base_local() and not options["forzar"]:
+            raise CommandError(
+                f"La base configurada ({connection.vendor} en {connection.settings_dict.get('HOST')}) no es local. "
+                "Define DATABASE_URL (p. ej. sqlite:///db.sqlite3) o usa --forzar."
+            )
+
+        if options["limpiar"]:
+            borrados = borrar_fondo()
+            self.stdout.write(f"🧹 {borrados} filas de prueba eliminadas.")
+
+        self.stdout.write(
+            f"🔄 Generando {options['socios']} socios y {options['terceros']} terceros "
+            f"({options['anios']} años)..."
+        )
+        creados = generar_fondo(
+            socios=options["socios"],
+            terceros=options["terceros"],
+            anios=options["anios"],
+            prestamos_max=options["prestamos_max"],
+            semilla=options["semilla"],
+        )
+        for tabla, n in creados.items():
+            self.stdout.write(f"   {tabla}: {n}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Fondo de prueba generado (usuarios {PREFIJO}*, contraseña '{CLAVE_DEMO}')"
+        ))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fonar import extractos
+
+ETIQUETAS = {
+    extractos.NUEVO: "✅ nuevo",
+    extractos.DUPLICADO: "🔁 duplicado",
+    extractos.SIN_SOCIO: "❓ sin socio",
+    extractos.AMBIGUO: "⚠️ ambiguo",
+    extractos.INVALIDO: "❌ inválido",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa un extracto (CSV o XLSX de Nequi, Daviplata o una planilla de efectivo) como "
+        "pagos repartidos automáticamente. Sin --aplicar solo muestra el reporte de prueba."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del extracto (.csv o .xlsx)")
+        parser.add_argument("--medio", choices=extractos.MEDIOS, required=True)
+        parser.add_argument("--aplicar", action="store_true",
+                            help="Crea los pagos de las líneas nuevas (por defecto no escribe nada)")
+        parser.add_argument("--todas", action="store_true",
+                            help="Lista también las líneas nuevas, no solo los conflictos")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["archivo"], "rb") as archivo:
+                lineas = extractos.analizar(extractos.leer(archivo, options["archivo"]))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for linea in lineas:
+            if linea.estado == extractos.NUEVO and not options["todas"]:
+                continue
+            self.stdout.write(
+                f"{linea.numero:>5}  {ETIQUETAS[linea.estado]:<14} {str(linea.fecha or '-'):<10}  "
+                f"{linea.monto if linea.monto is not None else '-':>14}  "
+                f"socio={linea.usuario_id or '-'}  {linea.nombre or linea.telefono or linea.documento}  "
+                f"{linea.detalle}"
+            )
+
+        conteo, total = extractos.resumen(lineas)
+        self.stdout.write(" · ".join(f"{ETIQUETAS[estado]}: {n}" for estado, n in conteo.items()))
+
+        if not options["aplicar"]:
+            self.stdout.write(self.style.WARNING(
+                f"🔎 Prueba: se crearían {conteo[extractos.NUEVO]} pagos por {total}. Usa --aplicar para importarlos."
+            ))
+            return
+
+        pagos = extractos.importar(lineas, options["medio"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(pagos)} pagos importados y repartidos"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fonar import altas, extractos
+
+
+class Command(BaseCommand):
+    help = (
+        "Da de alta socios desde un CSV o XLSX (usuario, clave, nombre, apellido, correo, tipo, "
+        "celular, documento, aporte_inicial, fecha_aporte). Valida todo el archivo; sin --crear "
+        "no escribe nada y con errores no crea ningún socio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del archivo (.csv o .xlsx)")
+        parser.add_argument("--crear", action="store_true",
+                            help="Crea los socios si no hay errores (por defecto solo valida)")
+        parser.add_argument("--procesos", type=int, default=None,
+                            help="Procesos para hashear las claves (por defecto, todos los núcleos)")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["archivo"], "rb") as archivo:
+                filas = altas.validar(extractos.leer(
+                    archivo, options["archivo"], alias=altas.ALIAS, obligatorias=altas.OBLIGATORIAS,
+                ))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        con_errores = [f for f in filas if f.errores]
+        for fila in con_errores:
+            self.stdout.write(f"{fila.numero:>5}  ❌ {fila.username or '-'}: {'; '.join(fila.errores)}")
+        self.stdout.write(f"📋 {len(filas)} filas · {len(con_errores)} con errores")
+
+        if con_errores:
+            raise CommandError("Corrige las filas con errores: no se creó ningún socio.")
+        if not options["crear"]:
+            self.stdout.write(self.style.WARNING(f"🔎 Prueba: se crearían {len(filas)} socios. Usa --crear para guardarlos."))
+            return
+
+        inicio = time.monotonic()
+        usuarios = altas.crear(filas, procesos=options["procesos"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(usuarios)} socios creados en {time.monotonic() - inicio:.1f} s"
+        ))
@@ -1,34 +1,257 @@
-from django.core.management.base import BaseCommand
-from django.db.models import Sum
-from decimal import Decimal
-from fonar.models import Pago, PagoAplicacion, CuotaPrestamo
+import json
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q, Value, Case, When, BooleanField
+
+from fonar import cache_versionada, resumenes, totales
+from fonar.models import Pago, PagoAplicacion, CuotaPrestamo, Prestamo
+from fonar.signals import recalcular_cuotas, recalcular_pagos, recalcular_prestamos
 
 
 class Command(BaseCommand):
-    help = "Recalcula pagos y cuotas existentes en la base de datos"
+    help = (
+        "Recalcula capital/interés pagado y saldo de las cuotas, el total aplicado/validación "
+        "de los pagos, los totales pagados de los préstamos y el resumen anual por socio. Por "
+        "defecto usa unas pocas sentencias UPDATE; con --chunked procesa por lotes con progreso "
+        "y checkpoints reanudables."
+    )
 
-    def handle(self, *args, **options):
-        self.stdout.write("🔄 Recalculando todas las cuotas y pagos...")
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=date.fromisoformat,
+                            help="Solo pagos desde esta fecha (AAAA-MM-DD) y las cuotas que tocan o vencen desde entonces")
+        parser.add_argument("--prestamo", type=int, help="Solo las cuotas, pagos y totales de este préstamo")
+        parser.add_argument("--usuario", type=int, help="Solo las cuotas, pagos y préstamos de este usuario")
+        parser.add_argument("--dry-run", action="store_true", help="Muestra las diferencias sin escribir nada")
+        parser.add_argument("--chunked", action="store_true", help="Procesa por lotes en vez de UPDATE masivos")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Filas por lote en modo --chunked")
+        parser.add_argument("--checkpoint",
+                            help="Archivo JSON donde se guarda el avance en modo --chunked; si existe, se reanuda desde ahí")
+
+    # ------------------------------------------------------------
+    # Alcance (filtros)
+    # ------------------------------------------------------------
+    def get_querysets(self, options):
+        cuotas = CuotaPrestamo.objects.all()
+        pagos = Pago.objects.all()
 
-        # Recalcular todas las cuotas
-        for cuota in CuotaPrestamo.objects.all():
-            totales = PagoAplicacion.objects.filter(cuota=cuota).aggregate(
-                total_capital=Sum("capital"),
-                total_interes=Sum("interes"),
+        if options["prestamo"]:
+            cuotas = cuotas.filter(prestamo_id=options["prestamo"])
+            pagos = pagos.filter(aplicaciones__prestamo_id=options["prestamo"])
+        if options["usuario"]:
+            cuotas = cuotas.filter(prestamo__usuario_id=options["usuario"])
+            pagos = pagos.filter(usuario_id=options["usuario"])
+        if options["since"]:
+            pagos = pagos.filter(fecha__date__gte=options["since"])
+            cuotas = cuotas.filter(
+                Q(fecha_vencimiento__gte=options["since"])
+                | Q(pk__in=PagoAplicacion.objects.filter(
+                    pago__fecha__date__gte=options["since"]
+                ).values("cuota_id"))
             )
 
-            cuota.capital_pagado = totales["total_capital"] or Decimal("0")
-            cuota.interes_pagado = totales["total_interes"] or Decimal("0")
-            cuota.pagada = cuota.capital_pagado >= cuota.capital
-            cuota.save(update_fields=["capital_pagado", "interes_pagado", "pagada"])
+        # los filtros por relaciones pueden duplicar filas
+        cuotas = CuotaPrestamo.objects.filter(pk__in=cuotas.values("pk"))
+        pagos = Pago.objects.filter(pk__in=pagos.values("pk"))
+
+        # préstamos: los de las cuotas y los pagos en alcance
+        prestamos = Prestamo.objects.all()
+        if options["prestamo"] or options["usuario"] or options["since"]:
+            prestamos = prestamos.filter(
+                Q(pk__in=cuotas.values("prestamo_id"))
+                | Q(pk__in=PagoAplicacion.objects.filter(pago__in=pagos).values("prestamo_id"))
+            )
+            if options["prestamo"]:
+                prestamos = prestamos.filter(pk=options["prestamo"])
+            if options["usuario"]:
+                prestamos = prestamos.filter(usuario_id=options["usuario"])
+        return cuotas, pagos, prestamos
+
+    def handle(self, *args, **options):
+        cuotas, pagos, prestamos = self.get_querysets(options)
 
-        # Recalcular todos los pagos
-        for pago in Pago.objects.all():
-            total_aplicado = PagoAplicacion.objects.filter(pago=pago).aggregate(
-                total=Sum("monto_aplicado")
-            )["total"] or Decimal("0")
+        if options["dry_run"]:
+            self.stdout.write("🔎 Simulación: no se escribirá nada.")
+            self.mostrar_diferencias(cuotas, pagos, prestamos)
+        elif options["chunked"]:
+            self.stdout.write("🔄 Recalculando cuotas, pagos y préstamos por lotes...")
+            self.recalcular_por_lotes(cuotas, pagos, prestamos, options)
+        else:
+            self.stdout.write("🔄 Recalculando todas las cuotas, pagos y préstamos...")
+            self.recalcular_masivo(cuotas, pagos, prestamos)
 
-            pago.validado = (total_aplicado == pago.monto_reportado)
-            pago.save(update_fields=["validado"])
+        if not options["dry_run"]:
+            # los UPDATE masivos no pasan por señales: el resumen anual y la caché se
+            # ponen al día aquí
+            self.recalcular_resumenes(cuotas, pagos, prestamos, options)
+            cache_versionada.invalidar()
 
         self.stdout.write(self.style.SUCCESS("✅ Recalculo completado"))
+
+    def recalcular_resumenes(self, cuotas, pagos, prestamos, options):
+        """Todo el resumen anual, o con filtros solo los años que tocan las filas en alcance"""
+        if options["prestamo"] or options["usuario"] or options["since"]:
+            claves = resumenes.claves_de_pagos_y_prestamos(
+                pagos.values_list("pk", flat=True),
+                prestamos.values_list("pk", flat=True),
+                cuotas.values_list("pk", flat=True),
+            )
+            resumenes.recalcular_resumenes(claves)
+            self.stdout.write(f"   {len(claves)} resúmenes anuales recalculados.")
+        else:
+            _, escritas = resumenes.reconstruir_resumenes()
+            self.stdout.write(f"   {escritas} resúmenes anuales reconstruidos.")
+
+    # ------------------------------------------------------------
+    # Modo por defecto: UPDATE masivos con subconsultas agregadas
+    # ------------------------------------------------------------
+    def recalcular_masivo(self, cuotas, pagos, prestamos):
+        with transaction.atomic():
+            n_cuotas = cuotas.update(
+                capital_pagado=totales.capital_pagado_cuota(),
+                interes_pagado=totales.interes_pagado_cuota(),
+                saldo=totales.saldo_cuota(),
+            )
+            cuotas.update(pagada=Case(
+                When(capital_pagado__gte=F("capital"), then=Value(True)),
+                default=Value(False),
+            ))
+
+            n_pagos = pagos.update(monto_aplicado_total=totales.monto_aplicado_pago())
+            pagos.update(validado=Case(
+                When(monto_reportado=F("monto_aplicado_total"), then=Value(True)),
+                default=Value(False),
+            ))
+
+            # después de los pagos: solo cuentan los validados
+            n_prestamos = prestamos.update(
+                capital_pagado_total=totales.capital_pagado_prestamo(),
+                interes_pagado_total=totales.interes_pagado_prestamo(),
+            )
+
+        self.stdout.write(f"   {n_cuotas} cuotas, {n_pagos} pagos y {n_prestamos} préstamos recalculados.")
+
+    # ------------------------------------------------------------
+    # Modo por lotes: progreso + checkpoint reanudable
+    # ------------------------------------------------------------
+    def recalcular_por_lotes(self, cuotas, pagos, prestamos, options):
+        ruta = options["checkpoint"]
+        filtros = {k: str(options[k]) if options[k] else None for k in ("since", "prestamo", "usuario")}
+        avance = {"filtros": filtros, "cuotas": 0, "pagos": 0, "prestamos": 0}
+
+        if ruta and os.path.exists(ruta):
+            with open(ruta) as f:
+                guardado = json.load(f)
+            if guardado.get("filtros") != filtros:
+                raise CommandError(
+                    f"El checkpoint {ruta} se creó con otros filtros ({guardado.get('filtros')}). "
+                    "Usa los mismos filtros o borra el archivo."
+                )
+            avance.update(guardado)
+            self.stdout.write(
+                f"↩️  Reanudando desde cuota #{avance['cuotas']} y pago #{avance['pagos']}."
+            )
+
+        for etapa, qs, recalcular in (
+            ("cuotas", cuotas, recalcular_cuotas),
+            ("pagos", pagos, recalcular_pagos),
+            ("prestamos", prestamos, recalcular_prestamos),
+        ):
+            total = qs.count()
+            hechos = qs.filter(pk__lte=avance[etapa]).count()
+            while True:
+                ids = list(
+                    qs.filter(pk__gt=avance[etapa])
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[: options["chunk_size"]]
+                )
+                if not ids:
+                    break
+                with transaction.atomic():
+                    recalcular(ids)
+                avance[etapa] = ids[-1]
+                hechos += len(ids)
+                if ruta:
+                    with open(ruta, "w") as f:
+                        json.dump(avance, f)
+                porcentaje = (hechos * 100 // total) if total else 100
+                self.stdout.write(f"   {etapa}: {hechos}/{total} ({porcentaje}%)")
+
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+
+    # ------------------------------------------------------------
+    # --dry-run: diferencias entre lo guardado y lo recalculado
+    # ------------------------------------------------------------
+    def mostrar_diferencias(self, cuotas, pagos, prestamos):
+        cuotas = (
+            cuotas.annotate(
+                nuevo_capital=totales.capital_pagado_cuota(),
+                nuevo_interes=totales.interes_pagado_cuota(),
+                nuevo_saldo=totales.saldo_cuota(),
+            )
+            .annotate(nueva_pagada=Case(
+                When(nuevo_capital__gte=F("capital"), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ))
+            .exclude(
+                capital_pagado=F("nuevo_capital"),
+                interes_pagado=F("nuevo_interes"),
+                pagada=F("nueva_pagada"),
+                saldo=F("nuevo_saldo"),
+            )
+            .order_by("pk")
+        )
+        n_cuotas = 0
+        for c in cuotas.values("pk", "prestamo_id", "capital_pagado", "nuevo_capital",
+                               "interes_pagado", "nuevo_interes", "pagada", "nueva_pagada",
+                               "saldo", "nuevo_saldo").iterator():
+            n_cuotas += 1
+            self.stdout.write(
+                f"   Cuota #{c['pk']} (préstamo #{c['prestamo_id']}): "
+                f"capital_pagado {c['capital_pagado']} → {c['nuevo_capital']}, "
+                f"interes_pagado {c['interes_pagado']} → {c['nuevo_interes']}, "
+                f"pagada {c['pagada']} → {c['nueva_pagada']}, "
+                f"saldo {c['saldo']} → {c['nuevo_saldo']}"
+            )
+
+        pagos = (
+            pagos.annotate(nuevo_total=totales.monto_aplicado_pago())
+            .annotate(nuevo_validado=Case(
+                When(monto_reportado=F("nuevo_total"), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ))
+            .exclude(monto_aplicado_total=F("nuevo_total"), validado=F("nuevo_validado"))
+            .order_by("pk")
+        )
+        n_pagos = 0
+        for p in pagos.values("pk", "monto_aplicado_total", "nuevo_total", "validado", "nuevo_validado").iterator():
+            n_pagos += 1
+            self.stdout.write(
+                f"   Pago #{p['pk']}: monto_aplicado_total {p['monto_aplicado_total']} → {p['nuevo_total']}, "
+                f"validado {p['validado']} → {p['nuevo_validado']}"
+            )
+
+        # con --dry-run los pagos no se corrigen: se compara contra la validación guardada
+        prestamos = (
+            prestamos.annotate(
+                nuevo_capital=totales.capital_pagado_prestamo(),
+                nuevo_interes=totales.interes_pagado_prestamo(),
+            )
+            .exclude(capital_pagado_total=F("nuevo_capital"), interes_pagado_total=F("nuevo_interes"))
+            .order_by("pk")
+        )
+        n_prestamos = 0
+        for p in prestamos.values("pk", "capital_pagado_total", "nuevo_capital",
+                                  "interes_pagado_total", "nuevo_interes").iterator():
+            n_prestamos += 1
+            self.stdout.write(
+                f"   Préstamo #{p['pk']}: capital_pagado_total {p['capital_pagado_total']} → {p['nuevo_capital']}, "
+                f"interes_pagado_total {p['interes_pagado_total']} → {p['nuevo_interes']}"
+            )
+
+        self.stdout.write(f"   {n_cuotas} cuotas, {n_pagos} pagos y {n_prestamos} préstamos cambiarían.")
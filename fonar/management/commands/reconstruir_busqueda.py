@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from fonar.busqueda import actualizar_terminos
+from fonar.models import Usuario
+
+LOTE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los términos de búsqueda de usuarios (TerminoBusqueda). Úsalo si se "
+        "crearon o editaron usuarios sin pasar por save() (bulk_create, update)."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔄 Reconstruyendo términos de búsqueda...")
+        usuarios = Usuario.objects.only("pk", "username", "first_name", "last_name", "email").order_by("pk")
+        lote, total = [], 0
+        for usuario in usuarios.iterator(chunk_size=LOTE):
+            lote.append(usuario)
+            if len(lote) == LOTE:
+                actualizar_terminos(lote)
+                total += len(lote)
+                lote = []
+        actualizar_terminos(lote)
+        total += len(lote)
+        self.stdout.write(self.style.SUCCESS(f"✅ Términos reconstruidos para {total} usuarios"))
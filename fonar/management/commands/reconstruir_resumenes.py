@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+
+from fonar import cache_versionada
+from fonar.models import ResumenAnualSocio
+from fonar.resumenes import CAMPOS, calcular_resumenes, reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el resumen anual por socio (ResumenAnualSocio) desde aportes, pagos "
+        "y préstamos. Es la ruta de reparación si la tabla quedó desincronizada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--anio", type=int, action="append",
+                            help="Solo este año (se puede repetir)")
+        parser.add_argument("--usuario", type=int, action="append",
+                            help="Solo este usuario (se puede repetir)")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Muestra las filas que cambiarían sin escribir nada")
+
+    def handle(self, *args, **options):
+        usuarios = set(options["usuario"]) if options["usuario"] else None
+        anios = set(options["anio"]) if options["anio"] else None
+
+        if options["dry_run"]:
+            actuales = ResumenAnualSocio.objects.all()
+            if usuarios is not None:
+                actuales = actuales.filter(usuario_id__in=usuarios)
+            if anios is not None:
+                actuales = actuales.filter(año__in=anios)
+            self.stdout.write("🔎 Simulación: no se escribirá nada.")
+            self.mostrar_diferencias(actuales, calcular_resumenes(usuarios, anios))
+            return
+
+        self.stdout.write("🔄 Reconstruyendo resúmenes anuales...")
+        borradas, escritas = reconstruir_resumenes(usuarios, anios)
+        cache_versionada.invalidar()
+        self.stdout.write(f"   {borradas} filas borradas y {escritas} escritas.")
+        self.stdout.write(self.style.SUCCESS("✅ Resúmenes reconstruidos"))
+
+    def mostrar_diferencias(self, actuales, nuevas):
+        guardadas = {
+            (fila["usuario_id"], fila["año"]): fila
+            for fila in actuales.values("usuario_id", "año", *CAMPOS)
+        }
+        cambios = 0
+        for nueva in sorted(nuevas, key=lambda r: (r.usuario_id, r.año)):
+            clave = (nueva.usuario_id, nueva.año)
+            guardada = guardadas.pop(clave, None)
+            if guardada is None:
+                cambios += 1
+                self.stdout.write(f"   Usuario #{clave[0]} {clave[1]}: falta la fila")
+                continue
+            distintos = [
+                f"{campo} {guardada[campo]} → {getattr(nueva, campo)}"
+                for campo in CAMPOS if guardada[campo] != getattr(nueva, campo)
+            ]
+            if distintos:
+                cambios += 1
+                self.stdout.write(f"   Usuario #{clave[0]} {clave[1]}: " + ", ".join(distintos))
+        for usuario_id, anio in sorted(guardadas):
+            cambios += 1
+            self.stdout.write(f"   Usuario #{usuario_id} {anio}: sobra la fila")
+        self.stdout.write(f"   {cambios} filas cambiarían.")
@@ -0,0 +1,103 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.db.models.functions import Abs
+
+from fonar import totales
+from fonar.models import CuotaPrestamo, Pago, Prestamo
+
+# Diferencias menores a medio centavo son redondeo del motor (SQLite guarda REAL)
+TOLERANCIA = Decimal("0.005")
+
+
+def con_diferencias(qs, **esperados):
+    """Anota los valores esperados y deja solo las filas donde algún campo no coincide"""
+    diferencias = {f"dif_{campo}": Abs(F(campo) - expresion) for campo, expresion in esperados.items()}
+    return qs.annotate(**diferencias).filter(
+        reduce(or_, (Q(**{f"{alias}__gt": TOLERANCIA}) for alias in diferencias))
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los totales guardados (préstamos, cuotas y pagos) con lo que resulta "
+        "de las aplicaciones. No escribe nada; termina con error si hay diferencias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite", type=int, default=20,
+                            help="Máximo de filas con diferencias a mostrar por tabla")
+
+    def handle(self, *args, **options):
+        limite = options["limite"]
+
+        prestamos = (
+            con_diferencias(
+                Prestamo.objects.annotate(
+                    esperado_capital=totales.capital_pagado_prestamo(),
+                    esperado_interes=totales.interes_pagado_prestamo(),
+                ),
+                capital_pagado_total=F("esperado_capital"),
+                interes_pagado_total=F("esperado_interes"),
+            )
+            .order_by("pk")
+            .values_list("pk", "capital_pagado_total", "esperado_capital", "interes_pagado_total", "esperado_interes")
+        )
+        cuotas = (
+            con_diferencias(
+                CuotaPrestamo.objects.annotate(
+                    esperado_capital=totales.capital_pagado_cuota(),
+                    esperado_interes=totales.interes_pagado_cuota(),
+                    esperado_saldo=totales.saldo_cuota(),
+                ),
+                capital_pagado=F("esperado_capital"),
+                interes_pagado=F("esperado_interes"),
+                saldo=F("esperado_saldo"),
+            )
+            .order_by("pk")
+            .values_list("pk", "prestamo_id", "capital_pagado", "esperado_capital",
+                         "interes_pagado", "esperado_interes", "saldo", "esperado_saldo")
+        )
+        pagos = (
+            con_diferencias(
+                Pago.objects.annotate(esperado=totales.monto_aplicado_pago()),
+                monto_aplicado_total=F("esperado"),
+            )
+            .order_by("pk")
+            .values_list("pk", "monto_aplicado_total", "esperado")
+        )
+
+        diferencias = 0
+
+        n = prestamos.count()
+        diferencias += n
+        self.stdout.write(f"🔎 Préstamos con diferencias: {n}")
+        for pk, capital, esperado_capital, interes, esperado_interes in prestamos[:limite]:
+            self.stdout.write(
+                f"   Préstamo #{pk}: capital_pagado_total {capital} (debería ser {esperado_capital}), "
+                f"interes_pagado_total {interes} (debería ser {esperado_interes})"
+            )
+
+        n = cuotas.count()
+        diferencias += n
+        self.stdout.write(f"🔎 Cuotas con diferencias: {n}")
+        for pk, prestamo_id, capital, esp_capital, interes, esp_interes, saldo, esp_saldo in cuotas[:limite]:
+            self.stdout.write(
+                f"   Cuota #{pk} (préstamo #{prestamo_id}): capital_pagado {capital} (debería ser {esp_capital}), "
+                f"interes_pagado {interes} (debería ser {esp_interes}), saldo {saldo} (debería ser {esp_saldo})"
+            )
+
+        n = pagos.count()
+        diferencias += n
+        self.stdout.write(f"🔎 Pagos con diferencias: {n}")
+        for pk, total, esperado in pagos[:limite]:
+            self.stdout.write(f"   Pago #{pk}: monto_aplicado_total {total} (debería ser {esperado})")
+
+        if diferencias:
+            raise CommandError(
+                f"{diferencias} filas desincronizadas. Corrige con: python manage.py recalcular_todo"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ Todos los saldos coinciden"))
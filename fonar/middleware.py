@@ -0,0 +1,166 @@
+"""
+Perfilado SQL por petición, solo para staff y solo si se pide:
+cabecera `X-Perfilar-SQL: 1` o parámetro `?perfilar_sql=1`.
+
+Registra cada sentencia que ejecuta la vista (tiempo y texto), agrupa las
+repetidas, marca patrones N+1 (la misma consulta muchas veces con distintos
+parámetros) y deja en el log las consultas lentas. El resumen queda en una
+ventana en memoria que muestra la página de perfilado del dashboard.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("fonar.perfilado")
+
+CABECERA = "HTTP_X_PERFILAR_SQL"
+PARAMETRO = "perfilar_sql"
+
+# Configurables desde settings
+UMBRAL_LENTO_MS = getattr(settings, "PERFILADO_SQL_LENTO_MS", 100)
+UMBRAL_N_MAS_1 = getattr(settings, "PERFILADO_SQL_UMBRAL_N_MAS_1", 5)
+VENTANA_SEGUNDOS = getattr(settings, "PERFILADO_SQL_VENTANA_SEGUNDOS", 3600)
+MAX_REGISTROS = getattr(settings, "PERFILADO_SQL_MAX_REGISTROS", 1000)
+
+# "IN (%s, %s, %s)" cuenta como la misma consulta sin importar cuántos ids lleve
+_LISTA_PARAMETROS = re.compile(r"\((?:%s, )+%s\)")
+
+
+def normalizar_sql(sql):
+    return _LISTA_PARAMETROS.sub("(%s, ...)", sql)
+
+
+class RegistroSQL:
+    """execute_wrapper que anota (sql, duración en ms) de cada sentencia"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            self.consultas.append((sql, duracion))
+            if duracion >= UMBRAL_LENTO_MS:
+                logger.warning("Consulta lenta (%.1f ms): %s", duracion, sql)
+
+    @property
+    def total_ms(self):
+        return sum(duracion for _, duracion in self.consultas)
+
+    def repetidas(self):
+        """[(sql normalizado, veces)] de las sentencias ejecutadas más de una vez"""
+        conteo = Counter(normalizar_sql(sql) for sql, _ in self.consultas)
+        return [(sql, veces) for sql, veces in conteo.most_common() if veces > 1]
+
+    def n_mas_1(self):
+        return [(sql, veces) for sql, veces in self.repetidas() if veces >= UMBRAL_N_MAS_1]
+
+
+class VentanaPerfilado:
+    """Últimas peticiones perfiladas (en memoria, por proceso)"""
+
+    def __init__(self, maximo=MAX_REGISTROS):
+        self._registros = deque(maxlen=maximo)
+        self._lock = threading.Lock()
+
+    def agregar(self, registro):
+        with self._lock:
+            self._registros.append(registro)
+
+    def recientes(self, segundos=VENTANA_SEGUNDOS):
+        limite = time.time() - segundos
+        with self._lock:
+            return [r for r in self._registros if r["momento"] >= limite]
+
+    def peores_endpoints(self, segundos=VENTANA_SEGUNDOS):
+        """Resumen por endpoint ordenado por tiempo SQL promedio (peor primero)"""
+        por_endpoint = {}
+        for r in self.recientes(segundos):
+            e = por_endpoint.setdefault(r["endpoint"], {
+                "endpoint": r["endpoint"],
+                "peticiones": 0,
+                "consultas_total": 0,
+                "consultas_max": 0,
+                "tiempo_total_ms": 0.0,
+                "tiempo_max_ms": 0.0,
+                "repetidas_total": 0,
+                "n_mas_1": {},
+            })
+            e["peticiones"] += 1
+            e["consultas_total"] += r["consultas"]
+            e["consultas_max"] = max(e["consultas_max"], r["consultas"])
+            e["tiempo_total_ms"] += r["tiempo_ms"]
+            e["tiempo_max_ms"] = max(e["tiempo_max_ms"], r["tiempo_ms"])
+            e["repetidas_total"] += r["repetidas"]
+            for sql, veces in r["n_mas_1"]:
+                e["n_mas_1"][sql] = max(e["n_mas_1"].get(sql, 0), veces)
+
+        resumen = []
+        for e in por_endpoint.values():
+            e["consultas_promedio"] = e["consultas_total"] / e["peticiones"]
+            e["tiempo_promedio_ms"] = e["tiempo_total_ms"] / e["peticiones"]
+            e["n_mas_1"] = sorted(e["n_mas_1"].items(), key=lambda x: -x[1])
+            resumen.append(e)
+        return sorted(resumen, key=lambda e: -e["tiempo_promedio_ms"])
+
+    def limpiar(self):
+        with self._lock:
+            self._registros.clear()
+
+
+ventana = VentanaPerfilado()
+
+
+def perfilado_solicitado(request):
+    usuario = getattr(request, "user", None)
+    if not (usuario and usuario.is_authenticated and (usuario.is_staff or usuario.is_superuser)):
+        return False
+    return request.META.get(CABECERA) == "1" or request.GET.get(PARAMETRO) == "1"
+
+
+class PerfiladoSQLMiddleware:
+    """Va después de AuthenticationMiddleware (necesita request.user)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not perfilado_solicitado(request):
+            return self.get_response(request)
+
+        registro = RegistroSQL()
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(registro):
+            response = self.get_response(request)
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        endpoint = (match.view_name if match else None) or request.path
+        n_mas_1 = registro.n_mas_1()
+        repetidas = registro.repetidas()
+
+        ventana.agregar({
+            "momento": time.time(),
+            "endpoint": endpoint,
+            "path": request.get_full_path(),
+            "consultas": len(registro.consultas),
+            "tiempo_ms": registro.total_ms,
+            "repetidas": sum(veces - 1 for _, veces in repetidas),
+            "n_mas_1": n_mas_1,
+        })
+        for sql, veces in n_mas_1:
+            logger.warning("Posible N+1 en %s: %d veces %s", endpoint, veces, sql)
+
+        response["X-SQL-Consultas"] = str(len(registro.consultas))
+        response["X-SQL-Tiempo-ms"] = f"{registro.total_ms:.1f}"
+        response["X-SQL-Repetidas"] = str(sum(veces - 1 for _, veces in repetidas))
+        response["X-Tiempo-Vista-ms"] = f"{duracion_ms:.1f}"
+        return response
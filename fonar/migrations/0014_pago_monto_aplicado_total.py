@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:28
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_monto_aplicado_total(apps, schema_editor):
+    Pago = apps.get_model('fonar', 'Pago')
+    PagoAplicacion = apps.get_model('fonar', 'PagoAplicacion')
+    total = (
+        PagoAplicacion.objects.filter(pago=OuterRef('pk'))
+        .values('pago')
+        .annotate(total=Sum('monto_aplicado'))
+        .values('total')
+    )
+    Pago.objects.update(
+        monto_aplicado_total=Coalesce(
+            Subquery(total), Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0013_fondobalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='monto_aplicado_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='pagoaplicacion',
+            name='tipo',
+            field=models.CharField(choices=[('aporte', 'Aporte'), ('prestamo', 'Préstamo'), ('aporte_viaje', 'Aportes Adicionales (Viaje)'), ('admin_app', 'Administración APP'), ('actividad_recaudo', 'Recaudo Actividad')], max_length=20),
+        ),
+        migrations.RunPython(calcular_monto_aplicado_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:33
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _coalesce(subconsulta):
+    return Coalesce(
+        Subquery(subconsulta), Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def calcular_totales(apps, schema_editor):
+    Prestamo = apps.get_model('fonar', 'Prestamo')
+    CuotaPrestamo = apps.get_model('fonar', 'CuotaPrestamo')
+    PagoAplicacion = apps.get_model('fonar', 'PagoAplicacion')
+
+    def pagado(campo):
+        return _coalesce(
+            PagoAplicacion.objects.filter(prestamo=OuterRef('pk'), pago__validado=True)
+            .values('prestamo')
+            .annotate(total=Sum(campo))
+            .values('total')
+        )
+
+    Prestamo.objects.update(capital_pagado_total=pagado('capital'), interes_pagado_total=pagado('interes'))
+
+    capital_acumulado = (
+        CuotaPrestamo.objects.filter(prestamo=OuterRef('prestamo'), numero__lte=OuterRef('numero'))
+        .values('prestamo')
+        .annotate(total=Sum('capital'))
+        .values('total')
+    )
+    monto = Prestamo.objects.filter(pk=OuterRef('prestamo')).values('monto')
+    CuotaPrestamo.objects.update(saldo=_coalesce(monto) - _coalesce(capital_acumulado))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0014_pago_monto_aplicado_total'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuotaprestamo',
+            name='saldo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='capital_pagado_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='interes_pagado_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0015_prestamo_totales_cuota_saldo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aporte',
+            index=models.Index(fields=['usuario', 'fecha_aporte'], name='aporte_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aporte',
+            index=models.Index(fields=['fecha_aporte'], name='aporte_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cuotaprestamo',
+            index=models.Index(fields=['prestamo', 'pagada'], name='cuota_prestamo_pagada_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cuotaprestamo',
+            index=models.Index(condition=models.Q(('pagada', False)), fields=['prestamo', 'numero'], name='cuota_pendiente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cuotaprestamo',
+            index=models.Index(fields=['fecha_vencimiento'], name='cuota_vencimiento_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['usuario', 'fecha'], name='pago_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(condition=models.Q(('validado', True)), fields=['fecha'], name='pago_validado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagoaplicacion',
+            index=models.Index(fields=['tipo', 'pago'], name='pagoapl_tipo_pago_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagoaplicacion',
+            index=models.Index(fields=['prestamo', 'pago'], name='pagoapl_prestamo_pago_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['usuario', 'fecha_desembolso'], name='prestamo_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['fecha_desembolso'], name='prestamo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:45
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractYear
+
+
+def construir_resumenes(apps, schema_editor):
+    # tabla derivada: mismas consultas que fonar.resumenes.calcular_resumenes,
+    # copiadas aquí con los modelos históricos
+    Aporte = apps.get_model("fonar", "Aporte")
+    PagoAplicacion = apps.get_model("fonar", "PagoAplicacion")
+    Prestamo = apps.get_model("fonar", "Prestamo")
+    ResumenAnualSocio = apps.get_model("fonar", "ResumenAnualSocio")
+
+    filas = {}
+
+    def fila(usuario_id, anio):
+        if (usuario_id, anio) not in filas:
+            filas[(usuario_id, anio)] = ResumenAnualSocio(usuario_id=usuario_id, año=anio)
+        return filas[(usuario_id, anio)]
+
+    aportes = (
+        Aporte.objects.annotate(anio=ExtractYear("fecha_aporte"))
+        .values("usuario_id", "anio")
+        .annotate(total=models.Sum("monto"), primero=models.Min("fecha_aporte"), ultimo=models.Max("fecha_aporte"))
+        .order_by()
+    )
+    for row in aportes:
+        r = fila(row["usuario_id"], row["anio"])
+        r.aportes = row["total"] or Decimal("0")
+        r.primer_aporte = row["primero"]
+        r.ultimo_aporte = row["ultimo"]
+
+    es_viaje = models.Q(tipo="aporte_viaje")
+    es_actividad = models.Q(tipo="actividad_recaudo")
+    es_admin_app = models.Q(tipo="admin_app")
+    otros = (
+        PagoAplicacion.objects.filter(
+            tipo__in=("aporte_viaje", "actividad_recaudo", "admin_app"), pago__validado=True,
+        )
+        .annotate(anio=ExtractYear("pago__fecha"))
+        .values("pago__usuario_id", "anio")
+        .annotate(
+            viaje=models.Sum("monto_aplicado", filter=es_viaje),
+            actividad=models.Sum("monto_aplicado", filter=es_actividad),
+            actividad_movimientos=models.Count("id", filter=es_actividad),
+            admin_app=models.Sum("monto_aplicado", filter=es_admin_app),
+            admin_app_movimientos=models.Count("id", filter=es_admin_app),
+            admin_app_ultima_fecha=models.Max("pago__fecha", filter=es_admin_app),
+        )
+        .order_by()
+    )
+    for row in otros:
+        r = fila(row["pago__usuario_id"], row["anio"])
+        r.aportes_viaje = row["viaje"] or Decimal("0")
+        r.recaudo_actividad = row["actividad"] or Decimal("0")
+        r.actividad_movimientos = row["actividad_movimientos"]
+        r.admin_app = row["admin_app"] or Decimal("0")
+        r.admin_app_movimientos = row["admin_app_movimientos"]
+        r.admin_app_ultima_fecha = row["admin_app_ultima_fecha"]
+
+    intereses = (
+        PagoAplicacion.objects.filter(
+            pago__validado=True, prestamo__isnull=False, cuota__fecha_vencimiento__isnull=False,
+        )
+        .annotate(anio=ExtractYear("cuota__fecha_vencimiento"))
+        .values("prestamo__usuario_id", "anio")
+        .annotate(total=models.Sum("interes"))
+        .order_by()
+    )
+    for row in intereses:
+        fila(row["prestamo__usuario_id"], row["anio"]).intereses_pagados = row["total"] or Decimal("0")
+
+    prestamos = (
+        Prestamo.objects.annotate(anio=ExtractYear("fecha_desembolso"))
+        .values("usuario_id", "anio")
+        .annotate(
+            pendiente=models.Sum(
+                models.F("monto") - models.F("capital_pagado_total"),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+            cantidad=models.Count("id"),
+        )
+        .order_by()
+    )
+    for row in prestamos:
+        r = fila(row["usuario_id"], row["anio"])
+        r.capital_pendiente = row["pendiente"] or Decimal("0")
+        r.prestamos = row["cantidad"]
+
+    ResumenAnualSocio.objects.bulk_create(filas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0016_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenAnualSocio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.PositiveIntegerField()),
+                ('aportes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('primer_aporte', models.DateField(blank=True, null=True)),
+                ('ultimo_aporte', models.DateField(blank=True, null=True)),
+                ('aportes_viaje', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('recaudo_actividad', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('actividad_movimientos', models.PositiveIntegerField(default=0)),
+                ('admin_app', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('admin_app_movimientos', models.PositiveIntegerField(default=0)),
+                ('admin_app_ultima_fecha', models.DateTimeField(blank=True, null=True)),
+                ('intereses_pagados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('capital_pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('prestamos', models.PositiveIntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_anuales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['año'], name='resumen_anio_idx')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'año'), name='uq_resumen_usuario_anio')],
+            },
+        ),
+        migrations.RunPython(construir_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0018_tabla_cache'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='aporte',
+            name='aporte_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='aporte',
+            index=models.Index(fields=['fecha_aporte', 'id'], name='aporte_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0019_indice_aporte_fecha_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha', 'id'], name='pago_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudprestamo',
+            index=models.Index(fields=['fecha_solicitud', 'id'], name='solicitud_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def construir_terminos(apps, schema_editor):
+    # tabla derivada: se llena con la misma normalización que usa la señal de Usuario
+    from fonar.busqueda import CAMPOS, terminos
+
+    Usuario = apps.get_model("fonar", "Usuario")
+    TerminoBusqueda = apps.get_model("fonar", "TerminoBusqueda")
+    filas = [
+        TerminoBusqueda(usuario_id=pk, termino=termino, completo=completo)
+        for pk, *textos in Usuario.objects.values_list("pk", *CAMPOS).iterator()
+        for termino, completo in terminos(*textos).items()
+    ]
+    TerminoBusqueda.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0020_indices_listados_por_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=30)),
+                ('completo', models.BooleanField(default=False)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('termino', 'usuario'), name='uq_termino_usuario')],
+            },
+        ),
+        migrations.RunPython(construir_terminos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0021_terminos_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='documento',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='telefono',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+    ]
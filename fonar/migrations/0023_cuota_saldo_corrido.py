@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:10
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _coalesce(subconsulta):
+    return Coalesce(
+        Subquery(subconsulta), Value(Decimal('0')), output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def calcular_saldo_corrido(apps, schema_editor):
+    # el saldo pasa de ser el del plan a ser el corrido: monto menos el capital
+    # aplicado a la cuota y a las anteriores
+    Prestamo = apps.get_model('fonar', 'Prestamo')
+    CuotaPrestamo = apps.get_model('fonar', 'CuotaPrestamo')
+    PagoAplicacion = apps.get_model('fonar', 'PagoAplicacion')
+
+    capital_aplicado = (
+        PagoAplicacion.objects.filter(cuota__prestamo=OuterRef('prestamo'), cuota__numero__lte=OuterRef('numero'))
+        .values('cuota__prestamo')
+        .annotate(total=Sum('capital'))
+        .values('total')
+    )
+    monto = Prestamo.objects.filter(pk=OuterRef('prestamo')).values('monto')
+    CuotaPrestamo.objects.update(saldo=_coalesce(monto) - _coalesce(capital_aplicado))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0022_usuario_telefono_documento'),
+    ]
+
+    operations = [
+        migrations.RunPython(calcular_saldo_corrido, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 14:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def contar_aportes(apps, schema_editor):
+    # cantidad de aportes de cada (usuario, año) ya resumido
+    Aporte = apps.get_model('fonar', 'Aporte')
+    ResumenAnualSocio = apps.get_model('fonar', 'ResumenAnualSocio')
+
+    cantidad = (
+        Aporte.objects.filter(usuario=OuterRef('usuario'), fecha_aporte__year=OuterRef('año'))
+        .values('usuario')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    ResumenAnualSocio.objects.update(
+        aportes_movimientos=Coalesce(Subquery(cantidad), Value(0), output_field=models.PositiveIntegerField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fonar', '0023_cuota_saldo_corrido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumenanualsocio',
+            name='aportes_movimientos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(contar_aportes, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,45 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from datetime import timedelta
 from decimal import Decimal, getcontext, ROUND_HALF_UP
 from django.conf import settings
-from dateutil.relativedelta import relativedelta
+
+from . import amortizacion
 
 # más precisión para cálculos financieros
 getcontext().prec = 28  
 
 
+def solo_digitos(texto):
+    return "".join(c for c in str(texto or "") if c.isdigit())
+
+
+def normalizar_telefono(texto):
+    """Celular sin espacios ni indicativo: '+57 300 123 4567' → '3001234567'"""
+    digitos = solo_digitos(texto)
+    if len(digitos) == 12 and digitos.startswith("57"):
+        digitos = digitos[2:]
+    return digitos
+
+
+def sin_totales(instance, totales, kwargs):
+    """
+    kwargs de save() para una fila ya guardada sin los campos de `totales`,
+    que las señales mantienen con UPDATE ... F(): el valor en memoria puede
+    estar viejo y pisaría esos deltas. Un update_fields explícito se respeta.
+    """
+    if instance._state.adding or kwargs.get("force_insert") or kwargs.get("update_fields") is not None:
+        return kwargs
+    diferidos = instance.get_deferred_fields()
+    kwargs["update_fields"] = [
+        f.name for f in instance._meta.concrete_fields
+        if not f.primary_key and f.name not in totales and f.attname not in diferidos
+    ]
+    return kwargs
+
+
 # -------------------------
 # Usuario personalizado
 # -------------------------
@@ -22,6 +51,14 @@ class Usuario(AbstractUser):
         ("tercero", "Tercero"),
     ]
     tipo_usuario = models.CharField(max_length=20, choices=TIPO_CHOICES, default="asociado")
+    # solo dígitos: con ellos se reconoce al socio en los extractos (importar_extracto)
+    telefono = models.CharField(max_length=20, blank=True, db_index=True)
+    documento = models.CharField(max_length=20, blank=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        self.telefono = normalizar_telefono(self.telefono)
+        self.documento = solo_digitos(self.documento)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.username
@@ -37,6 +74,13 @@ class Aporte(models.Model):
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     soporte = models.FileField(upload_to='soportes/', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_aporte'], name='aporte_usuario_fecha_idx'),
+            # termina en id para paginar por cursor (listado de aportes)
+            models.Index(fields=['fecha_aporte', 'id'], name='aporte_fecha_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.usuario.username} - {self.monto} - {self.fecha_aporte}"
 
@@ -66,15 +110,21 @@ class Prestamo(models.Model):
     cuotas = models.IntegerField(default=1)
     fecha_desembolso = models.DateField()
     fecha_creacion = models.DateTimeField(default=timezone.now)
+    # Totales de aplicaciones con pago validado, los mantienen las señales
+    capital_pagado_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    interes_pagado_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha_desembolso'], name='prestamo_usuario_fecha_idx'),
+            models.Index(fields=['fecha_desembolso'], name='prestamo_fecha_idx'),
+        ]
 
     def calcular_cuota_fija(self):
-        interes_mensual = (self.interes / Decimal('100'))   # tasa mensual
-        if interes_mensual == 0:
-            return (self.monto / self.cuotas).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        cuota = self.monto * (interes_mensual * (1 + interes_mensual) ** self.cuotas) / (
-            (1 + interes_mensual) ** self.cuotas - 1
-        )
-        return cuota.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return amortizacion.calcular_cuota_fija(self.monto, self.interes, self.cuotas)
+
+    def plan_amortizacion(self):
+        return amortizacion.plan_amortizacion(self.monto, self.interes, self.cuotas)
 
     @property
     def monto_total(self):
@@ -82,72 +132,68 @@ class Prestamo(models.Model):
         return cuota * self.cuotas
 
     def generar_cuotas(self):
-        self.cuotaprestamo_set.all().delete()
-        cuota_fija = self.calcular_cuota_fija()
-        saldo = self.monto
-        fecha_venc = self.fecha_desembolso
-
-        for i in range(1, self.cuotas + 1):
-            interes = (saldo * (self.interes / Decimal('100'))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            capital = (cuota_fija - interes).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            # última cuota ajusta saldo
-            if i == self.cuotas:
-                capital = saldo.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                cuota_actual = (capital + interes).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            else:
-                cuota_actual = cuota_fija
-
-            fecha_venc = fecha_venc + relativedelta(months=+1)
-            saldo = (saldo - capital).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-            CuotaPrestamo.objects.create(
+        """
+        Genera el plan de amortización en memoria y lo escribe con un solo
+        bulk_create dentro de una transacción.
+
+        Es idempotente: si el plan ya se materializó para los términos actuales
+        de esta instancia (p. ej. desde save() y luego desde la señal post_save),
+        no se vuelve a escribir.
+        """
+        terminos = (self.monto, self.interes, self.cuotas, self.fecha_desembolso)
+        if getattr(self, "_terminos_cuotas", None) == terminos:
+            return
+
+        cuotas = [
+            CuotaPrestamo(
                 prestamo=self,
-                numero=i,
-                fecha_vencimiento=fecha_venc,
-                monto_cuota=cuota_actual,
+                numero=numero,
+                fecha_vencimiento=fecha_vencimiento,
+                monto_cuota=monto_cuota,
                 capital=capital,
                 interes=interes,
+                saldo=self.monto,  # sin pagos todavía
                 pagada=False
             )
+            for numero, fecha_vencimiento, monto_cuota, capital, interes in amortizacion.cuotas_programadas(
+                self.monto, self.interes, self.cuotas, self.fecha_desembolso
+            )
+        ]
+
+        with transaction.atomic():
+            self.cuotaprestamo_set.all().delete()
+            CuotaPrestamo.objects.bulk_create(cuotas)
+
+        self._terminos_cuotas = terminos
 
     def saldo_pendiente(self):
-        from .models import PagoAplicacion
-        pagado = PagoAplicacion.objects.filter(
-            prestamo=self,
-            pago__validado=True
-        ).aggregate(total=Sum('monto_aplicado'))['total'] or Decimal('0')
+        pagado = (self.capital_pagado_total or Decimal('0')) + (self.interes_pagado_total or Decimal('0'))
         return self.monto - pagado
 
     def save(self, *args, **kwargs):
-        if self.pk:
-            old = Prestamo.objects.get(pk=self.pk)
-            super().save(*args, **kwargs)
-            if (
-                old.monto != self.monto
-                or old.interes != self.interes
-                or old.cuotas != self.cuotas
-            ):
-                self.cuotaprestamo_set.all().delete()
+        with transaction.atomic():
+            if self.pk:
+                old = Prestamo.objects.get(pk=self.pk)
+                # el plan nuevo va antes del save para que post_save ya lo vea
+                if (
+                    old.monto != self.monto
+                    or old.interes != self.interes
+                    or old.cuotas != self.cuotas
+                ):
+                    self.generar_cuotas()
+                super().save(*args, **sin_totales(self, {"capital_pagado_total", "interes_pagado_total"}, kwargs))
+            else:
+                super().save(*args, **kwargs)
+                # Normalmente la señal post_save ya generó el plan; aquí no se repite
                 self.generar_cuotas()
-        else:
-            super().save(*args, **kwargs)
-            self.generar_cuotas()
 
     def __str__(self):
         return f"Préstamo #{self.id} - {self.usuario.username}"
 
     @property
     def capital_pendiente(self):
-        from .models import PagoAplicacion
-
-        # Total de capital pagado validado
-        capital_pagado = PagoAplicacion.objects.filter(
-            prestamo=self,
-            pago__validado=True
-        ).aggregate(total=Sum("capital"))["total"] or Decimal("0.00")
-
-        # Capital pendiente = monto original - capital ya pagado
+        # Capital pendiente = monto original - capital ya pagado (pagos validados)
+        capital_pagado = self.capital_pagado_total or Decimal("0.00")
         return (self.monto - capital_pagado).quantize(Decimal("0.01"))
 
 
@@ -170,14 +216,17 @@ class SolicitudPrestamo(models.Model):
     # tasa congelada en el momento de la solicitud
     interes = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # listado de solicitudes del dashboard (paginación por cursor)
+            models.Index(fields=['fecha_solicitud', 'id'], name='solicitud_fecha_id_idx'),
+        ]
+
     def calcular_cuota_fija(self):
-        interes_mensual = (self.interes / Decimal('100'))
-        if interes_mensual == 0:
-            return (self.monto / self.cuotas).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        cuota = self.monto * (interes_mensual * (1 + interes_mensual) ** self.cuotas) / (
-            (1 + interes_mensual) ** self.cuotas - 1
-        )
-        return cuota.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        return amortizacion.calcular_cuota_fija(self.monto, self.interes, self.cuotas)
+
+    def plan_amortizacion(self):
+        return amortizacion.plan_amortizacion(self.monto, self.interes, self.cuotas)
 
     def __str__(self):
         return f"Solicitud #{self.id} - {self.usuario.username} - {self.estado}"
@@ -197,6 +246,9 @@ class CuotaPrestamo(models.Model):
     fecha_pago = models.DateField(null=True, blank=True)
     capital_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     interes_pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Saldo corrido: monto del préstamo menos el capital pagado en esta cuota y
+    # las anteriores. Lo mantienen las señales junto con capital_pagado
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     @property
     def capital_pendiente(self):
@@ -214,9 +266,18 @@ class CuotaPrestamo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['prestamo', 'numero'], name='uq_prestamo_numero')
         ]
+        indexes = [
+            models.Index(fields=['prestamo', 'pagada'], name='cuota_prestamo_pagada_idx'),
+            # cuotas pendientes de un préstamo, en orden (formularios de pago)
+            models.Index(fields=['prestamo', 'numero'], condition=Q(pagada=False), name='cuota_pendiente_idx'),
+            models.Index(fields=['fecha_vencimiento'], name='cuota_vencimiento_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **sin_totales(self, {"capital_pagado", "interes_pagado", "pagada", "saldo"}, kwargs))
 
     def __str__(self):
-        return f"Cuota {self.numero} - Préstamo {self.prestamo.id}"
+        return f"Cuota {self.numero} - Préstamo {self.prestamo_id}"
 
 
 # -------------------------
@@ -229,15 +290,28 @@ class Pago(models.Model):
     fecha = models.DateTimeField(default=timezone.now) 
     validado = models.BooleanField(default=False)
     comentarios = models.TextField(blank=True, null=True)
+    # Suma de monto_aplicado de sus aplicaciones, la mantienen las señales
+    monto_aplicado_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='pago_usuario_fecha_idx'),
+            # casi todos los totales cuentan solo pagos validados
+            models.Index(fields=['fecha'], condition=Q(validado=True), name='pago_validado_fecha_idx'),
+            # listado de pagos del dashboard (paginación por cursor)
+            models.Index(fields=['fecha', 'id'], name='pago_fecha_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # validado depende del total: lo derivan las señales, también si cambia monto_reportado
+        super().save(*args, **sin_totales(self, {"monto_aplicado_total", "validado"}, kwargs))
 
     def __str__(self):
         return f"Pago {self.id} - {self.usuario.username}"
 
     @property
     def total_aplicado(self):
-        return self.aplicaciones.aggregate(
-            total=Sum("monto_aplicado")
-        )["total"] or Decimal("0")
+        return self.monto_aplicado_total or Decimal("0")
 
     @property
     def faltante(self):
@@ -269,6 +343,23 @@ class PagoAplicacion(models.Model):
     interes = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     monto_aplicado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tipo', 'pago'], name='pagoapl_tipo_pago_idx'),
+            models.Index(fields=['prestamo', 'pago'], name='pagoapl_prestamo_pago_idx'),
+        ]
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # post_init no corre al recargar: la foto de las señales para los deltas
+        # pasa a ser la de la BD; si se recargó solo una parte de ella, no se
+        # conoce y el próximo guardado recalcula completo
+        from .signals import CAMPOS_DELTA, estado_aplicacion
+        if fields is None:
+            self._estado_original = estado_aplicacion(self)
+        elif {self._meta.get_field(f).attname for f in fields} & set(CAMPOS_DELTA):
+            self._estado_original = None
+
     def save(self, *args, **kwargs):
         from decimal import Decimal
         from django.utils import timezone
@@ -371,4 +462,72 @@ class FondoBalance(models.Model):
         return (self.nequi or 0) + (self.efectivo or 0) + (self.daviplata or 0)
 
     def __str__(self):
-        return f"Balance {self.año}"
\ No newline at end of file
+        return f"Balance {self.año}"
+
+# -------------------------
+# Resumen anual por socio
+# -------------------------
+class ResumenAnualSocio(models.Model):
+    """
+    Cifras del año de cada usuario tal como las muestra el dashboard. Es una
+    tabla derivada: la mantienen las señales y se reconstruye con
+    `python manage.py reconstruir_resumenes`.
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="resumenes_anuales")
+    año = models.PositiveIntegerField()
+
+    # Aportes ordinarios (por fecha del aporte)
+    aportes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    primer_aporte = models.DateField(null=True, blank=True)
+    ultimo_aporte = models.DateField(null=True, blank=True)
+    aportes_movimientos = models.PositiveIntegerField(default=0)
+
+    # Otros aportes con pago validado (por fecha del pago)
+    aportes_viaje = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    recaudo_actividad = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    actividad_movimientos = models.PositiveIntegerField(default=0)
+    admin_app = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    admin_app_movimientos = models.PositiveIntegerField(default=0)
+    admin_app_ultima_fecha = models.DateTimeField(null=True, blank=True)
+
+    # Préstamos: intereses pagados por vencimiento de la cuota y capital
+    # pendiente de los desembolsados en el año
+    intereses_pagados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    capital_pendiente = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    prestamos = models.PositiveIntegerField(default=0)
+
+    fecha_calculo = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'año'], name='uq_resumen_usuario_anio')
+        ]
+        indexes = [
+            models.Index(fields=['año'], name='resumen_anio_idx'),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.año} - {self.usuario_id}"
+
+
+# -------------------------
+# Búsqueda de usuarios
+# -------------------------
+class TerminoBusqueda(models.Model):
+    """
+    Prefijos normalizados (minúsculas, sin tildes) de las palabras del usuario,
+    nombre, apellido y correo de cada usuario. Buscar por prefijo es una
+    igualdad sobre el índice. Las filas las mantiene busqueda.py (señal de
+    Usuario y reconstruir_busqueda).
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name="terminos_busqueda")
+    termino = models.CharField(max_length=30)
+    completo = models.BooleanField(default=False)  # el prefijo es una palabra entera
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['termino', 'usuario'], name='uq_termino_usuario')
+        ]
+
+    def __str__(self):
+        return f"{self.termino} - {self.usuario_id}"
@@ -0,0 +1,230 @@
+"""
+Reparto automático ("en cascada") de un Pago entre las cuotas pendientes del
+socio y sus aportes.
+
+calcular() arma en memoria las aplicaciones que cubren lo que falta por
+aplicar del pago, siguiendo una política: una lista ordenada de pasos. No
+escribe nada, así sirve para prellenar el formset del dashboard y el inline
+del admin. repartir() hace lo mismo para un lote de pagos (importación de
+extractos) y guardar() / aplicar() escriben el reparto con bulk_create en una
+transacción; recalculo_diferido pone al día cuotas, pagos, préstamos y
+resúmenes antes de confirmar.
+
+Pasos:
+- "interes": interés pendiente de las cuotas exigibles (las que vencen hasta
+  el fin del mes del pago), de la que vence primero a la última.
+- "capital": capital pendiente de esas mismas cuotas, en el mismo orden.
+- "aporte_mensual": un aporte por el valor del último aporte del socio, si
+  todavía no tiene uno en el mes del pago.
+- "aporte_viaje": lo que sobre, como aporte adicional.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Aporte, CuotaPrestamo, Pago, PagoAplicacion, Usuario
+from .signals import recalculo_diferido
+
+POLITICA = ("interes", "capital", "aporte_mensual", "aporte_viaje")
+PASOS = frozenset(POLITICA)
+LOTE = 1000
+
+
+def _dia_del_pago(pago):
+    fecha = pago.fecha or timezone.now()
+    if timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return fecha.date()
+
+
+def _fin_de_mes(dia):
+    return dia + relativedelta(day=31)
+
+
+def _cuotas_exigibles(usuario_ids, hasta):
+    """Cuotas pendientes que vencen hasta 'hasta', por usuario y en orden de vencimiento"""
+    por_usuario = defaultdict(list)
+    cuotas = (
+        CuotaPrestamo.objects.filter(
+            prestamo__usuario_id__in=usuario_ids, pagada=False, fecha_vencimiento__lte=hasta,
+        )
+        .annotate(socio_id=F("prestamo__usuario_id"))
+        .order_by("fecha_vencimiento", "prestamo_id", "numero")
+    )
+    for cuota in cuotas:
+        por_usuario[cuota.socio_id].append(cuota)
+    return por_usuario
+
+
+def _aportes(usuario_ids, desde, hasta):
+    """
+    (meses con aporte, valor del último aporte) de los usuarios: los meses
+    como {(usuario_id, año, mes)} entre 'desde' y 'hasta', y el valor del
+    último aporte hasta 'hasta' como {usuario_id: monto}.
+    """
+    meses = {
+        (usuario_id, fecha.year, fecha.month)
+        for usuario_id, fecha in Aporte.objects.filter(
+            usuario_id__in=usuario_ids, fecha_aporte__range=(desde, hasta),
+        ).values_list("usuario_id", "fecha_aporte")
+    }
+    ultimo = (
+        Aporte.objects.filter(usuario_id=OuterRef("pk"), fecha_aporte__lte=hasta)
+        .order_by("-fecha_aporte", "-id")
+        .values("monto")[:1]
+    )
+    valores = dict(
+        Usuario.objects.filter(pk__in=usuario_ids)
+        .annotate(valor=Subquery(ultimo))
+        .values_list("pk", "valor")
+    )
+    return meses, valores
+
+
+def _repartir_uno(pago, politica, cuotas, meses, valor_aporte):
+    """
+    Reparte un pago sobre sus cuotas exigibles (en memoria). Descuenta lo
+    aplicado de esas cuotas y anota el mes del aporte, así el siguiente pago
+    del mismo socio en el lote ve lo que ya se cubrió.
+    """
+    disponible = pago.faltante
+    if disponible <= 0 or not pago.usuario_id:
+        return []
+    dia = _dia_del_pago(pago)
+    exigibles = [c for c in cuotas if c.fecha_vencimiento <= _fin_de_mes(dia)]
+
+    aplicaciones = []
+    por_cuota = {}
+
+    def a_cuota(cuota, capital=Decimal("0"), interes=Decimal("0")):
+        # interés y capital de una misma cuota van en una sola aplicación
+        aplicacion = por_cuota.get(cuota.pk)
+        if aplicacion is None:
+            aplicacion = por_cuota[cuota.pk] = PagoAplicacion(
+                pago=pago, tipo="prestamo", prestamo_id=cuota.prestamo_id, cuota=cuota,
+            )
+            aplicaciones.append(aplicacion)
+        aplicacion.capital += capital
+        aplicacion.interes += interes
+        aplicacion.monto_aplicado = aplicacion.capital + aplicacion.interes
+        cuota.capital_pagado += capital
+        cuota.interes_pagado += interes
+
+    for paso in politica:
+        if disponible <= 0:
+            break
+        if paso == "interes":
+            for cuota in exigibles:
+                monto = min(disponible, cuota.interes_pendiente)
+                if monto > 0:
+                    a_cuota(cuota, interes=monto)
+                    disponible -= monto
+        elif paso == "capital":
+            for cuota in exigibles:
+                monto = min(disponible, cuota.capital_pendiente)
+                if monto > 0:
+                    a_cuota(cuota, capital=monto)
+                    disponible -= monto
+        elif paso == "aporte_mensual":
+            mes = (pago.usuario_id, dia.year, dia.month)
+            monto = min(disponible, valor_aporte or Decimal("0"))
+            if monto > 0 and mes not in meses:
+                aplicaciones.append(PagoAplicacion(pago=pago, tipo="aporte", monto_aplicado=monto, fecha_aporte=dia))
+                meses.add(mes)
+                disponible -= monto
+        elif paso == "aporte_viaje":
+            aplicaciones.append(PagoAplicacion(pago=pago, tipo="aporte_viaje", monto_aplicado=disponible, fecha_aporte=dia))
+            disponible = Decimal("0")
+    return aplicaciones
+
+
+def repartir(pagos, politica=POLITICA):
+    """
+    Aplicaciones (sin guardar) de varios pagos, una lista por pago y en el
+    mismo orden. Carga las cuotas y los aportes de todos los socios con tres
+    consultas y reparte en orden de fecha, de modo que dos pagos del mismo
+    socio no cubren dos veces la misma cuota ni el mismo aporte mensual.
+    """
+    desconocidos = set(politica) - PASOS
+    if desconocidos:
+        raise ValueError(f"Pasos de reparto desconocidos: {', '.join(sorted(desconocidos))}")
+
+    resultado = [[] for _ in pagos]
+    con_faltante = [(i, p) for i, p in enumerate(pagos) if p.usuario_id and p.faltante > 0]
+    if not con_faltante:
+        return resultado
+
+    dias = [_dia_del_pago(p) for _, p in con_faltante]
+    usuario_ids = {p.usuario_id for _, p in con_faltante}
+    hasta = _fin_de_mes(max(dias))
+    cuotas = _cuotas_exigibles(usuario_ids, hasta) if {"interes", "capital"} & set(politica) else {}
+    meses, valores = set(), {}
+    if "aporte_mensual" in politica:
+        meses, valores = _aportes(usuario_ids, min(dias).replace(day=1), hasta)
+
+    for dia, (i, pago) in sorted(zip(dias, con_faltante), key=lambda par: (par[0], par[1][0])):
+        resultado[i] = _repartir_uno(
+            pago, politica, cuotas.get(pago.usuario_id, []), meses, valores.get(pago.usuario_id),
+        )
+    return resultado
+
+
+def calcular(pago, politica=POLITICA):
+    """
+    Aplicaciones (sin guardar) que reparten el faltante del pago según la
+    política. El pago puede no estar guardado todavía (formulario de
+    creación): basta con usuario, monto_reportado y fecha.
+    """
+    return repartir([pago], politica)[0]
+
+
+def datos_iniciales(aplicaciones):
+    """Las aplicaciones como 'initial' de un formset de PagoAplicacion"""
+    return [
+        {
+            "tipo": a.tipo,
+            "prestamo": a.prestamo_id,
+            "cuota": a.cuota_id,
+            "capital": a.capital,
+            "interes": a.interes,
+            "monto_aplicado": a.monto_aplicado,
+            "fecha_aporte": a.fecha_aporte,
+        }
+        for a in aplicaciones
+    ]
+
+
+def guardar(aplicaciones):
+    """
+    Inserta con bulk_create las aplicaciones (de pagos ya guardados) y los
+    aportes que generan, sin pasar por PagoAplicacion.save. Las cuotas,
+    pagos, préstamos y resúmenes se recalculan una vez al confirmar.
+    """
+    with recalculo_diferido() as pendientes:
+        de_aporte = [a for a in aplicaciones if a.tipo == "aporte"]
+        aportes = Aporte.objects.bulk_create([
+            Aporte(usuario_id=a.pago.usuario_id, fecha_aporte=a.fecha_aporte, monto=a.monto_aplicado, soporte=a.pago.soporte)
+            for a in de_aporte
+        ], batch_size=LOTE)
+        for aplicacion, aporte in zip(de_aporte, aportes):
+            aplicacion.aporte = aporte
+        PagoAplicacion.objects.bulk_create(aplicaciones, batch_size=LOTE)
+
+        # bulk_create no dispara señales: se anota lo que hay que recalcular
+        pendientes["pagos"].update(a.pago_id for a in aplicaciones)
+        pendientes["cuotas"].update(a.cuota_id for a in aplicaciones)
+        pendientes["prestamos"].update(a.prestamo_id for a in aplicaciones)
+        pendientes["resumenes"].update((a.usuario_id, a.fecha_aporte.year) for a in aportes)
+    return aplicaciones
+
+
+def aplicar(pago, politica=POLITICA):
+    """Calcula y guarda el reparto del faltante de un pago ya guardado. Devuelve las aplicaciones creadas."""
+    with transaction.atomic():
+        # bloquea el pago: dos repartos a la vez no deben aplicar el mismo faltante
+        pago = Pago.objects.select_for_update().get(pk=pago.pk)
+        return guardar(calcular(pago, politica))
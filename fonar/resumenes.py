@@ -0,0 +1,224 @@
+"""
+Resumen anual por socio (ResumenAnualSocio): aportes, otros aportes, intereses
+pagados y capital pendiente de cada (usuario, año), como los calcula el
+dashboard.
+
+Las señales marcan las claves (usuario, año) afectadas y aquí se recalculan
+solo esas filas; una aplicación de pago toca a lo sumo el año del pago, el
+de vencimiento de su cuota y el de desembolso de su préstamo. Año None
+significa "todos los años del usuario" (cuando cambia un préstamo, cuyas
+cuotas vencen en varios años).
+reconstruir_resumenes (y recalcular_todo) usan las mismas funciones sobre
+toda la tabla.
+"""
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from .fechas import en_anio, en_anio_local
+from .models import Aporte, CuotaPrestamo, PagoAplicacion, Pago, Prestamo, ResumenAnualSocio
+
+OTROS_APORTES = ("aporte_viaje", "actividad_recaudo", "admin_app")
+
+CAMPOS = (
+    "aportes", "primer_aporte", "ultimo_aporte", "aportes_movimientos",
+    "aportes_viaje", "recaudo_actividad", "actividad_movimientos",
+    "admin_app", "admin_app_movimientos", "admin_app_ultima_fecha",
+    "intereses_pagados", "capital_pendiente", "prestamos",
+)
+
+
+def _en_anios(campo, anios, local=False):
+    filtro = en_anio_local if local else en_anio
+    return reduce(or_, (filtro(campo, anio) for anio in sorted(anios)))
+
+
+def _filtrar(qs, campo_usuario, campo_fecha, usuarios, anios, local=False):
+    if usuarios is not None:
+        qs = qs.filter(**{f"{campo_usuario}__in": usuarios})
+    if anios is not None:
+        qs = qs.filter(_en_anios(campo_fecha, anios, local))
+    return qs
+
+
+def calcular_resumenes(usuarios=None, anios=None):
+    """
+    Filas de ResumenAnualSocio (sin guardar) de los usuarios y años indicados;
+    None es sin filtro. Son cuatro consultas agrupadas por (usuario, año).
+    """
+    filas = {}
+
+    def fila(usuario_id, anio):
+        clave = (usuario_id, anio)
+        if clave not in filas:
+            filas[clave] = ResumenAnualSocio(usuario_id=usuario_id, año=anio)
+        return filas[clave]
+
+    # Aportes ordinarios
+    aportes = (
+        _filtrar(Aporte.objects.all(), "usuario_id", "fecha_aporte", usuarios, anios)
+        .annotate(anio=ExtractYear("fecha_aporte"))
+        .values("usuario_id", "anio")
+        .annotate(
+            total=Sum("monto"), primero=Min("fecha_aporte"), ultimo=Max("fecha_aporte"), movimientos=Count("id"),
+        )
+        .order_by()
+    )
+    for row in aportes:
+        r = fila(row["usuario_id"], row["anio"])
+        r.aportes = row["total"] or Decimal("0")
+        r.primer_aporte = row["primero"]
+        r.ultimo_aporte = row["ultimo"]
+        r.aportes_movimientos = row["movimientos"]
+
+    # Viaje, actividad y administración APP (pagos validados, por año del pago)
+    es_viaje = Q(tipo="aporte_viaje")
+    es_actividad = Q(tipo="actividad_recaudo")
+    es_admin_app = Q(tipo="admin_app")
+    otros = (
+        _filtrar(
+            PagoAplicacion.objects.filter(tipo__in=OTROS_APORTES, pago__validado=True),
+            "pago__usuario_id", "pago__fecha", usuarios, anios, local=True,
+        )
+        .annotate(anio=ExtractYear("pago__fecha"))
+        .values("pago__usuario_id", "anio")
+        .annotate(
+            viaje=Sum("monto_aplicado", filter=es_viaje),
+            actividad=Sum("monto_aplicado", filter=es_actividad),
+            actividad_movimientos=Count("id", filter=es_actividad),
+            admin_app=Sum("monto_aplicado", filter=es_admin_app),
+            admin_app_movimientos=Count("id", filter=es_admin_app),
+            admin_app_ultima_fecha=Max("pago__fecha", filter=es_admin_app),
+        )
+        .order_by()
+    )
+    for row in otros:
+        r = fila(row["pago__usuario_id"], row["anio"])
+        r.aportes_viaje = row["viaje"] or Decimal("0")
+        r.recaudo_actividad = row["actividad"] or Decimal("0")
+        r.actividad_movimientos = row["actividad_movimientos"]
+        r.admin_app = row["admin_app"] or Decimal("0")
+        r.admin_app_movimientos = row["admin_app_movimientos"]
+        r.admin_app_ultima_fecha = row["admin_app_ultima_fecha"]
+
+    # Intereses pagados, por año de vencimiento de la cuota y dueño del préstamo
+    intereses = (
+        _filtrar(
+            PagoAplicacion.objects.filter(
+                pago__validado=True, prestamo__isnull=False, cuota__fecha_vencimiento__isnull=False,
+            ),
+            "prestamo__usuario_id", "cuota__fecha_vencimiento", usuarios, anios,
+        )
+        .annotate(anio=ExtractYear("cuota__fecha_vencimiento"))
+        .values("prestamo__usuario_id", "anio")
+        .annotate(total=Sum("interes"))
+        .order_by()
+    )
+    for row in intereses:
+        fila(row["prestamo__usuario_id"], row["anio"]).intereses_pagados = row["total"] or Decimal("0")
+
+    # Capital pendiente de los préstamos desembolsados en el año
+    prestamos = (
+        _filtrar(Prestamo.objects.all(), "usuario_id", "fecha_desembolso", usuarios, anios)
+        .annotate(anio=ExtractYear("fecha_desembolso"))
+        .values("usuario_id", "anio")
+        .annotate(
+            pendiente=Sum(
+                F("monto") - F("capital_pagado_total"),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            cantidad=Count("id"),
+        )
+        .order_by()
+    )
+    for row in prestamos:
+        r = fila(row["usuario_id"], row["anio"])
+        r.capital_pendiente = row["pendiente"] or Decimal("0")
+        r.prestamos = row["cantidad"]
+
+    return list(filas.values())
+
+
+def recalcular_resumenes(claves):
+    """
+    Recalcula las filas de las claves (usuario_id, año) indicadas: borra las que
+    había y escribe las nuevas. Con algún año None se recalculan todos los años
+    de esos usuarios.
+    """
+    claves = {(u, a) for u, a in claves if u}
+    if not claves:
+        return
+    usuarios = {u for u, _ in claves}
+    anios = None if any(a is None for _, a in claves) else {a for _, a in claves}
+
+    nuevas = calcular_resumenes(usuarios, anios)
+    with transaction.atomic():
+        actuales = ResumenAnualSocio.objects.filter(usuario_id__in=usuarios)
+        if anios is not None:
+            actuales = actuales.filter(año__in=anios)
+        actuales.delete()
+        ResumenAnualSocio.objects.bulk_create(nuevas)
+
+
+def reconstruir_resumenes(usuarios=None, anios=None):
+    """
+    Borra y vuelve a escribir los resúmenes de los usuarios y años indicados
+    (None es sin filtro). Devuelve (filas borradas, filas escritas).
+    """
+    nuevas = calcular_resumenes(usuarios, anios)
+    actuales = ResumenAnualSocio.objects.all()
+    if usuarios is not None:
+        actuales = actuales.filter(usuario_id__in=usuarios)
+    if anios is not None:
+        actuales = actuales.filter(año__in=anios)
+    with transaction.atomic():
+        borradas, _ = actuales.delete()
+        ResumenAnualSocio.objects.bulk_create(nuevas, batch_size=1000)
+    return borradas, len(nuevas)
+
+
+def _clave(usuario_id, fecha, local=False):
+    if not usuario_id or fecha is None:
+        return None
+    if local:
+        fecha = timezone.localtime(fecha)
+    return (usuario_id, fecha.year)
+
+
+def claves_de_pagos_y_prestamos(pago_ids=(), prestamo_ids=(), cuota_ids=()):
+    """
+    Claves (usuario_id, año) afectadas por cambios en aplicaciones de estos
+    pagos, cuotas o préstamos: el año del pago (otros aportes), el año de
+    vencimiento de cada cuota aplicada (intereses) y el año de desembolso de
+    cada préstamo (capital pendiente). Las cuotas y préstamos se pasan aparte
+    cuando ya no tienen la aplicación (se movió o se borró).
+    """
+    pago_ids = {pk for pk in pago_ids if pk}
+    prestamo_ids = {pk for pk in prestamo_ids if pk}
+    cuota_ids = {pk for pk in cuota_ids if pk}
+    claves = set()
+    if pago_ids:
+        # un pago sin aplicaciones sale igual (LEFT JOIN)
+        for fila in Pago.objects.filter(pk__in=pago_ids).values_list(
+            "usuario_id", "fecha", "aplicaciones__prestamo__usuario_id",
+            "aplicaciones__prestamo__fecha_desembolso", "aplicaciones__cuota__fecha_vencimiento",
+        ):
+            usuario_id, fecha, dueno_id, desembolso, vencimiento = fila
+            claves |= {_clave(usuario_id, fecha, local=True), _clave(dueno_id, desembolso), _clave(dueno_id, vencimiento)}
+    if cuota_ids:
+        for dueno_id, desembolso, vencimiento in CuotaPrestamo.objects.filter(pk__in=cuota_ids).values_list(
+            "prestamo__usuario_id", "prestamo__fecha_desembolso", "fecha_vencimiento",
+        ):
+            claves |= {_clave(dueno_id, desembolso), _clave(dueno_id, vencimiento)}
+    if prestamo_ids:
+        for dueno_id, desembolso in Prestamo.objects.filter(pk__in=prestamo_ids).values_list(
+            "usuario_id", "fecha_desembolso",
+        ):
+            claves.add(_clave(dueno_id, desembolso))
+    claves.discard(None)
+    return claves
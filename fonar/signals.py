@@ -1,9 +1,18 @@
-from django.db.models.signals import post_save, post_delete
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.db.models import Sum
+from django.db.models import Sum, F, Q, Value, Case, When, Subquery
 from decimal import Decimal
 from django.utils import timezone
-from .models import Prestamo, Pago, PagoAplicacion, CuotaPrestamo, SolicitudPrestamo
+from .models import (
+    Aporte, Prestamo, Pago, PagoAplicacion, CuotaPrestamo, SolicitudPrestamo, Usuario, FondoBalance,
+    TasaInteres,
+)
+from . import busqueda, cache_versionada, resumenes, tasas, totales
 
 
 # ==== Señal para Prestamo ====
@@ -14,15 +23,16 @@ def generar_cuotas_automaticas(sender, instance, created, **kwargs):
         instance.generar_cuotas()
 
 
-# ==== Funciones de recalculo ====
+# ==== Funciones de recalculo completo (ruta de reparación) ====
 def recalcular_pago(pago: Pago):
-    """Recalcula el estado de validación de un Pago"""
+    """Recalcula desde cero el total aplicado y el estado de validación de un Pago"""
     total_aplicado = PagoAplicacion.objects.filter(pago=pago).aggregate(
         total=Sum("monto_aplicado")
-    )["total"] or 0
+    )["total"] or Decimal("0")
 
+    pago.monto_aplicado_total = total_aplicado
     pago.validado = (total_aplicado == pago.monto_reportado)
-    pago.save(update_fields=["validado"])
+    pago.save(update_fields=["monto_aplicado_total", "validado"])
 
 
 def recalcular_cuota(cuota: CuotaPrestamo):
@@ -36,35 +46,374 @@ def recalcular_cuota(cuota: CuotaPrestamo):
     cuota.interes_pagado = totales['total_interes'] or Decimal('0')
     cuota.pagada = cuota.capital_pagado >= cuota.capital
     cuota.save(update_fields=["capital_pagado", "interes_pagado", "pagada"])
+    recalcular_saldos([cuota.prestamo_id])
+
+
+def recalcular_cuotas(cuota_ids):
+    """Recalcula desde cero varias cuotas con una consulta agrupada y un bulk_update"""
+    cuota_ids = {pk for pk in cuota_ids if pk}
+    if not cuota_ids:
+        return
+    totales = {
+        row["cuota"]: row
+        for row in PagoAplicacion.objects.filter(cuota__in=cuota_ids)
+        .values("cuota")
+        .annotate(total_capital=Sum("capital"), total_interes=Sum("interes"))
+        .order_by()
+    }
+    cuotas = list(CuotaPrestamo.objects.filter(pk__in=cuota_ids))
+    for cuota in cuotas:
+        fila = totales.get(cuota.pk, {})
+        cuota.capital_pagado = fila.get("total_capital") or Decimal("0")
+        cuota.interes_pagado = fila.get("total_interes") or Decimal("0")
+        cuota.pagada = cuota.capital_pagado >= cuota.capital
+    CuotaPrestamo.objects.bulk_update(cuotas, ["capital_pagado", "interes_pagado", "pagada"])
+    recalcular_saldos({cuota.prestamo_id for cuota in cuotas})
+
+
+def recalcular_saldos(prestamo_ids):
+    """Recalcula el saldo corrido de todas las cuotas de estos préstamos en un UPDATE"""
+    CuotaPrestamo.objects.filter(prestamo_id__in=prestamo_ids).update(saldo=totales.saldo_cuota())
+
+
+def recalcular_pagos(pago_ids):
+    """Recalcula desde cero varios pagos con una consulta agrupada y un bulk_update"""
+    pago_ids = {pk for pk in pago_ids if pk}
+    if not pago_ids:
+        return
+    totales = dict(
+        PagoAplicacion.objects.filter(pago__in=pago_ids)
+        .values("pago")
+        .annotate(total=Sum("monto_aplicado"))
+        .order_by()
+        .values_list("pago", "total")
+    )
+    pagos = list(Pago.objects.filter(pk__in=pago_ids))
+    for pago in pagos:
+        pago.monto_aplicado_total = totales.get(pago.pk) or Decimal("0")
+        pago.validado = (pago.monto_aplicado_total == pago.monto_reportado)
+    Pago.objects.bulk_update(pagos, ["monto_aplicado_total", "validado"])
+
+
+def recalcular_prestamos(prestamo_ids=(), pago_ids=()):
+    """
+    Recalcula capital/interés pagado (solo pagos validados) de los préstamos
+    indicados y de los que tienen aplicaciones en los pagos indicados, en un UPDATE.
+    Los pagos cuentan porque al cambiar su validación cambian todos sus préstamos.
+    """
+    prestamo_ids = {pk for pk in prestamo_ids if pk}
+    pago_ids = {pk for pk in pago_ids if pk}
+    if not prestamo_ids and not pago_ids:
+        return
+    filtro = Q(pk__in=prestamo_ids)
+    if pago_ids:
+        filtro |= Q(pk__in=PagoAplicacion.objects.filter(
+            pago_id__in=pago_ids, prestamo_id__isnull=False
+        ).values("prestamo_id"))
+    Prestamo.objects.filter(filtro).update(
+        capital_pagado_total=totales.capital_pagado_prestamo(),
+        interes_pagado_total=totales.interes_pagado_prestamo(),
+    )
+
+
+# ==== Recalculo diferido para operaciones masivas ====
+_diferido = threading.local()
+
+
+def _pendientes():
+    return getattr(_diferido, "pendientes", None)
+
+
+@contextmanager
+def recalculo_diferido():
+    """
+    Mientras está activo, las señales de PagoAplicacion no tocan cuotas ni pagos:
+    solo anotan los ids afectados. Al salir del bloque, todavía dentro de su
+    transacción, cada cuota y cada pago se recalcula una sola vez; si algo
+    falla se deshace todo junto. Solo la subida de versión de la caché espera
+    al commit.
+
+    Abre su propia transacción (o se une a la externa). Sirve también como
+    decorador de vistas y comandos: @recalculo_diferido()
+    Devuelve el dict {"cuotas": set, "pagos": set, "prestamos": set,
+    "resumenes": set} por si se quiere marcar algo a mano.
+    """
+    pendientes = _pendientes()
+    if pendientes is not None:
+        # anidado: lo recalcula el contexto externo
+        yield pendientes
+        return
+
+    pendientes = _pendientes_vacios()
+    _diferido.pendientes = pendientes
+    with transaction.atomic():
+        try:
+            yield pendientes
+        finally:
+            _diferido.pendientes = None
+        recalcular_pendientes(pendientes)
+
+
+def _pendientes_vacios():
+    return {"cuotas": set(), "pagos": set(), "prestamos": set(), "resumenes": set()}
+
+
+def recalcular_pendientes(pendientes):
+    recalcular_cuotas(pendientes["cuotas"])
+    recalcular_pagos(pendientes["pagos"])
+    # después de los pagos: depende de su validación
+    recalcular_prestamos(pendientes["prestamos"], pendientes["pagos"])
+    # al final: usa la validación de los pagos y los totales de los préstamos
+    _recalcular_resumenes(
+        pendientes["resumenes"]
+        | resumenes.claves_de_pagos_y_prestamos(pendientes["pagos"], pendientes["prestamos"], pendientes["cuotas"])
+    )
+    # la versión sube al confirmar: lo cacheado antes usó totales viejos
+    cache_versionada.invalidar()
+
+
+# ==== Resumen anual por socio ====
+def _usuarios_borrandose():
+    if not hasattr(_diferido, "usuarios_borrandose"):
+        _diferido.usuarios_borrandose = set()
+    return _diferido.usuarios_borrandose
+
+
+def _recalcular_resumenes(claves):
+    # los usuarios que se están borrando pierden sus resúmenes en la misma cascada
+    borrandose = _usuarios_borrandose()
+    resumenes.recalcular_resumenes({c for c in claves if c and c[0] not in borrandose})
+
+
+def actualizar_resumenes(claves):
+    """Recalcula ya las claves (usuario_id, año), o las anota si hay recalculo diferido"""
+    pendientes = _pendientes()
+    if pendientes is not None:
+        pendientes["resumenes"].update(claves)
+    else:
+        _recalcular_resumenes(claves)
+
+
+def clave_resumen(instance, campo_fecha, local=False):
+    """
+    (usuario_id, año) de la fila con sus valores actuales. El año es None si
+    la fecha no se conoce (diferida o sin convertir); la clave es None si
+    tampoco se conoce el usuario.
+    """
+    usuario_id = instance.__dict__.get("usuario_id")
+    if not usuario_id:
+        return None
+    fecha = instance.__dict__.get(campo_fecha)
+    if local and isinstance(fecha, datetime) and timezone.is_aware(fecha):
+        fecha = timezone.localtime(fecha)
+    return (usuario_id, getattr(fecha, "year", None))
+
+
+# ==== Mantenimiento incremental (deltas) ====
+CAMPOS_DELTA = ("cuota_id", "pago_id", "prestamo_id", "capital", "interes", "monto_aplicado")
+
+ESTADO_VACIO = {
+    "cuota_id": None,
+    "pago_id": None,
+    "prestamo_id": None,
+    "capital": Decimal("0"),
+    "interes": Decimal("0"),
+    "monto_aplicado": Decimal("0"),
+}
+
+
+def estado_aplicacion(app):
+    """
+    Foto de los campos de una aplicación que afectan cuotas y pagos.
+    Devuelve None si alguno está diferido (no se conoce el valor en BD).
+    """
+    if any(campo not in app.__dict__ for campo in CAMPOS_DELTA):
+        return None
+    return {
+        "cuota_id": app.cuota_id,
+        "pago_id": app.pago_id,
+        "prestamo_id": app.prestamo_id,
+        "capital": app.capital or Decimal("0"),
+        "interes": app.interes or Decimal("0"),
+        "monto_aplicado": app.monto_aplicado or Decimal("0"),
+    }
+
+
+def aplicar_delta_cuota(cuota_id, capital, interes):
+    """
+    Suma el delta de capital/interés a la cuota con un UPDATE atómico. El
+    capital también baja el saldo corrido de esta cuota y de las siguientes
+    del préstamo (otro UPDATE).
+    """
+    cuota = CuotaPrestamo.objects.filter(pk=cuota_id)
+    cuota.update(
+        capital_pagado=F("capital_pagado") + Value(capital),
+        interes_pagado=F("interes_pagado") + Value(interes),
+        pagada=Case(
+            When(capital_pagado__gte=F("capital") - Value(capital), then=Value(True)),
+            default=Value(False),
+        ),
+    )
+    if capital:
+        CuotaPrestamo.objects.filter(
+            prestamo_id=Subquery(cuota.values("prestamo_id")),
+            numero__gte=Subquery(cuota.values("numero")),
+        ).update(saldo=F("saldo") - Value(capital))
+
+
+def aplicar_delta_pago(pago_id, monto):
+    """Suma el delta de monto aplicado al pago y recalcula su validación"""
+    Pago.objects.filter(pk=pago_id).update(
+        monto_aplicado_total=F("monto_aplicado_total") + Value(monto),
+        validado=Case(
+            When(monto_reportado=F("monto_aplicado_total") + Value(monto), then=Value(True)),
+            default=Value(False),
+        ),
+    )
+
+
+def _movimientos(anterior, actual, campo):
+    """
+    Tuplas (pk, nuevo, viejo) a aplicar sobre la cuota o el pago de la aplicación.
+    Si la aplicación cambió de cuota/pago, resta del anterior y suma al nuevo.
+    """
+    if anterior[campo] == actual[campo]:
+        return [(actual[campo], actual, anterior)] if actual[campo] else []
+    movimientos = []
+    if anterior[campo]:
+        movimientos.append((anterior[campo], ESTADO_VACIO, anterior))
+    if actual[campo]:
+        movimientos.append((actual[campo], actual, ESTADO_VACIO))
+    return movimientos
+
+
+def aplicar_deltas(instance, anterior, actual):
+    """Aplica la diferencia anterior → actual de una aplicación sobre su cuota y su pago"""
+    for cuota_id, nuevo, viejo in _movimientos(anterior, actual, "cuota_id"):
+        capital = nuevo["capital"] - viejo["capital"]
+        interes = nuevo["interes"] - viejo["interes"]
+        aplicar_delta_cuota(cuota_id, capital, interes)
+
+        # reflejar el cambio en la cuota ya cargada en memoria
+        cuota = instance.cuota if PagoAplicacion.cuota.is_cached(instance) else None
+        if cuota is not None and cuota.pk == cuota_id:
+            cuota.capital_pagado = (cuota.capital_pagado or Decimal("0")) + capital
+            cuota.interes_pagado = (cuota.interes_pagado or Decimal("0")) + interes
+            cuota.pagada = cuota.capital_pagado >= cuota.capital
+            cuota.saldo = (cuota.saldo or Decimal("0")) - capital
+
+    for pago_id, nuevo, viejo in _movimientos(anterior, actual, "pago_id"):
+        monto = nuevo["monto_aplicado"] - viejo["monto_aplicado"]
+        aplicar_delta_pago(pago_id, monto)
+
+        # reflejar el cambio en el pago ya cargado en memoria (p. ej. el del formset)
+        pago = instance.pago if PagoAplicacion.pago.is_cached(instance) else None
+        if pago is not None and pago.pk == pago_id:
+            pago.monto_aplicado_total = (pago.monto_aplicado_total or Decimal("0")) + monto
+            pago.validado = (pago.monto_aplicado_total == pago.monto_reportado)
+
+    # los totales del préstamo dependen de la validación del pago: se recalculan
+    # con un UPDATE sobre los préstamos tocados
+    recalcular_prestamos(
+        {anterior["prestamo_id"], actual["prestamo_id"]},
+        {anterior["pago_id"], actual["pago_id"]},
+    )
+    # solo los años tocados; la cuota y el préstamo de donde salió la aplicación
+    # ya no aparecen entre las aplicaciones de sus pagos
+    _recalcular_resumenes(resumenes.claves_de_pagos_y_prestamos(
+        {anterior["pago_id"], actual["pago_id"]},
+        prestamo_ids={anterior["prestamo_id"]} - {actual["prestamo_id"]},
+        cuota_ids={anterior["cuota_id"]} - {actual["cuota_id"]},
+    ))
+
+
+def _marcar_pendientes(pendientes, instance, anterior=None):
+    """Anota la cuota, el pago y el préstamo (actuales y anteriores) para recalcular al confirmar"""
+    pendientes["cuotas"].add(instance.cuota_id)
+    pendientes["pagos"].add(instance.pago_id)
+    pendientes["prestamos"].add(instance.prestamo_id)
+    if anterior:
+        pendientes["cuotas"].add(anterior["cuota_id"])
+        pendientes["pagos"].add(anterior["pago_id"])
+        pendientes["prestamos"].add(anterior["prestamo_id"])
+
+
+def recalcular_aplicacion_completa(instance, anterior=None):
+    """Ruta de respaldo cuando no se conoce el estado anterior de la aplicación"""
+    pendientes = _pendientes_vacios()
+    _marcar_pendientes(pendientes, instance, anterior)
+    recalcular_pendientes(pendientes)
+
+
+# ==== Señales de Pago ====
+@receiver(post_init, sender=Pago)
+def guardar_clave_resumen_pago(sender, instance, **kwargs):
+    instance._clave_resumen = clave_resumen(instance, "fecha", local=True)
+
+
+@receiver(post_save, sender=Pago)
+def actualizar_prestamos_del_pago(sender, instance, created, **kwargs):
+    """
+    Si cambia la validación de un pago, sus préstamos cambian de total pagado.
+    Si cambia el usuario o la fecha, también el resumen anual donde estaba.
+    """
+    anterior = getattr(instance, "_clave_resumen", None)
+    instance._clave_resumen = clave_resumen(instance, "fecha", local=True)
+    if created:
+        return
+    pendientes = _pendientes()
+    if pendientes is not None:
+        pendientes["pagos"].add(instance.pk)
+        pendientes["resumenes"].add(anterior)
+    else:
+        # save() no escribe el total ni la validación: se deriva del total guardado
+        aplicar_delta_pago(instance.pk, Decimal("0"))
+        recalcular_prestamos(pago_ids={instance.pk})
+        _recalcular_resumenes(resumenes.claves_de_pagos_y_prestamos({instance.pk}) | {anterior})
+
+
+@receiver(post_delete, sender=Pago)
+def actualizar_resumen_pago_borrado(sender, instance, **kwargs):
+    """Con recalculo diferido el pago ya no existe al recalcular: su año se anota aquí"""
+    actualizar_resumenes({getattr(instance, "_clave_resumen", None)})
 
 
 # ==== Señales de PagoAplicacion ====
+@receiver(post_init, sender=PagoAplicacion)
+def guardar_estado_original(sender, instance, **kwargs):
+    """Guarda los valores cargados de BD para calcular deltas al guardar/eliminar"""
+    instance._estado_original = estado_aplicacion(instance)
+
+
 @receiver(post_save, sender=PagoAplicacion)
-def actualizar_cuota_y_pago_post_save(sender, instance, **kwargs):
-    """Cuando se guarda una aplicación, recalcular cuota y pago"""
-    if instance.cuota:
-        recalcular_cuota(instance.cuota)
-    if instance.pago:
-        recalcular_pago(instance.pago)
+def actualizar_cuota_y_pago_post_save(sender, instance, created, **kwargs):
+    """Cuando se guarda una aplicación, aplicar el delta a su cuota y su pago"""
+    anterior = ESTADO_VACIO if created else getattr(instance, "_estado_original", None)
+    actual = estado_aplicacion(instance)
+
+    pendientes = _pendientes()
+    if pendientes is not None:
+        _marcar_pendientes(pendientes, instance, anterior)
+    elif anterior is None or actual is None:
+        recalcular_aplicacion_completa(instance, anterior)
+    else:
+        aplicar_deltas(instance, anterior, actual)
+
+    instance._estado_original = estado_aplicacion(instance)
 
 
 @receiver(post_delete, sender=PagoAplicacion)
 def actualizar_cuota_y_pago_post_delete(sender, instance, **kwargs):
-    """Cuando se elimina una aplicación, recalcular cuota y pago"""
-    if instance.cuota:
-        recalcular_cuota(instance.cuota)
-    if instance.pago:
-        recalcular_pago(instance.pago)
+    """Cuando se elimina una aplicación, restar su aporte de la cuota y el pago"""
+    anterior = getattr(instance, "_estado_original", None)
 
-
-# ==== Señal de Pago ====
-@receiver(post_save, sender=Pago)
-def actualizar_cuotas_por_pago(sender, instance, **kwargs):
-    """Cuando se guarda un Pago, recalcular todas sus cuotas"""
-    aplicaciones = PagoAplicacion.objects.filter(pago=instance)
-    for app in aplicaciones:
-        if app.cuota:
-            recalcular_cuota(app.cuota)
+    pendientes = _pendientes()
+    if pendientes is not None:
+        _marcar_pendientes(pendientes, instance, anterior)
+    elif anterior is None:
+        recalcular_aplicacion_completa(instance)
+    else:
+        aplicar_deltas(instance, anterior, ESTADO_VACIO)
 
 
 @receiver(post_delete, sender=PagoAplicacion)
@@ -77,6 +426,100 @@ def borrar_aporte_asociado(sender, instance, **kwargs):
             pass
 
 
+# ==== Señales del resumen anual (Aporte, Prestamo, Usuario) ====
+@receiver(post_init, sender=Aporte)
+def guardar_clave_resumen_aporte(sender, instance, **kwargs):
+    instance._clave_resumen = clave_resumen(instance, "fecha_aporte")
+
+
+@receiver(post_save, sender=Aporte)
+@receiver(post_delete, sender=Aporte)
+def actualizar_resumen_aporte(sender, instance, **kwargs):
+    """El año del aporte y, si se movió de usuario o de fecha, el año donde estaba"""
+    actual = clave_resumen(instance, "fecha_aporte")
+    actualizar_resumenes({actual, getattr(instance, "_clave_resumen", None)})
+    instance._clave_resumen = actual
+
+
+@receiver(post_init, sender=Prestamo)
+def guardar_usuario_resumen_prestamo(sender, instance, **kwargs):
+    instance._usuario_resumen = instance.__dict__.get("usuario_id")
+
+
+@receiver(post_save, sender=Prestamo)
+@receiver(post_delete, sender=Prestamo)
+def actualizar_resumen_prestamo(sender, instance, **kwargs):
+    """
+    Un préstamo toca el año del desembolso (capital pendiente) y los años en
+    que vencen sus cuotas (intereses): se recalculan todos los años del dueño.
+    Va después de generar_cuotas_automaticas.
+    """
+    actualizar_resumenes({
+        (instance.usuario_id, None),
+        (getattr(instance, "_usuario_resumen", None), None),
+    })
+    instance._usuario_resumen = instance.usuario_id
+
+
+@receiver(pre_delete, sender=Usuario)
+def marcar_usuario_borrandose(sender, instance, **kwargs):
+    """Sus aportes, pagos y préstamos se borran en cascada: no rehacer su resumen por cada uno"""
+    _usuarios_borrandose().add(instance.pk)
+
+
+@receiver(post_delete, sender=Usuario)
+def desmarcar_usuario_borrandose(sender, instance, **kwargs):
+    _usuarios_borrandose().discard(instance.pk)
+
+
+# ==== Términos de búsqueda del usuario ====
+@receiver(post_init, sender=Usuario)
+def guardar_texto_busqueda(sender, instance, **kwargs):
+    instance._texto_busqueda = busqueda.texto_de(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Usuario)
+def actualizar_terminos_busqueda(sender, instance, **kwargs):
+    """Solo si cambió el usuario, nombre, apellido o correo (no en cada login)"""
+    texto = busqueda.texto_de(instance)
+    if texto != instance._texto_busqueda:
+        busqueda.actualizar_terminos([instance])
+        instance._texto_busqueda = texto
+
+
+# ==== Versión de los datos en caché (dashboard, entrega de fondo, cuotas pendientes) ====
+@receiver(post_save, sender=Aporte)
+@receiver(post_delete, sender=Aporte)
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+@receiver(post_save, sender=PagoAplicacion)
+@receiver(post_delete, sender=PagoAplicacion)
+@receiver(post_save, sender=Prestamo)
+@receiver(post_delete, sender=Prestamo)
+@receiver(post_save, sender=CuotaPrestamo)
+@receiver(post_delete, sender=CuotaPrestamo)
+@receiver(post_save, sender=FondoBalance)
+@receiver(post_delete, sender=FondoBalance)
+@receiver(post_delete, sender=Usuario)
+def invalidar_cache_datos(sender, **kwargs):
+    cache_versionada.invalidar()
+
+
+@receiver(post_save, sender=Usuario)
+def invalidar_cache_datos_usuario(sender, update_fields=None, **kwargs):
+    """Nombre, correo o tipo del socio salen en el dashboard; el último login no"""
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    cache_versionada.invalidar()
+
+
+# ==== Índice en memoria de tasas de interés ====
+@receiver(post_save, sender=TasaInteres)
+@receiver(post_delete, sender=TasaInteres)
+def invalidar_indice_tasas(sender, **kwargs):
+    tasas.invalidar()
+
+
 # ==== Señal de SolicitudPrestamo ====
 @receiver(post_save, sender=SolicitudPrestamo)
 def crear_prestamo_si_aprobado(sender, instance, created, **kwargs):
@@ -0,0 +1,130 @@
+"""
+Índice en memoria de TasaInteres: responde "tasa para N cuotas en la fecha D"
+sin ir a la base de datos.
+
+Por cada (tipo_usuario, tipo_credito) se guarda, para cada fecha en que
+entra a regir alguna tasa, la tabla de tramos de cuotas vigente desde ese día
+(sin solapes, ordenada). Sin tipo_credito se usan todas las tasas del tipo de
+usuario, como lo hacía la consulta original. Buscar es bisecar la fecha y luego las cuotas. Si
+dos tasas cubren las mismas cuotas gana la de vigente_desde más reciente
+(y a igual fecha, la última creada); las de vigencia futura no aplican hasta
+su fecha.
+
+El índice es de cada proceso. Al confirmar un cambio en TasaInteres, las
+señales lo borran en este proceso y suben una versión en la caché compartida
+("datos"); los demás procesos la
+revisan cada REVISAR_CADA segundos y se recargan si cambió.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_versionada import cache_datos
+from .models import TasaInteres
+
+CLAVE_VERSION = "fonar:version_tasas"
+REVISAR_CADA = 30  # segundos
+
+_indice = None  # (version, revisado_en, {(tipo_usuario, tipo_credito): (fechas, tablas)})
+_lock = threading.Lock()
+
+
+def _tramos_vigentes(tasas):
+    """
+    Tramos (cuotas_min, cuotas_max, tasa) sin solapes de unas tasas ya
+    ordenadas de la más antigua a la más reciente: la más reciente tapa a las
+    anteriores en las cuotas que comparten.
+    """
+    cortes = sorted({t.cuotas_min for t in tasas} | {t.cuotas_max + 1 for t in tasas})
+    tramos = []
+    for desde, hasta in zip(cortes, cortes[1:]):
+        vigente = next((t for t in reversed(tasas) if t.cuotas_min <= desde <= t.cuotas_max), None)
+        if vigente is None:
+            continue
+        if tramos and tramos[-1][1] == desde - 1 and tramos[-1][2] == vigente.interes_mensual:
+            tramos[-1] = (tramos[-1][0], hasta - 1, vigente.interes_mensual)
+        else:
+            tramos.append((desde, hasta - 1, vigente.interes_mensual))
+    return tramos
+
+
+def _construir():
+    por_tipo = defaultdict(list)
+    for tasa in TasaInteres.objects.order_by("vigente_desde", "id"):
+        por_tipo[(tasa.tipo_usuario, tasa.tipo_credito)].append(tasa)
+        por_tipo[(tasa.tipo_usuario, None)].append(tasa)
+
+    indice = {}
+    for clave, tasas in por_tipo.items():
+        fechas = sorted({t.vigente_desde for t in tasas})
+        tablas = [_tramos_vigentes([t for t in tasas if t.vigente_desde <= fecha]) for fecha in fechas]
+        indice[clave] = (fechas, tablas)
+    return indice
+
+
+def _version():
+    return cache_datos().get(CLAVE_VERSION)
+
+
+def _obtener_indice():
+    global _indice
+    actual = _indice
+    ahora = time.monotonic()
+    if actual is not None and ahora - actual[1] < REVISAR_CADA:
+        return actual[2]
+    with _lock:
+        actual = _indice
+        version = _version()
+        if actual is None or actual[0] != version:
+            actual = (version, ahora, _construir())
+        else:
+            actual = (version, ahora, actual[2])
+        _indice = actual
+    return actual[2]
+
+
+def olvidar():
+    """Descarta el índice de este proceso: la próxima consulta lo recarga"""
+    global _indice
+    _indice = None
+
+
+def _publicar_cambio():
+    cache_datos().set(CLAVE_VERSION, uuid.uuid4().hex, None)
+    olvidar()
+
+
+def invalidar():
+    """
+    Para las señales de TasaInteres: al confirmar olvida el índice de este
+    proceso y avisa a los demás. Antes no: un índice armado con datos sin
+    confirmar quedaría con la versión vieja si la transacción se deshace.
+    """
+    transaction.on_commit(_publicar_cambio)
+
+
+def tabla(tipo_usuario, fecha=None, tipo_credito=None):
+    """Tramos [(cuotas_min, cuotas_max, tasa)] vigentes en la fecha (hoy por defecto)"""
+    fechas, tablas = _obtener_indice().get((tipo_usuario, tipo_credito), ((), ()))
+    posicion = bisect_right(fechas, fecha or timezone.localdate())
+    return tablas[posicion - 1] if posicion else []
+
+
+def tasa_en_tramos(tramos, cuotas):
+    """Tasa del tramo de tabla() que contiene ese número de cuotas, o None"""
+    posicion = bisect_right(tramos, (cuotas, float("inf")))
+    if posicion:
+        cuotas_min, cuotas_max, tasa = tramos[posicion - 1]
+        if cuotas_min <= cuotas <= cuotas_max:
+            return tasa
+    return None
+
+
+def tasa_para(tipo_usuario, cuotas, fecha=None, tipo_credito=None):
+    """Tasa mensual (%) para ese número de cuotas en la fecha, o None si no hay tramo"""
+    return tasa_en_tramos(tabla(tipo_usuario, fecha, tipo_credito), cuotas)
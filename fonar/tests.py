@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import Q
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from dashboard import urls as dashboard_urls
+from dashboard.views.paginacion import paginar_por_cursor
+from dashboard.views.pago_views import PagoListView
+from fonar import urls as fonar_urls
+
+from . import altas, cache_versionada, claves, extractos, middleware as perfilado, reparto, resumenes, tasas
+from .datos_prueba import borrar_fondo, generar_fondo
+from .busqueda import filtro_usuario
+from .fechas import en_anio, en_anio_local
+from .models import (
+    Aporte, CuotaPrestamo, FondoBalance, Pago, PagoAplicacion, Prestamo, ResumenAnualSocio,
+    SolicitudPrestamo, TasaInteres, Usuario,
+)
+from .resumenes import CAMPOS, calcular_resumenes
+from .signals import recalcular_cuotas, recalcular_pagos, recalcular_prestamos, recalculo_diferido
+
+
+# Cachés en memoria para los tests que miden lo que sale de la caché
+CACHES_LOCALES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "datos": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "datos"},
+}
+
+
+# Recorridos completos de una tabla en el EXPLAIN de SQLite ("SCAN tabla") y de
+# PostgreSQL ("Seq Scan on tabla"). "SEARCH ... USING INDEX" es lo esperado.
+RECORRIDO_COMPLETO = re.compile(r"^(?:.*\bSCAN (fonar_\w+)|.*Seq Scan on (fonar_\w+))", re.MULTILINE)
+
+
+class PlanesDeConsultaTests(TestCase):
+    """
+    Las consultas de las pantallas principales deben resolverse con índices.
+    Si alguien borra un índice o vuelve a filtrar con __year, el plan pasa a
+    recorrer la tabla completa y este test falla.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        cls.prestamo = Prestamo.objects.create(
+            usuario=cls.usuario, monto=Decimal("1000000"), interes=Decimal("2"),
+            cuotas=6, fecha_desembolso=date(2025, 1, 15),
+        )
+        Aporte.objects.create(usuario=cls.usuario, fecha_aporte=date(2025, 2, 1), monto=Decimal("50000"))
+        pago = Pago.objects.create(usuario=cls.usuario, monto_reportado=Decimal("10000"))
+        PagoAplicacion.objects.create(pago=pago, tipo="aporte_viaje", monto_aplicado=Decimal("10000"))
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            # con tablas casi vacías el planificador prefiere recorrerlas;
+            # se desactiva para ver si existe un índice utilizable
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsaIndices(self, qs):
+        plan = qs.explain()
+        tablas = [a or b for a, b in RECORRIDO_COMPLETO.findall(plan)]
+        self.assertEqual(tablas, [], f"Recorrido completo de {tablas}:\n{plan}")
+
+    def test_aportes_de_un_socio_en_el_anio(self):
+        self.assertUsaIndices(Aporte.objects.filter(en_anio("fecha_aporte", 2025), usuario=self.usuario))
+
+    def test_aportes_del_anio(self):
+        self.assertUsaIndices(Aporte.objects.filter(en_anio("fecha_aporte", 2025)))
+
+    def test_pagos_de_un_socio_en_el_anio(self):
+        self.assertUsaIndices(Pago.objects.filter(en_anio_local("fecha", 2025), usuario=self.usuario))
+
+    def test_cuotas_pendientes_de_un_prestamo(self):
+        self.assertUsaIndices(
+            CuotaPrestamo.objects.filter(prestamo=self.prestamo, pagada=False).order_by("numero")
+        )
+
+    def test_cuotas_pendientes_de_un_socio(self):
+        self.assertUsaIndices(
+            CuotaPrestamo.objects.filter(prestamo__usuario=self.usuario, pagada=False).order_by("prestamo_id", "numero")
+        )
+
+    def test_aplicaciones_validadas_de_un_prestamo(self):
+        self.assertUsaIndices(PagoAplicacion.objects.filter(prestamo=self.prestamo, pago__validado=True))
+
+    def test_otros_aportes_validados_del_anio(self):
+        self.assertUsaIndices(
+            PagoAplicacion.objects.filter(
+                en_anio_local("pago__fecha", 2025), tipo="aporte_viaje", pago__validado=True
+            )
+        )
+
+    def test_intereses_del_anio(self):
+        self.assertUsaIndices(
+            PagoAplicacion.objects.filter(
+                en_anio("cuota__fecha_vencimiento", 2025), tipo="prestamo", pago__validado=True
+            )
+        )
+
+    def test_pagina_de_aportes_por_cursor(self):
+        self.assertUsaIndices(
+            Aporte.objects.filter(
+                Q(fecha_aporte__lte=date(2025, 3, 1))
+                & (Q(fecha_aporte__lt=date(2025, 3, 1)) | Q(fecha_aporte=date(2025, 3, 1), id__lt=10))
+            ).order_by("-fecha_aporte", "-id")[:51]
+        )
+
+    def test_busqueda_de_usuarios(self):
+        self.assertUsaIndices(Pago.objects.filter(filtro_usuario("soc x")))
+
+    def test_prestamos_desembolsados_en_el_anio(self):
+        self.assertUsaIndices(Prestamo.objects.filter(en_anio("fecha_desembolso", 2025)))
+
+
+# ================================================================
+# Totales desnormalizados (cuotas, pagos y préstamos)
+# ================================================================
+class TotalesDesnormalizadosTests(TestCase):
+    """Lo que dejan las señales en cuotas, pagos y préstamos debe ser igual a recalcularlo desde cero"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        cls.prestamo = Prestamo.objects.create(
+            usuario=cls.socio, monto=Decimal("600000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 1, 10),
+        )
+        cls.cuotas = list(cls.prestamo.cuotaprestamo_set.order_by("numero"))
+
+    def foto_totales(self):
+        return (
+            list(CuotaPrestamo.objects.order_by("pk").values_list("pk", "capital_pagado", "interes_pagado", "pagada", "saldo")),
+            list(Pago.objects.order_by("pk").values_list("pk", "monto_aplicado_total", "validado")),
+            list(Prestamo.objects.order_by("pk").values_list("pk", "capital_pagado_total", "interes_pagado_total")),
+        )
+
+    def assertTotalesAlDia(self):
+        guardado = self.foto_totales()
+        recalcular_cuotas(CuotaPrestamo.objects.values_list("pk", flat=True))
+        recalcular_pagos(Pago.objects.values_list("pk", flat=True))
+        recalcular_prestamos(Prestamo.objects.values_list("pk", flat=True))
+        self.assertEqual(guardado, self.foto_totales())
+
+    def test_saldo_corrido_de_las_cuotas(self):
+        primera, segunda, tercera = self.cuotas
+        self.assertEqual({c.saldo for c in self.cuotas}, {self.prestamo.monto})
+
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=Decimal("400000"))
+        aplicacion = PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=segunda, capital=Decimal("150000"))
+        saldos = list(self.prestamo.cuotaprestamo_set.order_by("numero").values_list("saldo", flat=True))
+        self.assertEqual(saldos, [Decimal("600000"), Decimal("450000"), Decimal("450000")])
+        self.assertEqual(aplicacion.cuota.saldo, Decimal("450000"))  # también en memoria
+
+        PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=primera)
+        aplicacion.cuota = tercera
+        aplicacion.save()
+        saldos = list(self.prestamo.cuotaprestamo_set.order_by("numero").values_list("saldo", flat=True))
+        self.assertEqual(saldos, [
+            self.prestamo.monto - primera.capital,
+            self.prestamo.monto - primera.capital,
+            self.prestamo.monto - primera.capital - Decimal("150000"),
+        ])
+        self.assertTotalesAlDia()
+
+    def test_deltas_al_crear_editar_mover_y_borrar(self):
+        primera, segunda, _ = self.cuotas
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=primera.monto_cuota)
+        otro = Pago.objects.create(usuario=self.socio, monto_reportado=Decimal("1000"))
+
+        # crear: la cuota queda pagada y el pago validado
+        aplicacion = PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=primera)
+        self.assertTrue(CuotaPrestamo.objects.get(pk=primera.pk).pagada)
+        self.assertTrue(Pago.objects.get(pk=pago.pk).validado)
+        self.assertTotalesAlDia()
+
+        # editar: menos capital, la cuota deja de estar pagada y el pago de cuadrar
+        aplicacion.capital -= 1000
+        aplicacion.monto_aplicado -= 1000
+        aplicacion.save()
+        self.assertFalse(CuotaPrestamo.objects.get(pk=primera.pk).pagada)
+        self.assertFalse(Pago.objects.get(pk=pago.pk).validado)
+        self.assertTotalesAlDia()
+
+        # mover de cuota y de pago a la vez: resta de los anteriores, suma a los nuevos
+        aplicacion.cuota = segunda
+        aplicacion.pago = otro
+        aplicacion.save()
+        self.assertEqual(CuotaPrestamo.objects.get(pk=primera.pk).capital_pagado, 0)
+        self.assertEqual(Pago.objects.get(pk=pago.pk).monto_aplicado_total, 0)
+        self.assertTotalesAlDia()
+
+        # cargada con only(): no se conoce el estado anterior y se recalcula completo
+        parcial = PagoAplicacion.objects.only("pk", "pago", "cuota").get(pk=aplicacion.pk)
+        parcial.interes = Decimal("0")
+        parcial.save()
+        self.assertTotalesAlDia()
+
+        aplicacion.refresh_from_db()
+        aplicacion.delete()
+        self.assertEqual(CuotaPrestamo.objects.get(pk=segunda.pk).saldo, self.prestamo.monto)
+        self.assertEqual(Pago.objects.get(pk=otro.pk).monto_aplicado_total, 0)
+        self.assertTotalesAlDia()
+
+    def test_recalculo_diferido_una_vez_al_salir_y_dentro_de_la_transaccion(self):
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=Decimal("1000000"))
+        with patch("fonar.signals.recalcular_cuotas", wraps=recalcular_cuotas) as recalcular:
+            with recalculo_diferido() as pendientes:
+                for cuota in self.cuotas:
+                    PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=cuota)
+                with recalculo_diferido() as anidados:
+                    self.assertIs(anidados, pendientes)
+                    PagoAplicacion.objects.filter(cuota=self.cuotas[0]).get().delete()
+                # nada se tocó todavía
+                self.assertEqual(Pago.objects.get(pk=pago.pk).monto_aplicado_total, 0)
+                recalcular.assert_not_called()
+        # una sola vez, con las tres cuotas
+        recalcular.assert_called_once()
+        self.assertEqual(set(recalcular.call_args.args[0]) - {None}, {c.pk for c in self.cuotas})
+        self.assertTotalesAlDia()
+
+        # un error en el recálculo deshace también lo del bloque
+        with patch("fonar.signals.recalcular_pagos", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                with recalculo_diferido():
+                    PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=self.cuotas[0])
+        self.assertEqual(PagoAplicacion.objects.filter(cuota=self.cuotas[0]).count(), 0)
+        self.assertTotalesAlDia()
+
+    def test_guardar_un_pago_viejo_no_pisa_su_total(self):
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=self.cuotas[0].monto_cuota)
+        en_memoria = Pago.objects.get(pk=pago.pk)
+        cuota = CuotaPrestamo.objects.get(pk=self.cuotas[0].pk)
+        PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=self.cuotas[0])
+
+        en_memoria.comentarios = "revisado"
+        en_memoria.save()
+        pago.refresh_from_db()
+        self.assertEqual(pago.monto_aplicado_total, self.cuotas[0].monto_cuota)
+        self.assertEqual(pago.comentarios, "revisado")
+        self.assertTrue(pago.validado)
+        self.assertTotalesAlDia()
+
+        # tampoco una cuota o un préstamo cargados antes de aplicar el pago
+        cuota.fecha_pago = date(2025, 3, 1)
+        cuota.save()
+        self.prestamo.save()
+        self.assertTotalesAlDia()
+
+        # la validación sale del total guardado también si cambia el monto reportado
+        pago.monto_reportado += 1000
+        pago.save()
+        pago.refresh_from_db()
+        self.assertFalse(pago.validado)
+        self.assertTotalesAlDia()
+
+    def test_validado_no_se_edita_en_el_dashboard_ni_en_el_admin(self):
+        staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=self.cuotas[0].monto_cuota)
+        self.client.force_login(staff)
+
+        respuesta = self.client.get(reverse("dashboard:pagos-update", args=[pago.pk]))
+        self.assertNotIn("validado", respuesta.context["form"].fields)
+        self.assertNotContains(respuesta, 'name="validado"')
+
+        respuesta = self.client.get(reverse("admin:fonar_pago_change", args=[pago.pk]))
+        self.assertNotIn("validado", respuesta.context["adminform"].form.fields)
+        respuesta = self.client.get(reverse("admin:fonar_pago_add"))
+        self.assertNotIn("validado", respuesta.context["adminform"].form.fields)
+
+    def descuadrar(self):
+        """Dos pagos aplicados (febrero y junio) y luego todos los totales en cero"""
+        primera, segunda, _ = self.cuotas
+        for mes, cuota in ((2, primera), (6, segunda)):
+            pago = Pago.objects.create(
+                usuario=self.socio, monto_reportado=cuota.monto_cuota,
+                fecha=timezone.make_aware(datetime(2025, mes, 1)),
+            )
+            PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=cuota)
+        CuotaPrestamo.objects.update(capital_pagado=0, interes_pagado=0, pagada=False, saldo=0)
+        Pago.objects.update(monto_aplicado_total=0, validado=False)
+        Prestamo.objects.update(capital_pagado_total=0, interes_pagado_total=0)
+        return self.foto_totales()
+
+    def test_recalcular_todo_dry_run_no_escribe(self):
+        descuadrado = self.descuadrar()
+        salida = io.StringIO()
+        call_command("recalcular_todo", dry_run=True, stdout=salida)
+        self.assertEqual(self.foto_totales(), descuadrado)
+        # los préstamos se comparan con la validación guardada de los pagos, aún sin corregir
+        self.assertIn("3 cuotas, 2 pagos y 0 préstamos cambiarían", salida.getvalue())
+        self.assertIn(f"Cuota #{self.cuotas[0].pk} (préstamo #{self.prestamo.pk})", salida.getvalue())
+
+        call_command("recalcular_todo", stdout=io.StringIO())
+        self.assertTotalesAlDia()
+
+    def test_recalcular_todo_por_lotes_reanuda_el_checkpoint(self):
+        self.descuadrar()
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, "avance.json")
+            filtros = {"since": None, "prestamo": None, "usuario": None}
+            with open(ruta, "w") as f:
+                json.dump({"filtros": filtros, "cuotas": self.cuotas[0].pk, "pagos": 0, "prestamos": 0}, f)
+
+            # otros filtros que los del checkpoint: no se reanuda
+            with self.assertRaises(CommandError):
+                call_command("recalcular_todo", chunked=True, checkpoint=ruta, usuario=self.socio.pk, stdout=io.StringIO())
+
+            salida = io.StringIO()
+            call_command("recalcular_todo", chunked=True, chunk_size=1, checkpoint=ruta, stdout=salida)
+            self.assertIn("Reanudando", salida.getvalue())
+            self.assertIn("cuotas: 3/3 (100%)", salida.getvalue())
+            self.assertFalse(os.path.exists(ruta))
+
+        # la primera cuota ya figuraba hecha en el checkpoint
+        self.assertEqual(CuotaPrestamo.objects.get(pk=self.cuotas[0].pk).capital_pagado, 0)
+        self.assertEqual(CuotaPrestamo.objects.get(pk=self.cuotas[1].pk).capital_pagado, self.cuotas[1].capital)
+        self.assertEqual(Pago.objects.filter(validado=True).count(), 2)
+
+        call_command("recalcular_todo", chunked=True, stdout=io.StringIO())
+        self.assertTotalesAlDia()
+
+    def test_recalcular_todo_desde_una_fecha(self):
+        self.descuadrar()
+        call_command("recalcular_todo", since=date(2025, 5, 1), stdout=io.StringIO())
+        febrero, junio = Pago.objects.order_by("fecha")
+        self.assertEqual(febrero.monto_aplicado_total, 0)  # fuera del alcance
+        self.assertEqual(junio.monto_aplicado_total, self.cuotas[1].monto_cuota)
+        self.assertEqual(CuotaPrestamo.objects.get(pk=self.cuotas[0].pk).capital_pagado, 0)
+        self.assertEqual(CuotaPrestamo.objects.get(pk=self.cuotas[1].pk).capital_pagado, self.cuotas[1].capital)
+
+    def test_generar_cuotas_de_los_prestamos_sin_plan(self):
+        otro = Prestamo.objects.create(
+            usuario=self.socio, monto=Decimal("1200000"), interes=Decimal("1.5"),
+            cuotas=12, fecha_desembolso=date(2025, 4, 20),
+        )
+        columnas = ("prestamo_id", "numero", "fecha_vencimiento", "monto_cuota", "capital", "interes", "saldo", "pagada")
+        plan = list(CuotaPrestamo.objects.order_by("prestamo_id", "numero").values_list(*columnas))
+        CuotaPrestamo.objects.all().delete()
+
+        salida = io.StringIO()
+        call_command("generar_cuotas", workers=2, batch_size=1, stdout=salida)
+        self.assertIn("2/2 préstamos", salida.getvalue())
+        # el mismo plan que al crear el préstamo, con el saldo completo
+        self.assertEqual(list(CuotaPrestamo.objects.order_by("prestamo_id", "numero").values_list(*columnas)), plan)
+        self.assertEqual(set(otro.cuotaprestamo_set.values_list("saldo", flat=True)), {otro.monto})
+
+        salida = io.StringIO()
+        call_command("generar_cuotas", stdout=salida)
+        self.assertIn("Todos los préstamos ya tienen cuotas", salida.getvalue())
+        self.assertEqual(CuotaPrestamo.objects.count(), len(plan))
+
+    def test_verificar_saldos(self):
+        pago = Pago.objects.create(usuario=self.socio, monto_reportado=self.cuotas[0].monto_cuota)
+        PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=self.cuotas[0])
+        salida = io.StringIO()
+        call_command("verificar_saldos", stdout=salida)
+        self.assertIn("Todos los saldos coinciden", salida.getvalue())
+
+        # un saldo corrido descuadrado en la última cuota
+        CuotaPrestamo.objects.filter(pk=self.cuotas[2].pk).update(saldo=self.prestamo.monto)
+        salida = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "1 filas desincronizadas"):
+            call_command("verificar_saldos", stdout=salida)
+        self.assertIn("Cuotas con diferencias: 1", salida.getvalue())
+        self.assertIn(f"Cuota #{self.cuotas[2].pk} ", salida.getvalue())
+
+# ================================================================
+# Resumen anual por socio
+# ================================================================
+class ResumenAnualSocioTests(TestCase):
+    """Lo que dejan las señales en ResumenAnualSocio debe ser igual a recalcularlo desde cero"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        cls.tercero = Usuario.objects.create_user(username="tercero", password="x", tipo_usuario="tercero")
+
+    def assertResumenAlDia(self):
+        guardado = {
+            (r["usuario_id"], r["año"]): r
+            for r in ResumenAnualSocio.objects.values("usuario_id", "año", *CAMPOS)
+        }
+        esperado = {
+            (r.usuario_id, r.año): {"usuario_id": r.usuario_id, "año": r.año, **{c: getattr(r, c) for c in CAMPOS}}
+            for r in calcular_resumenes()
+        }
+        self.assertEqual(guardado, esperado)
+
+    def operar(self):
+        aporte = Aporte.objects.create(usuario=self.socio, fecha_aporte=date(2025, 3, 1), monto=Decimal("50000"))
+        prestamo = Prestamo.objects.create(
+            usuario=self.tercero, monto=Decimal("600000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 11, 1),
+        )
+        cuota = prestamo.cuotaprestamo_set.order_by("numero").last()  # vence al año siguiente
+        pago = Pago.objects.create(
+            usuario=self.tercero, monto_reportado=cuota.monto_cuota,
+            fecha=timezone.make_aware(datetime(2026, 1, 5)),
+        )
+        PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=cuota)
+        otro = Pago.objects.create(usuario=self.socio, monto_reportado=Decimal("20000"))
+        PagoAplicacion.objects.create(pago=otro, tipo="admin_app", monto_aplicado=Decimal("20000"))
+
+        # mover el aporte de año, cambiar el préstamo y borrar un pago
+        aporte.fecha_aporte = date(2024, 12, 1)
+        aporte.save()
+        prestamo.monto = Decimal("900000")
+        prestamo.save()
+        otro.delete()
+
+    def test_se_mantiene_con_las_senales(self):
+        self.operar()
+        self.assertTrue(ResumenAnualSocio.objects.exists())
+        self.assertResumenAlDia()
+
+    def test_se_mantiene_con_recalculo_diferido(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with recalculo_diferido():
+                self.operar()
+        self.assertResumenAlDia()
+
+    def test_se_mantiene_con_el_reparto_automatico(self):
+        Aporte.objects.create(usuario=self.socio, fecha_aporte=date(2025, 11, 1), monto=Decimal("50000"))
+        Prestamo.objects.create(
+            usuario=self.socio, monto=Decimal("600000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 11, 20),
+        )
+        pago = Pago.objects.create(
+            usuario=self.socio, monto_reportado=Decimal("300000"), fecha=timezone.make_aware(datetime(2026, 1, 5)),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            reparto.aplicar(pago)
+        self.assertResumenAlDia()
+
+    def test_una_aplicacion_solo_recalcula_sus_anios(self):
+        prestamo = Prestamo.objects.create(
+            usuario=self.tercero, monto=Decimal("600000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 11, 1),
+        )
+        primera, _, ultima = prestamo.cuotaprestamo_set.order_by("numero")
+        pago = Pago.objects.create(
+            usuario=self.socio, monto_reportado=Decimal("500000"), fecha=timezone.make_aware(datetime(2024, 6, 1)),
+        )
+        with patch.object(resumenes, "recalcular_resumenes", wraps=resumenes.recalcular_resumenes) as recalcular:
+            aplicacion = PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=primera)
+            self.assertEqual(recalcular.call_args.args[0], {
+                (self.socio.pk, 2024), (self.tercero.pk, 2025),
+            })
+            # se mueve a una cuota que vence al año siguiente: también recalcula el año que deja
+            aplicacion.cuota = ultima
+            aplicacion.save()
+            self.assertEqual(recalcular.call_args.args[0], {
+                (self.socio.pk, 2024), (self.tercero.pk, 2025), (self.tercero.pk, 2026),
+            })
+            aplicacion.delete()
+            self.assertEqual(recalcular.call_args.args[0], {
+                (self.socio.pk, 2024), (self.tercero.pk, 2025), (self.tercero.pk, 2026),
+            })
+        self.assertResumenAlDia()
+
+    def test_recalcular_todo_repara_el_resumen(self):
+        self.operar()
+        ResumenAnualSocio.objects.update(aportes=0, intereses_pagados=0, capital_pendiente=0)
+
+        # con filtro, solo los años del alcance
+        call_command("recalcular_todo", usuario=self.tercero.pk, stdout=io.StringIO())
+        self.assertTrue(ResumenAnualSocio.objects.filter(usuario=self.tercero, capital_pendiente__gt=0).exists())
+        self.assertFalse(ResumenAnualSocio.objects.filter(usuario=self.socio, aportes__gt=0).exists())
+
+        call_command("recalcular_todo", stdout=io.StringIO())
+        self.assertResumenAlDia()
+
+    def test_borrar_usuario(self):
+        self.operar()
+        self.tercero.delete()
+        self.assertFalse(ResumenAnualSocio.objects.filter(usuario_id=self.tercero.pk).exists())
+        self.assertResumenAlDia()
+
+
+# ================================================================
+# Caché versionada
+# ================================================================
+@override_settings(CACHES=CACHES_LOCALES)
+class CacheVersionadaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.socio = Usuario.objects.create_user(
+            username="socio", password="x", tipo_usuario="asociado", first_name="Ana",
+        )
+
+    def setUp(self):
+        cache_versionada.cache_datos().clear()
+        self.client.force_login(self.staff)
+
+    def total_aportes_home(self):
+        return self.client.get(reverse("dashboard:home")).context["totales"]["total_aportes"]
+
+    def test_la_escritura_invalida_al_confirmar(self):
+        self.assertEqual(self.total_aportes_home(), 0)
+        with self.assertNumQueries(3):  # sesión, usuario y balance del año: el resto sale de la caché
+            self.client.get(reverse("dashboard:home"))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Aporte.objects.create(usuario=self.socio, fecha_aporte=timezone.localdate(), monto=Decimal("50000"))
+            # antes del commit se sigue viendo lo cacheado
+            self.assertEqual(self.total_aportes_home(), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.total_aportes_home(), Decimal("50000"))
+
+    def test_una_sola_subida_por_transaccion(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for dia in range(1, 4):
+                Aporte.objects.create(usuario=self.socio, fecha_aporte=date(2025, 1, dia), monto=Decimal("1000"))
+            FondoBalance.objects.create(año=2025)
+        subidas = [c for c in callbacks if getattr(c, "func", None) is cache_versionada.subir_version]
+        self.assertEqual(len(subidas), 1)
+
+    def test_ver_el_dashboard_no_invalida(self):
+        version = cache_versionada.version_datos()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("dashboard:home"), {"year": 2031})
+        self.assertEqual(cache_versionada.version_datos(), version)
+        self.assertFalse(FondoBalance.objects.filter(año=2031).exists())
+
+    def test_el_ultimo_login_no_invalida(self):
+        version = cache_versionada.version_datos()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.socio)
+        self.assertEqual(cache_versionada.version_datos(), version)
+
+
+# ================================================================
+# Listado de préstamos del dashboard
+# ================================================================
+class PrestamoListViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.ana = Usuario.objects.create_user(username="ana", password="x", tipo_usuario="asociado")
+        cls.beto = Usuario.objects.create_user(username="beto", password="x", tipo_usuario="asociado")
+        cls.saldado = cls.prestar(cls.ana, "300000")
+        cls.prestar(cls.ana, "200000")
+        cls.prestar(cls.beto, "900000")
+        Prestamo.objects.filter(pk=cls.saldado.pk).update(capital_pagado_total=Decimal("300000"))
+
+    @staticmethod
+    def prestar(usuario, monto):
+        return Prestamo.objects.create(
+            usuario=usuario, monto=Decimal(monto), interes=Decimal("2"),
+            cuotas=2, fecha_desembolso=date(2025, 1, 10),
+        )
+
+    def grupos(self, **params):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse("dashboard:prestamos-list"), params)
+        return [
+            (g["usuario"].username, g["saldo_total"], g["pendientes_count"], len(g["prestamos"]))
+            for g in respuesta.context["users_page"].object_list
+        ]
+
+    def test_oculta_saldados_salvo_en_historico(self):
+        self.assertEqual(self.grupos(), [
+            ("ana", Decimal("200000"), 1, 1),
+            ("beto", Decimal("900000"), 1, 1),
+        ])
+        self.assertEqual(self.grupos(historico="1")[0], ("ana", Decimal("200000"), 1, 2))
+
+    def test_orden_por_saldo(self):
+        self.assertEqual([g[0] for g in self.grupos(orden="saldo")], ["beto", "ana"])
+
+
+# ================================================================
+# Paginación por cursor
+# ================================================================
+class PaginacionPorCursorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        # varios aportes el mismo día: el id desempata
+        for dia in (1, 1, 1, 2, 2, 3, 4, 4, 4, 5, 6):
+            Aporte.objects.create(usuario=cls.socio, fecha_aporte=date(2025, 1, dia), monto=Decimal("1000"))
+
+    def test_recorre_todo_sin_repetir_en_ambos_sentidos(self):
+        qs = Aporte.objects.all()
+        orden = ("-fecha_aporte", "-id")
+        esperado = list(qs.order_by(*orden))
+
+        paginas, token = [], None
+        while True:
+            pagina = paginar_por_cursor(qs, orden, token, 3)
+            paginas.append(pagina.object_list)
+            if not pagina.has_next():
+                break
+            token = pagina.siguiente
+        self.assertEqual([a for p in paginas for a in p], esperado)
+
+        atras = []
+        while pagina.has_previous():
+            pagina = paginar_por_cursor(qs, orden, pagina.anterior, 3)
+            atras.append(pagina.object_list)
+        self.assertEqual(atras, paginas[-2::-1])
+
+    def test_token_invalido_es_la_primera_pagina(self):
+        pagina = paginar_por_cursor(Aporte.objects.all(), ("-fecha_aporte", "-id"), "no-es-un-cursor", 3)
+        self.assertFalse(pagina.has_previous())
+        self.assertEqual(len(pagina), 3)
+
+    def test_cursor_alterado_es_la_primera_pagina(self):
+        self.client.force_login(self.staff)
+        url = reverse("dashboard:aporte_list")
+        primera = self.client.get(url).context["aportes"]
+        for valores in (["notadate", "x"], ["2025-01-04", "x"], ["2025-01-04", None], ["2025-13-40", 1]):
+            token = base64.urlsafe_b64encode(json.dumps(["s", valores]).encode()).decode()
+            respuesta = self.client.get(url, {"cursor": token})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(respuesta.context["aportes"], primera)
+            self.assertFalse(respuesta.context["pagina"].has_previous())
+
+    def test_vista_con_el_mixin_conserva_filtros(self):
+        for dia in range(1, 5):
+            Pago.objects.create(
+                usuario=self.socio, monto_reportado=Decimal("1000"),
+                fecha=timezone.make_aware(datetime(2025, 2, dia)),
+            )
+        self.client.force_login(self.staff)
+        url = reverse("dashboard:pagos-list")
+        respuesta = self.client.get(url, {"validado": "False", "ordenar": "fecha"})
+        self.assertEqual(respuesta.context["total_aprox"], 4)
+        self.assertIsNone(respuesta.context["paginator"])
+
+        with patch.object(PagoListView, "paginate_by", 3):
+            primera = self.client.get(url, {"validado": "False", "ordenar": "fecha"})
+            siguiente = primera.context["page_obj"].siguiente
+            self.assertContains(primera, f"?validado=False&amp;ordenar=fecha&amp;cursor={siguiente}")
+            segunda = self.client.get(url, {"validado": "False", "ordenar": "fecha", "cursor": siguiente})
+        self.assertEqual([p.fecha.day for p in segunda.context["pagos"]], [4])
+
+    def test_listado_de_aportes_conserva_filtros_y_totales(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse("dashboard:aporte_list"), {"fecha_inicio": "2025-01-02"})
+        self.assertEqual(respuesta.context["cantidad"], 8)
+        self.assertEqual(respuesta.context["total"], Decimal("8000"))
+        self.assertEqual(respuesta.context["subtotales"][0]["cantidad"], 8)
+
+        # el filtro de usuario es el del autocompletado (texto, no id)
+        respuesta = self.client.get(reverse("dashboard:aporte_list"), {"usuario": "soc"})
+        self.assertEqual(respuesta.context["cantidad"], 11)
+        self.assertContains(respuesta, 'name="usuario" data-autocompletar-usuario')
+
+    def test_listado_de_aportes_sin_filtros_suma_los_resumenes(self):
+        self.client.force_login(self.staff)
+        with patch("dashboard.views.aporte_views.Count") as agrupar, CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse("dashboard:aporte_list"))
+        agrupar.assert_not_called()
+        self.assertFalse([q["sql"] for q in consultas if "COUNT(" in q["sql"] and '"fonar_aporte"' in q["sql"]])
+        self.assertEqual(respuesta.context["cantidad"], 11)
+        self.assertEqual(respuesta.context["total"], Decimal("11000"))
+        self.assertEqual(
+            [(s["usuario__username"], s["total"], s["cantidad"]) for s in respuesta.context["subtotales"]],
+            [("socio", Decimal("11000"), 11)],
+        )
+
+
+# ================================================================
+# Búsqueda de usuarios
+# ================================================================
+class BusquedaUsuariosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.jose = Usuario.objects.create_user(
+            username="jperez", password="x", first_name="José", last_name="Pérez Núñez", email="jose@correo.co",
+        )
+        cls.maria = Usuario.objects.create_user(
+            username="mgomez", password="x", first_name="María José", last_name="Gómez", email="maria@correo.co",
+        )
+
+    def buscar(self, texto):
+        return set(Usuario.objects.filter(filtro_usuario(texto, "pk")).values_list("username", flat=True))
+
+    def test_prefijo_de_cualquier_palabra_sin_tildes(self):
+        self.assertEqual(self.buscar("nun"), {"jperez"})
+        self.assertEqual(self.buscar("JOSÉ"), {"jperez", "mgomez"})
+        self.assertEqual(self.buscar("jose gom"), {"mgomez"})
+        self.assertEqual(self.buscar("correo.co"), {"jperez", "mgomez"})
+        self.assertEqual(self.buscar("  "), {"staff", "jperez", "mgomez"})
+
+    def test_se_actualiza_al_editar_y_no_en_el_login(self):
+        self.jose.last_name = "Ramírez"
+        self.jose.save()
+        self.assertEqual(self.buscar("jper"), {"jperez"})
+        self.assertEqual(self.buscar("ramirez"), {"jperez"})
+        self.assertEqual(self.buscar("nunez"), set())
+        with self.assertNumQueries(1):
+            self.jose.save(update_fields=["last_login"])
+
+    def test_autocompletar_con_errores_de_digitacion(self):
+        self.client.force_login(self.staff)
+        url = reverse("dashboard:usuarios-autocompletar")
+        resultados = self.client.get(url, {"q": "gomes"}).json()["resultados"]
+        self.assertEqual([r["username"] for r in resultados], ["mgomez"])
+        self.assertEqual(resultados[0]["nombre"], "María José Gómez")
+        self.assertEqual(self.client.get(url, {"q": "mar"}).json()["resultados"][0]["id"], self.maria.pk)
+
+
+# ================================================================
+# Cuotas pendientes por usuario (JSON con ETag)
+# ================================================================
+@override_settings(CACHES=CACHES_LOCALES)
+class CuotasPendientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        cls.otro = Usuario.objects.create_user(username="otro", password="x", tipo_usuario="asociado")
+        cls.prestamo = Prestamo.objects.create(
+            usuario=cls.socio, monto=Decimal("300000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 1, 10),
+        )
+        cls.ajeno = Prestamo.objects.create(
+            usuario=cls.otro, monto=Decimal("100000"), interes=Decimal("2"),
+            cuotas=2, fecha_desembolso=date(2025, 1, 10),
+        )
+
+    def setUp(self):
+        cache_versionada.cache_datos().clear()
+        self.client.force_login(self.socio)
+        self.url = reverse("cuotas_pendientes_usuario", args=[self.socio.pk])
+
+    def test_todas_las_cuotas_y_304_sin_consultar_cuotas(self):
+        respuesta = self.client.get(self.url)
+        cuotas = respuesta.json()["prestamos"][0]["cuotas"]
+        primera = CuotaPrestamo.objects.get(prestamo=self.prestamo, numero=1)
+        self.assertEqual([c["numero"] for c in cuotas], [1, 2, 3])
+        self.assertEqual(cuotas[0]["capital_pendiente"], float(primera.capital))
+        self.assertEqual(cuotas[0]["interes_pendiente"], float(primera.interes))
+        self.assertNotIn("Last-Modified", respuesta)
+
+        # solo la sesión y el usuario del login; de la caché solo la versión
+        with self.assertNumQueries(2), patch("fonar.views.en_cache") as en_cache:
+            repetida = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta["ETag"])
+        self.assertEqual(repetida.status_code, 304)
+        en_cache.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pago = Pago.objects.create(usuario=self.socio, monto_reportado=primera.monto_cuota, validado=True)
+            PagoAplicacion.objects.create(pago=pago, tipo="prestamo", cuota=primera)
+        cambiada = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta["ETag"])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertEqual([c["numero"] for c in cambiada.json()["prestamos"][0]["cuotas"]], [2, 3])
+
+    def test_generar_cuotas_cambia_el_etag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CuotaPrestamo.objects.filter(prestamo=self.prestamo).delete()
+        sin_plan = self.client.get(self.url)
+        self.assertEqual(sin_plan.json()["prestamos"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("generar_cuotas", stdout=io.StringIO())
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=sin_plan["ETag"])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta["ETag"], sin_plan["ETag"])
+        self.assertEqual([c["numero"] for c in respuesta.json()["prestamos"][0]["cuotas"]], [1, 2, 3])
+
+    def test_solo_el_mismo_socio_o_el_staff(self):
+        self.assertEqual(self.client.get(reverse("cuotas_pendientes_usuario", args=[self.otro.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("cuotas_pendientes", args=[self.ajeno.pk])).json(), [])
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        self.client.force_login(staff)
+        self.assertEqual(len(self.client.get(reverse("cuotas_pendientes", args=[self.ajeno.pk])).json()), 2)
+
+
+# ================================================================
+# Reparto automático de pagos
+# ================================================================
+class RepartoPagoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+        # vencen el 10 de febrero, marzo y abril
+        cls.prestamo = Prestamo.objects.create(
+            usuario=cls.socio, monto=Decimal("300000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 1, 10),
+        )
+        Aporte.objects.create(usuario=cls.socio, fecha_aporte=date(2025, 1, 5), monto=Decimal("50000"))
+
+    def setUp(self):
+        self.c1, self.c2, self.c3 = CuotaPrestamo.objects.filter(prestamo=self.prestamo).order_by("numero")
+
+    def pago(self, monto):
+        return Pago.objects.create(
+            usuario=self.socio, monto_reportado=monto, fecha=timezone.make_aware(datetime(2025, 3, 5, 10)),
+        )
+
+    def resumen(self, aplicaciones):
+        return [(a.tipo, a.cuota_id, a.capital, a.interes, a.monto_aplicado) for a in aplicaciones]
+
+    def test_cascada_interes_capital_aporte_y_resto(self):
+        monto = self.c1.monto_cuota + self.c2.monto_cuota + Decimal("51000")
+        pago = self.pago(monto)
+        with self.assertNumQueries(3):
+            aplicaciones = reparto.calcular(pago)
+        self.assertEqual(self.resumen(aplicaciones), [
+            ("prestamo", self.c1.pk, self.c1.capital, self.c1.interes, self.c1.monto_cuota),
+            ("prestamo", self.c2.pk, self.c2.capital, self.c2.interes, self.c2.monto_cuota),
+            ("aporte", None, 0, 0, Decimal("50000")),
+            ("aporte_viaje", None, 0, 0, Decimal("1000")),
+        ])
+
+        # sin plata para todo: primero los intereses de las cuotas del mes
+        corto = reparto.calcular(self.pago(self.c1.interes + self.c2.interes + Decimal("100")))
+        self.assertEqual(self.resumen(corto), [
+            ("prestamo", self.c1.pk, Decimal("100"), self.c1.interes, self.c1.interes + Decimal("100")),
+            ("prestamo", self.c2.pk, 0, self.c2.interes, self.c2.interes),
+        ])
+        with self.assertRaises(ValueError):
+            reparto.calcular(self.pago(monto), politica=("capital", "propina"))
+
+    def test_aplicar_guarda_y_recalcula_al_confirmar(self):
+        pago = self.pago(self.c1.monto_cuota + self.c2.monto_cuota + Decimal("50000"))
+        with self.captureOnCommitCallbacks(execute=True):
+            reparto.aplicar(pago)
+        pago.refresh_from_db()
+        self.c1.refresh_from_db()
+        self.assertTrue(pago.validado)
+        self.assertTrue(self.c1.pagada)
+        self.assertEqual(PagoAplicacion.objects.filter(pago=pago).count(), 3)
+        aporte = Aporte.objects.get(aplicaciones__pago=pago)
+        self.assertEqual((aporte.fecha_aporte, aporte.monto), (date(2025, 3, 5), Decimal("50000")))
+        self.assertEqual(reparto.aplicar(pago), [])
+
+    def test_prellenado_en_el_dashboard_y_en_el_admin(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.post(reverse("dashboard:pagos-create"), {
+            "action": "repartir", "usuario": self.socio.pk, "fecha": "2025-03-05",
+            "monto_reportado": str(self.c1.monto_cuota),
+        })
+        iniciales = [f.initial for f in respuesta.context["formset"].forms]
+        self.assertEqual([(i["tipo"], i["cuota"]) for i in iniciales], [("prestamo", self.c1.pk), ("prestamo", self.c2.pk)])
+        self.assertFalse(Pago.objects.exists())
+
+        pago = self.pago(self.c1.monto_cuota)
+        respuesta = self.client.get(reverse("admin:fonar_pago_change", args=[pago.pk]), {"repartir": "1"})
+        formset = respuesta.context["inline_admin_formsets"][0].formset
+        self.assertEqual([f.initial.get("cuota") for f in formset.forms], [self.c1.pk, self.c2.pk])
+
+
+class ExtractosTests(TestCase):
+
+    CSV = (
+        "Extracto Nequi\n"
+        "Fecha;Valor;Celular;Nombre;Referencia\n"
+        "05/03/2025;$ 250.000;+57 300 111 2233;;M1\n"
+        "05/03/2025;$ 250.000;3001112233;;M1\n"
+        "06/03/2025;80.000,00;;Ana Gómez;M2\n"
+        "07/03/2025;40000;3109998877;Desconocido;M3\n"
+        "08/03/2025;-15.000;3001112233;;M4\n"
+        "ayer;1000;3001112233;;M5\n"
+    ).encode("utf-8")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.socio = Usuario.objects.create_user(
+            username="socio", password="x", tipo_usuario="asociado", telefono="300 111 2233",
+        )
+        cls.ana = Usuario.objects.create_user(
+            username="agomez", password="x", first_name="Ana", last_name="Gómez", documento="1.020.304",
+        )
+        cls.prestamo = Prestamo.objects.create(
+            usuario=cls.socio, monto=Decimal("300000"), interes=Decimal("2"),
+            cuotas=3, fecha_desembolso=date(2025, 1, 10),
+        )
+
+    def analizar(self, contenido=None, nombre="extracto.csv"):
+        return extractos.analizar(extractos.leer(io.BytesIO(contenido or self.CSV), nombre))
+
+    def test_reporte_de_prueba_no_escribe(self):
+        # celular y documento de todo el archivo, uno por nombre distinto sin celular ni documento
+        # conocido, y los pagos del rango de fechas
+        with self.assertNumQueries(4):
+            lineas = self.analizar()
+        self.assertEqual(
+            [(l.estado, l.usuario_id) for l in lineas],
+            [
+                (extractos.NUEVO, self.socio.pk),
+                (extractos.DUPLICADO, self.socio.pk),
+                (extractos.NUEVO, self.ana.pk),
+                (extractos.SIN_SOCIO, None),
+                (extractos.INVALIDO, None),
+                (extractos.INVALIDO, None),
+            ],
+        )
+        self.assertEqual(lineas[2].monto, Decimal("80000.00"))
+        self.assertEqual(extractos.resumen(lineas)[1], Decimal("330000.00"))
+        self.assertFalse(Pago.objects.exists())
+
+    def test_importar_crea_pagos_repartidos_y_no_repite(self):
+        lineas = self.analizar()
+        with self.captureOnCommitCallbacks(execute=True):
+            pagos = extractos.importar(lineas, "nequi")
+        self.assertEqual(len(pagos), 2)
+        pago = Pago.objects.get(usuario=self.socio)
+        self.assertTrue(pago.validado)
+        self.assertEqual(pago.monto_aplicado_total, Decimal("250000"))
+        self.assertIn("nequi", pago.comentarios)
+        self.assertTrue(CuotaPrestamo.objects.get(prestamo=self.prestamo, numero=1).pagada)
+
+        # el mismo extracto otra vez: todo sale duplicado
+        self.assertEqual(extractos.importar(self.analizar(), "nequi"), [])
+        estados = {l.estado for l in self.analizar() if l.usuario_id}
+        self.assertEqual(estados, {extractos.DUPLICADO})
+
+    def test_xlsx_y_documento(self):
+        from openpyxl import Workbook
+
+        libro = Workbook()
+        hoja = libro.active
+        hoja.append(["Fecha", "Monto", "Cédula"])
+        hoja.append([datetime(2025, 3, 6, 9, 30), 120000, 1020304])
+        contenido = io.BytesIO()
+        libro.save(contenido)
+
+        (linea,) = self.analizar(contenido.getvalue(), "extracto.xlsx")
+        self.assertEqual((linea.estado, linea.usuario_id, linea.monto), (extractos.NUEVO, self.ana.pk, Decimal("120000.00")))
+
+    def test_dashboard_revisa_y_confirma(self):
+        self.client.force_login(self.staff)
+        archivo = SimpleUploadedFile("extracto.csv", self.CSV, content_type="text/csv")
+        respuesta = self.client.post(reverse("dashboard:pagos-importar"), {"archivo": archivo, "medio": "nequi"})
+        self.assertEqual(respuesta.context["conteo"][extractos.NUEVO], 2)
+        self.assertFalse(Pago.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("dashboard:pagos-importar"), {
+                "action": "importar", "medio": "nequi", "token": respuesta.context["token"],
+            })
+        self.assertEqual(Pago.objects.count(), 2)
+
+        respuesta = self.client.post(reverse("dashboard:pagos-importar"), {
+            "action": "importar", "medio": "nequi", "token": "alterado",
+        })
+        self.assertRedirects(respuesta, reverse("dashboard:pagos-importar"))
+
+
+class AltasSociosTests(TestCase):
+
+    CSV = (
+        "Usuario,Clave,Nombre,Apellido,Correo,Tipo,Celular,Cédula,Aporte inicial,Fecha aporte\n"
+        "mlopez,Fonar-2025-mlopez,María,López,mlopez@fonar.co,asociado,+57 310 555 0001,52.111.222,150000,2025-02-01\n"
+        "jruiz,,Julián,Ruiz,,tercero,,,,\n"
+    ).encode("utf-8")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+
+    def validar(self, contenido=None):
+        return altas.validar(extractos.leer(
+            io.BytesIO(contenido or self.CSV), "socios.csv", alias=altas.ALIAS, obligatorias=altas.OBLIGATORIAS,
+        ))
+
+    def test_valida_todo_el_archivo_con_una_consulta(self):
+        contenido = self.CSV + (
+            "staff,,,,,,,,,\n"
+            "jruiz,,,,,,,,,\n"
+            "nuevo,1234,,,correo-malo,socio,,,-5,\n"
+        ).encode("utf-8")
+        with self.assertNumQueries(1):
+            filas = self.validar(contenido)
+        self.assertEqual([bool(f.errores) for f in filas], [False, False, True, True, True])
+        self.assertIn("El usuario ya existe", filas[2].errores)
+        self.assertIn("Usuario repetido en el archivo", filas[3].errores)
+        self.assertEqual(len(filas[4].errores), 3)  # correo, tipo y aporte; la clave ni se valida
+
+    def test_crear_usuarios_aportes_y_busqueda(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            usuarios = altas.crear(self.validar())
+        self.assertEqual(len(usuarios), 2)
+
+        maria = Usuario.objects.get(username="mlopez")
+        self.assertTrue(maria.check_password("Fonar-2025-mlopez"))
+        self.assertEqual((maria.telefono, maria.documento), ("3105550001", "52111222"))
+        self.assertFalse(Usuario.objects.get(username="jruiz").has_usable_password())
+        self.assertEqual(Usuario.objects.get(username="jruiz").tipo_usuario, "tercero")
+
+        self.assertEqual(Aporte.objects.get(usuario=maria).monto, Decimal("150000"))
+        resumen = ResumenAnualSocio.objects.get(usuario=maria, año=2025)
+        self.assertEqual(resumen.aportes, Decimal("150000"))
+        self.assertEqual(list(Usuario.objects.filter(filtro_usuario("maria lop", "pk"))), [maria])
+
+    def test_hash_en_varios_procesos(self):
+        with patch.object(claves, "MINIMO_EN_PARALELO", 1):
+            hashes = claves.hashear(["uno-1234", "dos-5678"], procesos=2)
+        usuario = Usuario(username="x")
+        for clave, hash_ in zip(["uno-1234", "dos-5678"], hashes):
+            usuario.password = hash_
+            self.assertTrue(usuario.check_password(clave))
+
+    def test_dashboard_revisa_y_crea(self):
+        self.client.force_login(self.staff)
+        url = reverse("dashboard:usuarios-importar")
+        respuesta = self.client.post(url, {"archivo": SimpleUploadedFile("socios.csv", self.CSV), "action": "revisar"})
+        self.assertEqual(len(respuesta.context["filas"]), 2)
+        self.assertFalse(Usuario.objects.filter(username="mlopez").exists())
+
+        con_error = self.CSV + b"staff,,,,,,,,,\n"
+        self.client.post(url, {"archivo": SimpleUploadedFile("socios.csv", con_error), "action": "crear"})
+        self.assertFalse(Usuario.objects.filter(username="mlopez").exists())
+
+        respuesta = self.client.post(url, {"archivo": SimpleUploadedFile("socios.csv", self.CSV), "action": "crear"})
+        self.assertRedirects(respuesta, reverse("dashboard:usuarios-list"), fetch_redirect_response=False)
+        self.assertEqual(Usuario.objects.filter(username__in=["mlopez", "jruiz"]).count(), 2)
+
+
+# ================================================================
+# Índice de tasas de interés
+# ================================================================
+class TasasTests(TestCase):
+
+    def setUp(self):
+        # el índice es del proceso y sobrevive al rollback de otras pruebas
+        tasas.olvidar()
+        self.hoy = timezone.localdate()
+        self.antes = self.hoy - timedelta(days=365)
+        for cuotas_min, cuotas_max in ((1, 12), (13, 36)):
+            TasaInteres.objects.create(
+                tipo_usuario="asociado", cuotas_min=cuotas_min, cuotas_max=cuotas_max,
+                interes_mensual=Decimal("2.00"), vigente_desde=self.antes,
+            )
+
+    def test_tramos_contiguos_se_unen_y_la_mas_reciente_tapa(self):
+        self.assertEqual(tasas.tabla("asociado"), [(1, 36, Decimal("2.00"))])
+        with self.captureOnCommitCallbacks(execute=True):
+            TasaInteres.objects.create(
+                tipo_usuario="asociado", cuotas_min=6, cuotas_max=24,
+                interes_mensual=Decimal("1.50"), vigente_desde=self.hoy - timedelta(days=30),
+            )
+        self.assertEqual(tasas.tabla("asociado"), [
+            (1, 5, Decimal("2.00")), (6, 24, Decimal("1.50")), (25, 36, Decimal("2.00")),
+        ])
+        self.assertEqual(tasas.tasa_para("asociado", 6), Decimal("1.50"))
+        self.assertEqual(tasas.tasa_para("asociado", 6, fecha=self.antes), Decimal("2.00"))
+        self.assertIsNone(tasas.tasa_para("asociado", 37))
+        self.assertIsNone(tasas.tasa_para("asociado", 6, fecha=self.antes - timedelta(days=1)))
+        self.assertIsNone(tasas.tasa_para("asociado", 6, tipo_credito="vivienda"))
+
+    def test_tasa_futura_no_aplica_hasta_su_fecha(self):
+        futura = self.hoy + timedelta(days=30)
+        TasaInteres.objects.create(
+            tipo_usuario="asociado", cuotas_min=1, cuotas_max=36,
+            interes_mensual=Decimal("3.00"), vigente_desde=futura,
+        )
+        self.assertEqual(tasas.tasa_para("asociado", 12), Decimal("2.00"))
+        self.assertEqual(tasas.tasa_para("asociado", 12, fecha=futura), Decimal("3.00"))
+
+    def test_sin_consultas_despues_de_cargar_y_se_invalida_al_guardar(self):
+        tasas.tasa_para("asociado", 6)
+        with self.assertNumQueries(0):
+            self.assertEqual(tasas.tasa_para("asociado", 24), Decimal("2.00"))
+        tasa = TasaInteres.objects.get(cuotas_min=13)
+        with self.captureOnCommitCallbacks(execute=True):
+            tasa.interes_mensual = Decimal("1.80")
+            tasa.save()
+            # sin confirmar, el índice sigue con lo anterior
+            self.assertEqual(tasas.tasa_para("asociado", 24), Decimal("2.00"))
+        self.assertEqual(tasas.tasa_para("asociado", 24), Decimal("1.80"))
+        with self.captureOnCommitCallbacks(execute=True):
+            tasa.delete()
+        self.assertIsNone(tasas.tasa_para("asociado", 24))
+
+    def test_sin_tipo_de_credito_aplican_todas_las_del_tipo_de_usuario(self):
+        TasaInteres.objects.create(
+            tipo_usuario="asociado", tipo_credito="vivienda", cuotas_min=24, cuotas_max=60,
+            interes_mensual=Decimal("1.20"), vigente_desde=self.hoy,
+        )
+        self.assertEqual(tasas.tasa_para("asociado", 48), Decimal("1.20"))
+        self.assertEqual(tasas.tasa_para("asociado", 30), Decimal("1.20"))  # la más reciente tapa
+        self.assertEqual(tasas.tasa_para("asociado", 30, tipo_credito="consumo"), Decimal("2.00"))
+        self.assertIsNone(tasas.tasa_para("asociado", 12, tipo_credito="vivienda"))
+
+    def test_simulacion_de_varios_plazos_igual_a_las_cuotas_guardadas(self):
+        socio = Usuario.objects.create_user(username="socio_tasas", password="x", tipo_usuario="asociado")
+        self.client.force_login(socio)
+        url = reverse("simular_prestamo")
+        escenarios = self.client.get(url, {
+            "monto": ["1000000", "1000000", "1000000"], "cuotas": ["6", "12", "40"], "fecha": "2025-01-10",
+        }).json()["escenarios"]
+        self.assertEqual([e["cuotas"] for e in escenarios], [6, 12, 40])
+        self.assertIn("error", escenarios[2])
+
+        prestamo = Prestamo.objects.create(
+            usuario=socio, monto=Decimal("1000000"), interes=Decimal("2.00"),
+            cuotas=12, fecha_desembolso=date(2025, 1, 10),
+        )
+        guardadas = [
+            {"numero": c.numero, "fecha_vencimiento": c.fecha_vencimiento.isoformat(), "cuota": float(c.monto_cuota),
+             "capital": float(c.capital), "interes": float(c.interes)}
+            for c in CuotaPrestamo.objects.filter(prestamo=prestamo).order_by("numero")
+        ]
+        # el saldo de la simulación es el del plan; el de la cuota guardada es el corrido
+        self.assertEqual([{k: v for k, v in p.items() if k != "saldo"} for p in escenarios[1]["periodos"]], guardadas)
+        self.assertEqual(escenarios[1]["tasa"], 2.0)
+
+        self.assertEqual(self.client.get(url, {"monto": "1000000"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"monto": "NaN", "cuotas": "6"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"monto": "1000000", "cuotas": "0"}).status_code, 400)
+
+    def test_tabla_para_el_navegador(self):
+        socio = Usuario.objects.create_user(username="socio_tasas", password="x", tipo_usuario="asociado")
+        self.client.force_login(socio)
+        respuesta = self.client.get(reverse("tabla_tasas")).json()
+        self.assertEqual(respuesta["tramos"], [{"cuotas_min": 1, "cuotas_max": 36, "tasa": 2.0}])
+        self.assertEqual(self.client.get(reverse("obtener_tasa"), {"cuotas": 40}).status_code, 404)
+
+
+# ================================================================
+# Perfilado SQL
+# ================================================================
+class PerfiladoSQLTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        cls.socio = Usuario.objects.create_user(username="socio", password="x", tipo_usuario="asociado")
+
+    def setUp(self):
+        perfilado.ventana.limpiar()
+        self.url = reverse("dashboard:perfilado")
+
+    def test_solo_staff_y_solo_si_se_pide(self):
+        self.client.force_login(self.socio)
+        respuesta = self.client.get(reverse("inicio"), {"perfilar_sql": "1"}, HTTP_X_PERFILAR_SQL="1")
+        self.assertNotIn("X-SQL-Consultas", respuesta)
+
+        self.client.force_login(self.staff)
+        self.assertNotIn("X-SQL-Consultas", self.client.get(self.url))
+        self.assertNotIn("X-SQL-Consultas", self.client.get(self.url, {"perfilar_sql": "0"}))
+        self.assertEqual(perfilado.ventana.recientes(), [])
+
+        respuesta = self.client.get(reverse("dashboard:home"), {"perfilar_sql": "1"})
+        self.assertGreater(int(respuesta["X-SQL-Consultas"]), 0)
+        for cabecera in ("X-SQL-Tiempo-ms", "X-SQL-Repetidas", "X-Tiempo-Vista-ms"):
+            self.assertIn(cabecera, respuesta)
+        respuesta = self.client.get(self.url, HTTP_X_PERFILAR_SQL="1")
+        self.assertEqual(respuesta["X-SQL-Consultas"], "0")  # sesión y usuario se leen antes
+        self.assertEqual(
+            [r["endpoint"] for r in perfilado.ventana.recientes()], ["dashboard:home", "dashboard:perfilado"],
+        )
+
+    def test_agrupa_las_repetidas_y_marca_n_mas_1(self):
+        registro = perfilado.RegistroSQL()
+        with connection.execute_wrapper(registro):
+            for usuario in Usuario.objects.order_by("pk"):
+                list(Aporte.objects.filter(usuario=usuario))
+            for pk in (self.socio.pk, self.staff.pk, self.socio.pk):
+                list(Aporte.objects.filter(usuario_id=pk))
+            # las listas IN de distinto largo son la misma consulta
+            list(Usuario.objects.filter(pk__in=[self.socio.pk, self.staff.pk]))
+            list(Usuario.objects.filter(pk__in=[self.socio.pk, self.staff.pk, 0]))
+
+        self.assertEqual(len(registro.consultas), 8)
+        repetidas = dict(registro.repetidas())
+        self.assertEqual(sorted(repetidas.values()), [2, 5])
+        self.assertEqual(registro.n_mas_1(), [(sql, 5) for sql, veces in repetidas.items() if veces == 5])
+        with patch("fonar.middleware.UMBRAL_N_MAS_1", 6):
+            self.assertEqual(registro.n_mas_1(), [])
+
+    def test_pagina_de_perfilado(self):
+        self.client.force_login(self.socio)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_login(self.staff)
+        self.client.get(reverse("dashboard:home"), {"perfilar_sql": "1"})
+        self.client.get(reverse("dashboard:home"), {"perfilar_sql": "1"})
+        respuesta = self.client.get(self.url)
+        self.assertEqual(
+            [(e["endpoint"], e["peticiones"]) for e in respuesta.context["endpoints"]], [("dashboard:home", 2)],
+        )
+        self.assertContains(respuesta, "<code>dashboard:home</code>", html=False)
+        self.assertContains(respuesta, "por worker")
+        self.assertEqual(self.client.get(self.url, {"minutos": "1"}).context["minutos"], 1)
+
+        self.assertRedirects(self.client.post(self.url), self.url)
+        self.assertEqual(self.client.get(self.url).context["endpoints"], [])
+
+
+# ================================================================
+# Fondo sintético y benchmark de vistas
+# ================================================================
+@override_settings(CACHES=CACHES_LOCALES)
+class BenchmarkVistasTests(TestCase):
+
+    def test_generar_datos_prueba(self):
+        salida = io.StringIO()
+        call_command("generar_datos_prueba", socios=3, terceros=1, anios=1, stdout=salida)
+        self.assertIn("Fondo de prueba generado", salida.getvalue())
+        self.assertEqual(Usuario.objects.filter(username__startswith="demo_").count(), 4)
+        self.assertTrue(Aporte.objects.filter(usuario__username__startswith="demo_").exists())
+
+    def test_benchmark_vistas_escribe_el_reporte(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = os.path.join(carpeta, "reporte.json")
+            call_command(
+                "benchmark_vistas", tamanos="3", repeticiones=1, salida=archivo, stdout=io.StringIO(),
+            )
+            with open(archivo) as f:
+                reporte = json.load(f)
+
+        self.assertEqual(set(reporte), {"fecha", "commit", "motor", "repeticiones", "resultados"})
+        self.assertEqual((reporte["motor"], reporte["repeticiones"]), ("sqlite", 1))
+        [resultado] = reporte["resultados"]
+        self.assertEqual(set(resultado), {"socios", "datos", "vistas"})
+        self.assertEqual(resultado["socios"], 3)
+        self.assertEqual(
+            set(resultado["vistas"]),
+            {"inicio", "ver_prestamos", "pago_pdf", "dashboard_home", "prestamos_list", "entregar_fondo_pdf"},
+        )
+        for nombre, vista in resultado["vistas"].items():
+            self.assertEqual(vista["status"], 200, nombre)
+            self.assertEqual(set(vista), {"url", "status", "consultas", "ms_min", "ms_mediana", "ms_max"})
+        # sin --conservar no deja el fondo
+        self.assertFalse(Usuario.objects.filter(username__startswith="demo_socio").exists())
+
+    def test_entregar_fondo_pdf(self):
+        generar_fondo(socios=3, terceros=1, anios=1)
+        staff = Usuario.objects.create_superuser(username="staff", password="x", email="staff@fonar.co")
+        self.client.force_login(staff)
+        respuesta = self.client.get(reverse("dashboard:entregar_fondo"))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Type"], "application/pdf")
+        self.assertTrue(respuesta.content.startswith(b"%PDF"))
+
+
+# ================================================================
+# Presupuesto de consultas por vista
+# ================================================================
+
+# nombre de la URL → (cliente que la visita, máximo de consultas SQL)
+PRESUPUESTOS = {
+    # fonar/urls.py (portal del socio)
+    "inicio": ("socio", 5),
+    "ver_aportes": ("socio", 4),
+    "ver_prestamos": ("socio", 5),
+    "subir_pago": ("socio", 2),
+    "login": ("anonimo", 0),
+    "logout": ("desechable", 4),
+    "mis_pagos": ("socio", 3),
+    "cuotas_pendientes": ("socio", 3),
+    "cuotas_pendientes_usuario": ("socio", 4),
+    "pago_pdf": ("socio", 6),
+    "solicitar_prestamo": ("socio", 2),
+    "simular_prestamo": ("socio", 2),
+    "obtener_tasa": ("socio", 2),
+    "tabla_tasas": ("socio", 2),
+    "mis_solicitudes": ("socio", 3),
+    # dashboard/urls.py
+    "dashboard:home": ("staff", 6),
+    "dashboard:admin-login": ("anonimo", 0),
+    "dashboard:admin-logout": ("desechable", 2),
+    "dashboard:usuarios-list": ("staff", 4),
+    "dashboard:usuarios-create": ("staff", 2),
+    "dashboard:usuarios-importar": ("staff", 2),
+    "dashboard:usuarios-update": ("staff", 3),
+    "dashboard:usuarios-delete": ("staff", 3),
+    "dashboard:usuarios-password": ("staff", 3),
+    "dashboard:usuarios-autocompletar": ("staff", 3),
+    "dashboard:pagos-list": ("staff", 4),
+    "dashboard:pagos-create": ("staff", 4),
+    "dashboard:pagos-importar": ("staff", 2),
+    "dashboard:pagos-update": ("staff", 10),
+    "dashboard:pagos-delete": ("staff", 4),
+    "dashboard:pagos-detail": ("staff", 6),
+    "dashboard:otros-aportes-list": ("staff", 3),
+    "dashboard:aporte_list": ("staff", 5),
+    "dashboard:aporte_create": ("staff", 3),
+    "dashboard:aporte_update": ("staff", 4),
+    "dashboard:aporte_delete": ("staff", 4),
+    "dashboard:aporte_detail": ("staff", 4),
+    "dashboard:prestamos-list": ("staff", 5),
+    "dashboard:prestamos-create": ("staff", 3),
+    "dashboard:prestamos-detail": ("staff", 5),
+    "dashboard:prestamos-update": ("staff", 4),
+    "dashboard:prestamos-delete": ("staff", 4),
+    "dashboard:tasas-list": ("staff", 4),
+    "dashboard:tasas-create": ("staff", 2),
+    "dashboard:tasas-update": ("staff", 3),
+    "dashboard:tasas-delete": ("staff", 3),
+    "dashboard:solicitudes-list": ("staff", 3),
+    "dashboard:solicitudes-update": ("staff", 3),
+    "dashboard:entregar_fondo": ("staff", 4),
+    "dashboard:perfilado": ("staff", 2),
+}
+
+# Vistas que todavía hacen consultas por fila: solo se controla el presupuesto
+# con el fondo chico. Hay que sacarlas de aquí al corregirlas.
+CRECEN_CON_LOS_DATOS = set()
+
+
+def nombres_de_urls():
+    """Nombres de todas las rutas de fonar/urls.py y dashboard/urls.py"""
+    nombres = [p.name for p in fonar_urls.urlpatterns if isinstance(p, URLPattern) and p.name]
+    nombres += [
+        f"{dashboard_urls.app_name}:{p.name}"
+        for p in dashboard_urls.urlpatterns if isinstance(p, URLPattern) and p.name
+    ]
+    return nombres
+
+
+# sin caché: se mide lo que cuesta calcular cada vista
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    "datos": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+})
+class PresupuestoConsultasTests(TestCase):
+    """
+    Cada vista se visita con un fondo chico y con uno más grande (más socios, y
+    el socio de prueba con más préstamos y pagos). El número de consultas debe
+    quedar dentro del presupuesto y no crecer con los datos.
+    """
+
+    TAMANOS = (
+        {"socios": 3, "terceros": 1, "prestamos": 1},
+        {"socios": 12, "terceros": 3, "prestamos": 3},
+    )
+
+    def preparar_fondo(self, socios, terceros, prestamos):
+        borrar_fondo()
+        Usuario.objects.filter(username__in=("prueba_socio", "prueba_staff")).delete()
+        generar_fondo(socios=socios, terceros=terceros, semilla=socios)
+
+        socio = Usuario.objects.create_user(username="prueba_socio", password="x", tipo_usuario="asociado")
+        staff = Usuario.objects.create_superuser(username="prueba_staff", password="x", email="staff@fonar.co")
+        anio = timezone.localdate().year
+        for i in range(prestamos):
+            prestamo = Prestamo.objects.create(
+                usuario=socio, monto=Decimal("1200000"), interes=Decimal("2"),
+                cuotas=6, fecha_desembolso=date(anio, 1, 10 + i),
+            )
+            Aporte.objects.create(usuario=socio, fecha_aporte=date(anio, 1, 1 + i), monto=Decimal("100000"))
+            for cuota in prestamo.cuotaprestamo_set.order_by("numero")[:2]:
+                pago = Pago.objects.create(usuario=socio, monto_reportado=cuota.monto_cuota)
+                PagoAplicacion.objects.create(
+                    pago=pago, tipo="prestamo", cuota=cuota, capital=cuota.capital, interes=cuota.interes,
+                )
+        SolicitudPrestamo.objects.create(
+            usuario=socio, monto=Decimal("500000"), cuotas=6, interes=Decimal("2"),
+            fecha_deseada_desembolso=date(anio, 12, 1),
+        )
+        TasaInteres.objects.get_or_create(
+            tipo_usuario="asociado", cuotas_min=1, cuotas_max=36, defaults={"interes_mensual": Decimal("2")},
+        )
+        return socio, staff
+
+    def argumentos(self, nombre, socio):
+        prestamo = Prestamo.objects.filter(usuario=socio).order_by("pk").first()
+        pago = Pago.objects.filter(usuario=socio, validado=True).order_by("pk").first()
+        por_nombre = {
+            "cuotas_pendientes": {"prestamo_id": prestamo.pk},
+            "cuotas_pendientes_usuario": {"usuario_id": socio.pk},
+            "pago_pdf": {"pago_id": pago.pk},
+            "dashboard:usuarios-update": {"pk": socio.pk},
+            "dashboard:usuarios-delete": {"pk": socio.pk},
+            "dashboard:usuarios-password": {"pk": socio.pk},
+            "dashboard:pagos-update": {"pk": pago.pk},
+            "dashboard:pagos-delete": {"pk": pago.pk},
+            "dashboard:pagos-detail": {"pk": pago.pk},
+            "dashboard:aporte_update": {"pk": Aporte.objects.filter(usuario=socio).first().pk},
+            "dashboard:aporte_delete": {"pk": Aporte.objects.filter(usuario=socio).first().pk},
+            "dashboard:aporte_detail": {"pk": Aporte.objects.filter(usuario=socio).first().pk},
+            "dashboard:prestamos-detail": {"pk": prestamo.pk},
+            "dashboard:prestamos-update": {"pk": prestamo.pk},
+            "dashboard:prestamos-delete": {"pk": prestamo.pk},
+            "dashboard:tasas-update": {"pk": TasaInteres.objects.first().pk},
+            "dashboard:tasas-delete": {"pk": TasaInteres.objects.first().pk},
+            "dashboard:solicitudes-update": {"pk": SolicitudPrestamo.objects.filter(usuario=socio).first().pk},
+        }
+        url = reverse(nombre, kwargs=por_nombre.get(nombre))
+        if nombre == "obtener_tasa":
+            url += "?cuotas=6"
+        elif nombre == "simular_prestamo":
+            url += "?monto=1000000&cuotas=6&monto=1000000&cuotas=12"
+        elif nombre == "dashboard:usuarios-autocompletar":
+            url += "?q=soc"
+        return url
+
+    def contar_consultas(self, socio, staff):
+        conteos = {}
+        for nombre in PRESUPUESTOS:
+            quien = PRESUPUESTOS[nombre][0]
+            cliente = Client()
+            if quien == "staff":
+                cliente.force_login(staff)
+            elif quien in ("socio", "desechable"):
+                cliente.force_login(socio)
+            url = self.argumentos(nombre, socio)
+            if quien != "desechable":
+                cliente.get(url)  # la primera visita puede crear filas (p. ej. FondoBalance del año)
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = cliente.get(url)
+            self.assertLess(respuesta.status_code, 500, f"{nombre} ({url}) respondió {respuesta.status_code}")
+            conteos[nombre] = len(consultas)
+        return conteos
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        faltantes = set(nombres_de_urls()) - set(PRESUPUESTOS)
+        self.assertEqual(faltantes, set(), "Agrega estas rutas a PRESUPUESTOS")
+
+    def test_consultas_dentro_del_presupuesto_y_constantes(self):
+        mediciones = []
+        for tamano in self.TAMANOS:
+            socio, staff = self.preparar_fondo(**tamano)
+            mediciones.append(self.contar_consultas(socio, staff))
+        chico, grande = mediciones
+
+        for nombre, (_, maximo) in PRESUPUESTOS.items():
+            with self.subTest(vista=nombre):
+                self.assertLessEqual(chico[nombre], maximo)
+                if nombre in CRECEN_CON_LOS_DATOS:
+                    continue
+                self.assertLessEqual(
+                    grande[nombre], chico[nombre],
+                    f"{nombre}: {chico[nombre]} consultas con el fondo chico y {grande[nombre]} con el grande",
+                )
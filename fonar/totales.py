@@ -0,0 +1,76 @@
+"""
+Expresiones SQL que recalculan desde PagoAplicacion / CuotaPrestamo los totales
+que se guardan desnormalizados. Se usan en UPDATE masivos (señales, comandos de
+recálculo) y para detectar diferencias (verificar_saldos).
+"""
+from decimal import Decimal
+
+from django.db.models import OuterRef, Subquery, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+from .models import CuotaPrestamo, PagoAplicacion, Prestamo
+
+
+def _coalesce_decimal(subconsulta):
+    return Coalesce(
+        Subquery(subconsulta),
+        Value(Decimal("0")),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def suma_aplicaciones(campo_fk, campo_suma, **filtros):
+    """SUM(campo_suma) de las aplicaciones de la fila externa (0 si no hay)"""
+    subconsulta = (
+        PagoAplicacion.objects.filter(**{campo_fk: OuterRef("pk")}, **filtros)
+        .values(campo_fk)
+        .annotate(total=Sum(campo_suma))
+        .values("total")
+    )
+    return _coalesce_decimal(subconsulta)
+
+
+# ---- Cuotas: todo lo aplicado (validado o no), como en recalcular_cuota ----
+def capital_pagado_cuota():
+    return suma_aplicaciones("cuota", "capital")
+
+
+def interes_pagado_cuota():
+    return suma_aplicaciones("cuota", "interes")
+
+
+# ---- Pagos ----
+def monto_aplicado_pago():
+    return suma_aplicaciones("pago", "monto_aplicado")
+
+
+# ---- Préstamos: solo pagos validados, como capital_pendiente ----
+def capital_pagado_prestamo():
+    return suma_aplicaciones("prestamo", "capital", pago__validado=True)
+
+
+def interes_pagado_prestamo():
+    return suma_aplicaciones("prestamo", "interes", pago__validado=True)
+
+
+def capital_programado_prestamo():
+    """Suma del capital de todas las cuotas del plan"""
+    subconsulta = (
+        CuotaPrestamo.objects.filter(prestamo=OuterRef("pk"))
+        .values("prestamo")
+        .annotate(total=Sum("capital"))
+        .values("total")
+    )
+    return _coalesce_decimal(subconsulta)
+
+
+def saldo_cuota():
+    """Saldo corrido: monto del préstamo menos el capital aplicado a esta cuota y a las anteriores"""
+    capital_aplicado = (
+        PagoAplicacion.objects.filter(cuota__prestamo=OuterRef("prestamo"), cuota__numero__lte=OuterRef("numero"))
+        .values("cuota__prestamo")
+        .annotate(total=Sum("capital"))
+        .values("total")
+    )
+    monto = Prestamo.objects.filter(pk=OuterRef("prestamo")).values("monto")
+    return _coalesce_decimal(monto) - _coalesce_decimal(capital_aplicado)
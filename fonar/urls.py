@@ -11,8 +11,11 @@ urlpatterns = [
     path('accounts/logout/', views.custom_logout, name='logout'),  # 👈 ahora usa tu vista
     path('mis-pagos/', views.mis_pagos, name='mis_pagos'),
     path("cuotas/<int:prestamo_id>/", views.cuotas_pendientes, name="cuotas_pendientes"),
+    path("cuotas/usuario/<int:usuario_id>/", views.cuotas_pendientes_usuario, name="cuotas_pendientes_usuario"),
     path("pago/<int:pago_id>/pdf/", views.pago_pdf, name="pago_pdf"),
     path("solicitar-prestamo/", views.solicitar_prestamo, name="solicitar_prestamo"),
+    path("solicitar-prestamo/simular/", views.simular_prestamo, name="simular_prestamo"),
     path("obtener-tasa/", views.obtener_tasa, name="obtener_tasa"),
+    path("tabla-tasas/", views.tabla_tasas, name="tabla_tasas"),
     path("mis-solicitudes/", views.mis_solicitudes, name="mis_solicitudes"),
 ]
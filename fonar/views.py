@@ -1,11 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
-from decimal import Decimal, ROUND_HALF_UP
-from .models import Aporte, Prestamo, Pago, CuotaPrestamo, PagoAplicacion, SolicitudPrestamo, TasaInteres
+from django.db.models import F, Prefetch, Sum
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from .models import Aporte, Prestamo, Pago, CuotaPrestamo, PagoAplicacion, SolicitudPrestamo
 from .forms import PagoForm, SolicitudPrestamoForm
-from django.http import JsonResponse, HttpResponse
+from .fechas import en_anio, en_anio_local
+from . import amortizacion, cache_versionada, tasas, totales
+from .cache_versionada import en_cache
+from django.http import Http404, JsonResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.contrib.auth import logout
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.pagesizes import A4
@@ -34,7 +39,7 @@ def inicio(request):
 
     # Aportes normales (solo año en curso)
     total_aportes_normales = (
-        Aporte.objects.filter(usuario=usuario, fecha_aporte__year=anio)
+        Aporte.objects.filter(en_anio('fecha_aporte', anio), usuario=usuario)
         .aggregate(total=Sum('monto'))['total']
         or Decimal('0')
     )
@@ -48,8 +53,8 @@ def inicio(request):
             tipo='aporte_viaje',
         )
         .filter(
-            Q(fecha_aporte__year=anio) |
-            Q(fecha_aporte__isnull=True, pago__fecha__year=anio)
+            en_anio('fecha_aporte', anio) |
+            Q(en_anio_local('pago__fecha', anio), fecha_aporte__isnull=True)
         )
     )
 
@@ -61,25 +66,14 @@ def inicio(request):
     # Total aportes = normales + viaje
     total_aportes = total_aportes_normales + total_aportes_viaje
 
-    # Préstamos (solo del año en curso, manteniendo tu lógica de saldo capital)
-    prestamos = Prestamo.objects.filter(usuario=usuario, fecha_desembolso__year=anio)
-    total_prestamos = Decimal('0')
-
-    for prestamo in prestamos:
-        cuotas = CuotaPrestamo.objects.filter(prestamo=prestamo)
-        capital_pendiente = cuotas.aggregate(
-            total=Sum('capital')
-        )['total'] or Decimal('0')
-
-        capital_pagado = PagoAplicacion.objects.filter(
-            prestamo=prestamo,
-            pago__validado=True
-        ).aggregate(
-            total=Sum('capital')
-        )['total'] or Decimal('0')
-
-        saldo_capital = capital_pendiente - capital_pagado
-        total_prestamos += saldo_capital
+    # Préstamos (solo del año en curso, manteniendo tu lógica de saldo capital):
+    # capital del plan menos capital pagado con pagos validados, en una consulta
+    total_prestamos = (
+        Prestamo.objects.filter(en_anio('fecha_desembolso', anio), usuario=usuario)
+        .annotate(capital_plan=totales.capital_programado_prestamo())
+        .aggregate(total=Sum(F('capital_plan') - F('capital_pagado_total')))['total']
+        or Decimal('0')
+    )
 
     diferencia = total_aportes - total_prestamos
 
@@ -102,26 +96,30 @@ def ver_aportes(request):
     """
     anio = timezone.localdate().year
 
-    aportes = Aporte.objects.filter(
-        usuario=request.user,
-        fecha_aporte__year=anio
-    ).order_by('-fecha_aporte')
+    # Se evalúan una vez: los totales se suman en memoria
+    aportes = list(
+        Aporte.objects.filter(
+            en_anio('fecha_aporte', anio),
+            usuario=request.user,
+        ).order_by('-fecha_aporte')
+    )
 
-    otros_aportes_viaje = (
+    otros_aportes_viaje = list(
         PagoAplicacion.objects.filter(
             pago__usuario=request.user,
             pago__validado=True,
             tipo='aporte_viaje',
         )
         .filter(
-            Q(fecha_aporte__year=anio) |
-            Q(fecha_aporte__isnull=True, pago__fecha__year=anio)
+            en_anio('fecha_aporte', anio) |
+            Q(en_anio_local('pago__fecha', anio), fecha_aporte__isnull=True)
         )
+        .select_related('pago')
         .order_by('-fecha_aporte', '-pago__fecha')
     )
 
-    total_aportes_normales = aportes.aggregate(total=Sum('monto'))['total'] or Decimal('0')
-    total_aportes_viaje = otros_aportes_viaje.aggregate(total=Sum('monto_aplicado'))['total'] or Decimal('0')
+    total_aportes_normales = sum((a.monto for a in aportes), Decimal('0'))
+    total_aportes_viaje = sum((app.monto_aplicado for app in otros_aportes_viaje), Decimal('0'))
     total_aportes = total_aportes_normales + total_aportes_viaje
 
     return render(request, 'fonar/ver_aportes.html', {
@@ -136,50 +134,48 @@ def ver_aportes(request):
 
 @login_required
 def ver_prestamos(request):
-    prestamos = Prestamo.objects.filter(usuario=request.user)
-    prestamos_data = []
+    """
+    Tres consultas sin importar cuántos préstamos tenga el socio: préstamos,
+    sus cuotas (prefetch) y los pagos validados agrupados por préstamo y pago.
+    """
+    prestamos = list(Prestamo.objects.filter(usuario=request.user).prefetch_related(
+        Prefetch("cuotaprestamo_set", queryset=CuotaPrestamo.objects.order_by("numero"), to_attr="cuotas_plan")
+    ))
 
-    for prestamo in prestamos:
-        cuotas = CuotaPrestamo.objects.filter(prestamo=prestamo).order_by("numero")
+    # Pagos realizados (solo validados), agrupados por préstamo
+    pagos_por_prestamo = {}
+    pagos = (
+        PagoAplicacion.objects.filter(prestamo__usuario=request.user, pago__validado=True)
+        .values("prestamo_id", "pago_id", "pago__fecha")
+        .annotate(monto_pagado=Sum("monto_aplicado"))
+        .order_by("-pago__fecha")
+    ) if prestamos else []
+    for p in pagos:
+        pagos_por_prestamo.setdefault(p["prestamo_id"], []).append({
+            "monto_pagado": p["monto_pagado"].quantize(Decimal("1"), rounding=ROUND_HALF_UP),
+            "fecha_pago": p["pago__fecha"]
+        })
 
-        # Aplicaciones de pagos validados
-        aplicaciones = PagoAplicacion.objects.filter(
-            prestamo=prestamo,
-            pago__validado=True
-        )
+    prestamos_data = []
+    for prestamo in prestamos:
+        cuotas = prestamo.cuotas_plan
+        pendientes = [c for c in cuotas if not c.pagada]
 
-        # Solo sumar capital pagado
-        capital_pagado = aplicaciones.aggregate(Sum('capital'))['capital__sum'] or Decimal('0')
-        capital_pagado = capital_pagado.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        # Solo capital pagado (pagos validados, guardado en el préstamo)
+        capital_pagado = (prestamo.capital_pagado_total or Decimal('0')).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
 
         # Saldo pendiente de capital
-        capital_pendiente = cuotas.filter(pagada=False).aggregate(Sum('capital'))['capital__sum'] or Decimal('0')
+        capital_pendiente = sum((c.capital for c in pendientes), Decimal('0'))
         capital_pendiente = capital_pendiente.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
 
         # Intereses pendientes (solo informativos)
-        interes_pendiente = cuotas.filter(pagada=False).aggregate(Sum('interes'))['interes__sum'] or Decimal('0')
+        interes_pendiente = sum((c.interes for c in pendientes), Decimal('0'))
         interes_pendiente = interes_pendiente.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
 
-        # Pagos realizados (sigue igual)
-        pagos = (
-            aplicaciones
-            .values("pago_id", "pago__fecha")
-            .annotate(monto_pagado=Sum("monto_aplicado"))
-            .order_by("-pago__fecha")
-        )
-
-        pagos_info = [
-            {
-                "monto_pagado": p["monto_pagado"].quantize(Decimal("1"), rounding=ROUND_HALF_UP),
-                "fecha_pago": p["pago__fecha"]
-            }
-            for p in pagos
-        ]
-
         prestamos_data.append({
             "prestamo": prestamo,
             "cuotas": cuotas,
-            "pagos": pagos_info,
+            "pagos": pagos_por_prestamo.get(prestamo.pk, []),
             "total_pagado": capital_pagado,          # ✅ ahora es solo capital
             "saldo_pendiente": capital_pendiente,    # ✅ sigue siendo solo capital
             "interes_pendiente": interes_pendiente   # ✅ valor extra informativo
@@ -228,15 +224,20 @@ def mis_pagos(request):
     # ✅ Solo mostrar pagos del año en curso
     anio = timezone.localdate().year
     pagos = Pago.objects.filter(
+        en_anio_local('fecha', anio),
         usuario=request.user,
-        fecha__year=anio
     ).order_by('-fecha')
 
     return render(request, 'fonar/mis_pagos.html', {'pagos': pagos, 'anio': anio})
 
 
+@login_required
+@require_GET
 def cuotas_pendientes(request, prestamo_id):
-    cuotas = CuotaPrestamo.objects.filter(prestamo_id=prestamo_id, pagada=False)
+    """Cuotas pendientes de un préstamo para el select del admin (staff o el dueño)"""
+    cuotas = CuotaPrestamo.objects.filter(prestamo_id=prestamo_id, pagada=False).order_by("numero")
+    if not request.user.is_staff:
+        cuotas = cuotas.filter(prestamo__usuario=request.user)
     data = [
         {"id": c.id, "texto": f"Cuota {c.numero} - Vence {c.fecha_vencimiento} - ${c.monto_cuota}"}
         for c in cuotas
@@ -244,6 +245,63 @@ def cuotas_pendientes(request, prestamo_id):
     return JsonResponse(data, safe=False)
 
 
+def _cuotas_pendientes_de(usuario_id):
+    """
+    Cuotas pendientes de todos los préstamos abiertos del usuario, en una
+    consulta por el índice de cuotas pendientes.
+    """
+    filas = list(
+        CuotaPrestamo.objects.filter(prestamo__usuario_id=usuario_id, pagada=False)
+        .order_by("prestamo_id", "numero")
+        .values(
+            "id", "prestamo_id", "numero", "fecha_vencimiento",
+            "monto_cuota", "capital", "capital_pagado", "interes", "interes_pagado",
+        )
+    )
+    prestamos = {}
+    for f in filas:
+        prestamo = prestamos.setdefault(f["prestamo_id"], {"id": f["prestamo_id"], "cuotas": []})
+        prestamo["cuotas"].append({
+            "id": f["id"],
+            "numero": f["numero"],
+            "fecha_vencimiento": f["fecha_vencimiento"].isoformat(),
+            "monto_cuota": float(f["monto_cuota"]),
+            "capital_pendiente": float(max(Decimal("0"), f["capital"] - f["capital_pagado"])),
+            "interes_pendiente": float(max(Decimal("0"), f["interes"] - f["interes_pagado"])),
+        })
+
+    return {"usuario": usuario_id, "prestamos": list(prestamos.values())}
+
+
+@login_required
+@require_GET
+def cuotas_pendientes_usuario(request, usuario_id):
+    """
+    Todas las cuotas pendientes de un usuario en una respuesta, con capital e
+    interés pendientes como números. El staff consulta a cualquiera; un socio
+    solo a sí mismo. La respuesta queda en caché hasta la próxima escritura
+    de pagos o préstamos, así que repetir la consulta no consulta cuotas.
+
+    El ETag es la versión de los datos (cache_versionada) y el usuario: un
+    If-None-Match vigente se responde 304 con solo leer la versión, sin
+    buscar la respuesta en la caché. No hay Last-Modified: la fecha de un
+    pago la escribe el usuario y no dice cuándo cambiaron las cuotas.
+    """
+    if not request.user.is_staff and request.user.pk != usuario_id:
+        raise Http404
+    etag = f'"{cache_versionada.version_datos()}-{usuario_id}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(
+            en_cache("cuotas_pendientes", lambda: _cuotas_pendientes_de(usuario_id), usuario_id)
+        )
+    response["ETag"] = etag
+    # el navegador debe revalidar siempre: los pagos cambian las cuotas
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def custom_logout(request):
     logout(request)
     messages.success(request, "Sesión cerrada correctamente.")
@@ -355,7 +413,7 @@ def solicitar_prestamo(request):
     else:
         form = SolicitudPrestamoForm(request.user)
 
-    return render(request, "fonar/solicitar_prestamo.html", {"form": form})
+    return render(request, "fonar/solicitar_prestamo.html", {"form": form, "max_escenarios": MAX_ESCENARIOS})
 
 
 @login_required
@@ -366,22 +424,97 @@ def obtener_tasa(request):
     except (TypeError, ValueError):
         return JsonResponse({"error": "Número de cuotas inválido"}, status=400)
 
-    usuario = request.user
+    tasa = tasas.tasa_para(request.user.tipo_usuario, cuotas)
+    if tasa is None:
+        return JsonResponse({"error": "No hay tasa configurada para este rango de cuotas"}, status=404)
+
+    return JsonResponse({"tasa": float(tasa)})
+
+
+@login_required
+@require_GET
+def tabla_tasas(request):
+    """
+    Tramos de cuotas con su tasa vigente hoy para el tipo de usuario: la
+    página de solicitud la pide una vez y calcula la tasa en el navegador.
+    """
+    tramos = tasas.tabla(request.user.tipo_usuario)
+    return JsonResponse({
+        "tramos": [
+            {"cuotas_min": cuotas_min, "cuotas_max": cuotas_max, "tasa": float(tasa)}
+            for cuotas_min, cuotas_max, tasa in tramos
+        ]
+    })
+
+# límites de la simulación para que una petición no arme planes sin fin
+MAX_ESCENARIOS = 6
+MAX_CUOTAS_SIMULACION = 120
+
+
+@login_required
+@require_GET
+def simular_prestamo(request):
+    """
+    Simula varios escenarios en una sola llamada:
+    ?monto=1000000&cuotas=12&monto=2000000&cuotas=24[&fecha=2025-03-01]
 
-    tasa = (
-        TasaInteres.objects.filter(
-            tipo_usuario=usuario.tipo_usuario,
-            cuotas_min__lte=cuotas,
-            cuotas_max__gte=cuotas
+    Cada escenario usa la tasa vigente para el tipo de usuario y el mismo
+    motor de amortización con que se generan las cuotas del préstamo.
+    """
+    montos = request.GET.getlist("monto")
+    lista_cuotas = request.GET.getlist("cuotas")
+    if not montos or len(montos) != len(lista_cuotas) or len(montos) > MAX_ESCENARIOS:
+        return JsonResponse(
+            {"error": f"Envía entre 1 y {MAX_ESCENARIOS} pares de monto y cuotas"}, status=400,
+        )
+    try:
+        escenarios = [(Decimal(m), int(c)) for m, c in zip(montos, lista_cuotas)]
+        fecha = request.GET.get("fecha")
+        fecha = date.fromisoformat(fecha) if fecha else None
+    except (InvalidOperation, ValueError):
+        return JsonResponse({"error": "Monto, cuotas o fecha inválidos"}, status=400)
+    if any(not monto.is_finite() or monto <= 0 or not 1 <= cuotas <= MAX_CUOTAS_SIMULACION for monto, cuotas in escenarios):
+        return JsonResponse(
+            {"error": f"El monto debe ser positivo y las cuotas entre 1 y {MAX_CUOTAS_SIMULACION}"}, status=400,
         )
-        .order_by("-vigente_desde")
-        .first()
-    )
 
-    if not tasa:
-        return JsonResponse({"error": "No hay tasa configurada para este rango de cuotas"}, status=404)
+    # la tabla de tasas se lee una vez para todos los escenarios
+    tramos = tasas.tabla(request.user.tipo_usuario)
+    con_tasa = [(monto, tasas.tasa_en_tramos(tramos, cuotas), cuotas) for monto, cuotas in escenarios]
+    planes = iter(amortizacion.simular_escenarios(
+        [e for e in con_tasa if e[1] is not None], fecha_desembolso=fecha,
+    ))
+
+    resultado = []
+    for monto, tasa, cuotas in con_tasa:
+        if tasa is None:
+            resultado.append({
+                "monto": float(monto), "cuotas": cuotas,
+                "error": "No hay tasa configurada para este rango de cuotas",
+            })
+            continue
+        plan, vencimientos = next(planes)
+        resultado.append({
+            "monto": float(monto),
+            "cuotas": cuotas,
+            "tasa": float(tasa),
+            "cuota_fija": float(plan.cuota_fija),
+            "total_intereses": float(plan.total_intereses),
+            "total_pagar": float(plan.total_pagar),
+            "periodos": [
+                {
+                    "numero": p.numero,
+                    "fecha_vencimiento": vence.isoformat() if vence else None,
+                    "cuota": float(p.cuota),
+                    "capital": float(p.capital),
+                    "interes": float(p.interes),
+                    "saldo": float(p.saldo),
+                }
+                for p, vence in zip(plan.periodos, vencimientos)
+            ],
+        })
+    return JsonResponse({"escenarios": resultado})
 
-    return JsonResponse({"tasa": float(tasa.interes_mensual)})
 
 def mis_solicitudes(request):
     solicitudes = SolicitudPrestamo.objects.filter(usuario=request.user).order_by("-fecha_solicitud")
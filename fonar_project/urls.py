@@ -3,7 +3,6 @@ from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from django.conf import settings
 from django.conf.urls.static import static
-from fonar import views
 from django.shortcuts import render
 
 urlpatterns = [
@@ -11,7 +10,6 @@ urlpatterns = [
     path('', include('fonar.urls')),  # vistas de socios
     path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
-    path("cuotas-pendientes/<int:prestamo_id>/", views.cuotas_pendientes, name="cuotas_pendientes"),
     path("dashboard/", include("dashboard.urls")),
 ]
 